@@ -0,0 +1,406 @@
+import asyncio
+import os
+import re
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+from columnar_store import store
+from http_client import fetch_alpha_vantage, is_error_payload
+
+# Raw series are fetched once per symbol and resampled locally for coarser intervals
+INTRADAY_INTERVALS = {"1MIN", "5MIN", "15MIN", "30MIN", "60MIN"}
+RESAMPLED_INTERVALS = {"WEEKLY", "MONTHLY"}
+OUTPUT_SIZE = os.getenv("ALPHA_VANTAGE_OUTPUTSIZE", "full")
+# Parsed series kept in memory, least recently used evicted first
+PARSED_SERIES_ENTRIES = int(os.getenv("STOCKS_PARSED_SERIES_ENTRIES", "128"))
+
+# Periods per year, used to annualize variance and standard deviation
+PERIODS_PER_YEAR = {
+    "DAILY": 252,
+    "WEEKLY": 52,
+    "MONTHLY": 12,
+    "1MIN": 252 * 390,
+    "5MIN": 252 * 78,
+    "15MIN": 252 * 26,
+    "30MIN": 252 * 13,
+    "60MIN": 252 * 7,
+}
+
+OHLC_COLUMNS = {"OPEN": 0, "HIGH": 1, "LOW": 2, "CLOSE": 3, "VOLUME": 4}
+
+# Calculations this engine answers locally, the rest still go to ANALYTICS_FIXED_WINDOW
+SUPPORTED_CALCULATIONS = {
+    "MIN", "MAX", "MEAN", "MEDIAN", "CUMULATIVE_RETURN", "VARIANCE", "STDDEV", "MAX_DRAWDOWN", "HISTOGRAM",
+}
+
+_CALCULATION_PATTERN = re.compile(r"([A-Z_]+)\s*(?:\(([^)]*)\))?")
+_RANGE_PATTERN = re.compile(r"^(\d+)\s*(day|week|month|year)s?$")
+
+
+class PriceSeries:
+    """Array backed OHLCV history for one symbol, oldest bar first."""
+
+    def __init__(self, symbol: str, dates: np.ndarray, ohlcv: np.ndarray):
+        self.symbol = symbol
+        self.dates = dates
+        self.ohlcv = ohlcv
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+
+# Parsed series keyed by (symbol, function), with the payload object they were parsed from.
+# The response cache hands back the same object while it is fresh, so parsing happens once.
+# Bounded like the response cache's memory tier, so a long running server does not keep every history.
+_parsed_series: OrderedDict[tuple[str, str], tuple[object, PriceSeries]] = OrderedDict()
+
+
+def parse_time_series(symbol: str, payload: dict) -> PriceSeries | None:
+    """
+    Convert an Alpha Vantage TIME_SERIES_* payload into typed arrays.
+    Args:
+        symbol: The stock symbol.
+        payload: The decoded TIME_SERIES_DAILY or TIME_SERIES_INTRADAY payload.
+    Returns:
+        The price series, or None if the payload holds no series.
+    """
+    series_key = next((key for key in payload if key.startswith("Time Series")), None)
+    if series_key is None or not payload[series_key]:
+        return None
+    bars = payload[series_key]
+    stamps = sorted(bars)
+    dates = np.array(stamps, dtype="datetime64[s]")
+    columns = ("1. open", "2. high", "3. low", "4. close", "5. volume")
+    ohlcv = np.array([[bars[stamp].get(column, "nan") for column in columns] for stamp in stamps], dtype=np.float64)
+    return PriceSeries(symbol, dates, ohlcv)
+
+
+def resample(series: PriceSeries, interval: str) -> PriceSeries:
+    """
+    Aggregate daily bars into weekly (Monday based) or monthly bars.
+    Args:
+        series: The daily price series.
+        interval: WEEKLY or MONTHLY.
+    Returns:
+        The resampled series, dated on the last trading day of each period.
+    """
+    days = series.dates.astype("datetime64[D]")
+    if interval == "WEEKLY":
+        # 1970-01-05 was a Monday
+        keys = (days - np.datetime64("1970-01-05", "D")).astype(np.int64) // 7
+    else:
+        keys = days.astype("datetime64[M]").astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:] - 1, len(keys) - 1]
+    o, h, l, c, v = series.ohlcv.T
+    ohlcv = np.column_stack([
+        o[starts],
+        np.maximum.reduceat(h, starts),
+        np.minimum.reduceat(l, starts),
+        c[ends],
+        np.add.reduceat(v, starts),
+    ])
+    return PriceSeries(series.symbol, series.dates[ends], ohlcv)
+
+
+async def load_series(symbol: str, interval: str = "DAILY") -> PriceSeries | None:
+    """
+    Get the price series of a symbol at an interval, fetching the raw bars only when needed.
+    Weekly and monthly series are resampled from the cached daily series.
+    Args:
+        symbol: The stock symbol.
+        interval: DAILY, WEEKLY, MONTHLY or an intraday interval such as 5MIN.
+    Returns:
+        The price series, or None if it could not be retrieved.
+    """
+    symbol = symbol.strip().upper()
+    interval = interval.strip().upper()
+    if interval in INTRADAY_INTERVALS:
+        function = "TIME_SERIES_INTRADAY"
+        payload = await fetch_alpha_vantage(function, symbol=symbol, interval=interval.lower(), outputsize=OUTPUT_SIZE)
+    else:
+        function = "TIME_SERIES_DAILY"
+        payload = await fetch_alpha_vantage(function, symbol=symbol, outputsize=OUTPUT_SIZE)
+    store_interval = interval if interval in INTRADAY_INTERVALS else "DAILY"
+    if payload is None or is_error_payload(payload):
+        # Upstream unavailable, serve the typed history kept in the local store
+        stored = await asyncio.to_thread(store.read_series, symbol, store_interval)
+        if stored is None:
+            return None
+        series = PriceSeries(symbol, *stored)
+    else:
+        cache_key = (f"{symbol}:{interval}" if interval in INTRADAY_INTERVALS else symbol, function)
+        entry = _parsed_series.get(cache_key)
+        if entry is not None and entry[0] is payload:
+            _parsed_series.move_to_end(cache_key)
+            series = entry[1]
+        else:
+            series = await asyncio.to_thread(parse_time_series, symbol, payload)
+            if series is None:
+                return None
+            _parsed_series[cache_key] = (payload, series)
+            _parsed_series.move_to_end(cache_key)
+            while len(_parsed_series) > PARSED_SERIES_ENTRIES:
+                _parsed_series.popitem(last=False)
+            await asyncio.to_thread(store.write_series, symbol, store_interval, series.dates, series.ohlcv)
+    if interval in RESAMPLED_INTERVALS:
+        series = resample(series, interval)
+    return series
+
+
+def align(series_list: list[PriceSeries], column: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Align several series on the dates they all share.
+    Args:
+        series_list: The price series to align.
+        column: The OHLCV column to extract.
+    Returns:
+        The shared dates and a (dates, symbols) matrix of values.
+    """
+    dates = series_list[0].dates
+    for series in series_list[1:]:
+        dates = np.intersect1d(dates, series.dates, assume_unique=True)
+    matrix = np.empty((len(dates), len(series_list)), dtype=np.float64)
+    for i, series in enumerate(series_list):
+        positions = np.searchsorted(series.dates, dates)
+        matrix[:, i] = series.ohlcv[positions, column]
+    return dates, matrix
+
+
+def _shift_months(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 - months
+    year, month = divmod(month_index, 12)
+    return date(year, month + 1, min(day.day, 28))
+
+
+def range_mask(dates: np.ndarray, time_frame: str | None) -> np.ndarray:
+    """
+    Select the bars inside an Alpha Vantage style RANGE.
+    Accepts "full", a trailing window such as "6month" or "2year", or explicit
+    dates "2023-01-01,2023-12-31" (the end date is optional).
+    Args:
+        dates: The series dates.
+        time_frame: The RANGE value.
+    Returns:
+        A boolean mask over dates.
+    """
+    spec = (time_frame or "full").strip().lower()
+    if spec == "full" or not len(dates):
+        return np.ones(len(dates), dtype=bool)
+    match = _RANGE_PATTERN.match(spec)
+    if match:
+        count, unit = int(match.group(1)), match.group(2)
+        last = dates[-1].astype("datetime64[D]").item()
+        if unit == "day":
+            start = last - timedelta(days=count)
+        elif unit == "week":
+            start = last - timedelta(weeks=count)
+        else:
+            start = _shift_months(last, count * (12 if unit == "year" else 1))
+        return dates > np.datetime64(start, "s")
+    bounds = [part.strip() for part in re.split(r"[,\s]+", spec) if part.strip()]
+    start = np.datetime64(bounds[0], "s")
+    mask = dates >= start
+    if len(bounds) > 1:
+        # Whole end day is included
+        mask &= dates < np.datetime64(bounds[1], "D") + np.timedelta64(1, "D")
+    return mask
+
+
+def parse_calculations(calculations: str | None) -> dict[str, dict[str, str]]:
+    """
+    Parse an ANALYTICS_FIXED_WINDOW CALCULATIONS value such as "MEAN,STDDEV(annualized=True),HISTOGRAM(bins=20)".
+    Args:
+        calculations: The comma separated calculations.
+    Returns:
+        Calculation name -> its options.
+    """
+    parsed = {}
+    for name, options in _CALCULATION_PATTERN.findall((calculations or "MEAN,STDDEV").upper()):
+        parsed[name] = dict(
+            (part.split("=", 1)[0].strip().lower(), part.split("=", 1)[1].strip().lower())
+            for part in options.split(",") if "=" in part
+        )
+    return parsed
+
+
+def parse_lags(options: dict[str, str], default_max_lag: int) -> list[int]:
+    """
+    Get the lags of an AUTOCORRELATION calculation: its lag, or 1..max_lag.
+    Args:
+        options: The calculation's options from parse_calculations().
+        default_max_lag: The max_lag used when neither option is given.
+    Returns:
+        The lags in increasing order.
+    Raises:
+        ValueError: If lag or max_lag is not a whole number of at least 1.
+    """
+    name = "lag" if "lag" in options else "max_lag"
+    lag = _whole_number(f"AUTOCORRELATION {name}", options.get(name, str(default_max_lag)))
+    return [lag] if name == "lag" else list(range(1, lag + 1))
+
+
+def parse_bins(options: dict[str, str]) -> int:
+    """
+    Get the bins of a HISTOGRAM calculation.
+    Raises:
+        ValueError: If bins is not a whole number of at least 1.
+    """
+    return _whole_number("HISTOGRAM bins", options.get("bins", "10"))
+
+
+def _whole_number(label: str, value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{label} '{value}' must be a whole number")
+    if number < 1:
+        raise ValueError(f"{label} must be at least 1, got {number}")
+    return number
+
+
+def validate_parameters(stock_symbols: str, time_frame: str, interval: str, ohlc: str, calculations: str) -> list[str]:
+    """
+    Check analytics request parameters before any data is fetched.
+    Args:
+        stock_symbols: Comma separated stock symbols.
+        time_frame: The RANGE value.
+        interval: The bar interval.
+        ohlc: The price field.
+        calculations: Comma separated calculations.
+    Returns:
+        A list of problems, empty when the request is valid.
+    """
+    problems = []
+    symbols = [s.strip().upper() for s in (stock_symbols or "").split(",") if s.strip()]
+    if not symbols:
+        problems.append("No stock symbols given.")
+    problems += [f"'{s}' is not a valid stock symbol." for s in symbols if not re.fullmatch(r"[A-Z][A-Z0-9.\-]{0,9}", s)]
+    if (interval or "DAILY").strip().upper() not in PERIODS_PER_YEAR:
+        problems.append(f"Interval '{interval}' must be one of {', '.join(PERIODS_PER_YEAR)}.")
+    if (ohlc or "close").strip().upper() not in OHLC_COLUMNS:
+        problems.append(f"OHLC '{ohlc}' must be one of open, high, low, close.")
+    spec = (time_frame or "full").strip().lower()
+    if spec != "full" and not _RANGE_PATTERN.match(spec):
+        try:
+            for part in re.split(r"[,\s]+", spec):
+                if part:
+                    np.datetime64(part)
+        except ValueError:
+            problems.append(f"Range '{time_frame}' must be 'full', a window like '6month', or dates like '2023-01-01,2023-12-31'.")
+    known = SUPPORTED_CALCULATIONS | {"CORRELATION", "COVARIANCE", "AUTOCORRELATION"}
+    parsed = parse_calculations(calculations)
+    problems += [f"Unknown calculation '{name}'." for name in parsed if name not in known]
+    for name, check in (("AUTOCORRELATION", lambda options: parse_lags(options, 1)), ("HISTOGRAM", parse_bins)):
+        if name in parsed:
+            try:
+                check(parsed[name])
+            except ValueError as e:
+                problems.append(f"{e}.")
+    return problems
+
+
+def _is_true(value: str | None) -> bool:
+    return (value or "").lower() in ("true", "1", "yes")
+
+
+def compute_statistics(prices: np.ndarray, calculations: dict[str, dict[str, str]], interval: str = "DAILY") -> dict:
+    """
+    Compute return statistics for every symbol column at once.
+    Statistics are over simple period returns, like the ANALYTICS_FIXED_WINDOW endpoint.
+    Args:
+        prices: A (dates, symbols) price matrix.
+        calculations: Parsed calculations from parse_calculations().
+        interval: The bar interval, used for annualization.
+    Returns:
+        Calculation name -> array (or list of histograms) with one entry per symbol.
+    """
+    returns = prices[1:] / prices[:-1] - 1.0
+    periods = PERIODS_PER_YEAR.get(interval.upper(), 252)
+    results = {}
+    for name, options in calculations.items():
+        if name == "MIN":
+            results[name] = returns.min(axis=0)
+        elif name == "MAX":
+            results[name] = returns.max(axis=0)
+        elif name == "MEAN":
+            results[name] = returns.mean(axis=0)
+        elif name == "MEDIAN":
+            results[name] = np.median(returns, axis=0)
+        elif name == "CUMULATIVE_RETURN":
+            results[name] = prices[-1] / prices[0] - 1.0
+        elif name in ("VARIANCE", "STDDEV"):
+            variance = returns.var(axis=0, ddof=1)
+            if _is_true(options.get("annualized")):
+                variance = variance * periods
+            results[name] = variance if name == "VARIANCE" else np.sqrt(variance)
+        elif name == "MAX_DRAWDOWN":
+            wealth = prices / prices[0]
+            results[name] = (wealth / np.maximum.accumulate(wealth, axis=0) - 1.0).min(axis=0)
+        elif name == "HISTOGRAM":
+            bins = parse_bins(options)
+            results[name] = [np.histogram(returns[:, i], bins=bins) for i in range(returns.shape[1])]
+    return results
+
+
+def _format_results(symbols: list[str], results: dict) -> dict:
+    formatted = {}
+    for name, values in results.items():
+        if name == "HISTOGRAM":
+            formatted[name] = {
+                symbol: {"bin_count": counts.tolist(), "bin_edges": np.round(edges, 6).tolist()}
+                for symbol, (counts, edges) in zip(symbols, values)
+            }
+        else:
+            formatted[name] = {symbol: round(float(value), 8) for symbol, value in zip(symbols, values)}
+    return formatted
+
+
+async def analyze(stock_symbols: str, time_frame: str, interval: str, ohlc: str, calculations: str) -> dict | None:
+    """
+    Answer an ANALYTICS_FIXED_WINDOW style question locally.
+    Args:
+        stock_symbols: Comma separated stock symbols.
+        time_frame: The RANGE, e.g. "full", "1year" or "2023-01-01,2023-12-31".
+        interval: DAILY, WEEKLY, MONTHLY or an intraday interval.
+        ohlc: The price field to use (open, high, low or close).
+        calculations: Comma separated calculations, e.g. "MEAN,STDDEV(annualized=True)".
+    Returns:
+        The result in the shape of the ANALYTICS_FIXED_WINDOW response, or None if a
+        calculation is not supported locally or the data could not be retrieved.
+    Raises:
+        ValueError: If a calculation option such as HISTOGRAM bins is not valid.
+    """
+    parsed = parse_calculations(calculations)
+    if not parsed or not parsed.keys() <= SUPPORTED_CALCULATIONS:
+        return None
+    if "HISTOGRAM" in parsed:
+        parse_bins(parsed["HISTOGRAM"])
+    symbols = [s.strip().upper() for s in stock_symbols.split(",") if s.strip()]
+    interval = (interval or "DAILY").strip().upper()
+    column = OHLC_COLUMNS.get((ohlc or "close").strip().upper(), OHLC_COLUMNS["CLOSE"])
+    series_list = await asyncio.gather(*(load_series(symbol, interval) for symbol in symbols))
+    if not symbols or any(series is None for series in series_list):
+        return None
+    dates, prices = align(series_list, column)
+    try:
+        mask = range_mask(dates, time_frame)
+    except ValueError:
+        return None
+    dates, prices = dates[mask], prices[mask]
+    if len(dates) < 3:
+        return None
+    results = compute_statistics(prices, parsed, interval)
+    return {
+        "meta_data": {
+            "symbols": ",".join(symbols),
+            "min_dt": str(dates[0].astype("datetime64[D]")),
+            "max_dt": str(dates[-1].astype("datetime64[D]")),
+            "ohlc": ohlc,
+            "interval": interval,
+            "observations": int(len(dates)),
+        },
+        "payload": {"RETURNS_CALCULATIONS": _format_results(symbols, results)},
+    }
@@ -1,24 +1,38 @@
-from agents import Agent, Runner, TResponseInputItem, trace, handoff, RunContextWrapper, function_tool, MessageOutputItem, HandoffOutputItem, ToolCallItem, ToolCallOutputItem, ItemHelpers, WebSearchTool
+from agents import Agent, Runner, TResponseInputItem, trace, handoff, RunContextWrapper, function_tool, MessageOutputItem, HandoffOutputItem, ToolCallItem, ToolCallOutputItem, ItemHelpers, WebSearchTool, RunConfig
+from openai.types.responses import ResponseTextDeltaEvent
 from pydantic import BaseModel
-import yfinance as yf
-import requests
-import os
 import asyncio
+import time
 import uuid
-from income_stmt_trend import plot_default_metrics
-
-ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
+from income_stmt_trend import derive_income_statement_metrics
+from chart_renderer import save_chart
+from http_client import fetch_alpha_vantage, fetch_quote, fetch_yfinance, close_client
+from projections import project
+from analytics_engine import analyze, validate_parameters
+from correlation_engine import analyze_correlations
+from rolling_stats import rolling_engine
+from indicators import technical_indicators
+from backtester import backtest
+from portfolio import analyze_portfolio, DEFAULT_BENCHMARK
+from columnar_store import store
+from pre_router import pre_router
+from symbol_index import load_index
+from history_manager import ConversationHistory
+from batch_fundamentals import compare_statements, compare_overviews
+from screener import screener
+from cache_warmer import cache_warmer
+from news_index import FEED_LIMIT, ingest_alpha_vantage, ingest_yfinance, news_index, news_poller
+from replay import replay_now
+from instrumentation import InstrumentationHooks, conversation_id_var, instrumented, metrics
 
 class StockContext(BaseModel):
     stock_symbol: str | None = None
     time_frame: str | None = None
     topic: str | None = None
     income_stmt: str | None = None
-
-class AdvancedAnalyticsContext(BaseModel):
+    # Advanced analytics fields, the analytics agents share the conversation's run context
     stock_symbols: str | None = None
     metrics: str | None = None
-    time_frame: str | None = None
     interval: str | None = None
     ohlc: str | None = None
     calculations: str | None = None
@@ -36,6 +50,7 @@ async def on_stock_analysis_handoff(context: RunContextWrapper[StockContext]) ->
 # Tools
 
 @function_tool(name_override="get_stock_data", description_override="Get the stock data for the given stock symbol.")
+@instrumented
 async def get_stock_data(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
     """
     Get the stock data for the given stock symbol.
@@ -45,18 +60,36 @@ async def get_stock_data(context: RunContextWrapper[StockContext], stock_symbol:
         The stock data for the given stock symbol.
     """
     context.context.stock_symbol = stock_symbol
-    stock_data = yf.Ticker(stock_symbol).info
+    # yfinance first, Alpha Vantage as the fallback; the cache warmer fills the same keys
+    stock_data = await fetch_quote(stock_symbol)
     if stock_data is None:
-        # fetch using vantage API
-        response = requests.get(f"https://www.alphavantage.co/query?function=TIME_SERIES_DAILY&symbol={stock_symbol}&apikey={ALPHA_VANTAGE_API_KEY}")
-        if response.status_code == 200:
-            stock_data = response.json()
-        else:
-            return "Sorry unable to retrive data as of now. Please try again later."
-    return stock_data
+        return "Sorry unable to retrive data as of now. Please try again later."
+    return project("get_stock_data", stock_data)
+
+@function_tool(name_override="get_technical_indicators", description_override="Get the technical indicators (SMA, EMA, RSI, MACD, Bollinger bands, ATR, VWAP) for the given stock symbols.")
+@instrumented
+async def get_technical_indicators(context: RunContextWrapper[StockContext], stock_symbols: str, interval: str, indicators: str) -> str:
+    """
+    Get the technical indicators for the given stock symbols.
+    Args:
+        stock_symbols: The comma separated stock symbols to get the indicators for.
+        interval: The interval of the price bars, e.g. DAILY, WEEKLY or 60MIN.
+        indicators: The indicators, e.g. SMA(50),SMA(200),RSI(14),MACD(12,26,9),BBANDS(20,2),ATR(14),VWAP(20). Empty for all of them.
+    Returns:
+        The latest value of each indicator and signals such as the price versus its moving averages for each stock symbol.
+    """
+    context.context.stock_symbol = stock_symbols
+    try:
+        technical_indicators_data = await technical_indicators(stock_symbols, interval or "DAILY", indicators or None)
+    except ValueError as e:
+        return f"Sorry these indicators are not valid: {e}."
+    if technical_indicators_data is None:
+        return "Sorry unable to retrive technical indicators as of now. Please try again later."
+    return technical_indicators_data
 
 @function_tool(name_override="get_stock_news", description_override="Get the stock news for the given stock symbol.")
-def get_stock_news(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
+@instrumented
+async def get_stock_news(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
     """
     Get the stock news for the given stock symbol.
     Args:
@@ -65,18 +98,23 @@ def get_stock_news(context: RunContextWrapper[StockContext], stock_symbol: str)
         The stock news for the given stock symbol.
     """
     context.context.stock_symbol = stock_symbol
-    stock_news = yf.Ticker(stock_symbol).news
-    if stock_news is None:
-        # fetch using API
-        response = requests.get(f"https://www.alphavantage.co/query?function=NEWS_SENTIMENT&tickers={stock_symbol}&apikey={ALPHA_VANTAGE_API_KEY}&limit=3")
-        if response.status_code == 200:
-            stock_news = response.json()
-        else:
-            return "Sorry unable to retrive news as of now. Please try again later."
-    return stock_news
+    symbol = stock_symbol.strip().upper()
+    feed = f"ticker:{symbol}"
+    if not await asyncio.to_thread(news_index.is_fresh, feed):
+        stock_news = await fetch_yfinance(symbol, "news")
+        await ingest_yfinance(stock_news, symbol, feed)
+        if not stock_news:
+            # fetch using API
+            await ingest_alpha_vantage(await fetch_alpha_vantage("NEWS_SENTIMENT", tickers=symbol, limit=FEED_LIMIT), feed)
+    # syndicated copies are merged in the index, stale articles are still served if the fetch failed
+    articles = await asyncio.to_thread(news_index.search, ticker=symbol, now=await replay_now())
+    if not articles:
+        return "Sorry unable to retrive news as of now. Please try again later."
+    return project("get_stock_news", {"feed": articles})
 
 @function_tool(name_override="get_topic_news", description_override="Get the topic news for the given topic.")
-def get_topic_news(context: RunContextWrapper[StockContext], topic: str) -> str:
+@instrumented
+async def get_topic_news(context: RunContextWrapper[StockContext], topic: str) -> str:
     """
     Get the topic news for the given topic.
     Args:
@@ -85,15 +123,40 @@ def get_topic_news(context: RunContextWrapper[StockContext], topic: str) -> str:
         The topic news for the given topic.
     """
     context.context.topic = topic
-    response = requests.get(f"https://www.alphavantage.co/query?function=NEWS_SENTIMENT&topics={topic}&apikey={ALPHA_VANTAGE_API_KEY}&limit=3")
-    if response.status_code == 200:
-        topic_news = response.json()
-    else:
+    feed = f"topic:{topic.strip().lower()}"
+    if not await asyncio.to_thread(news_index.is_fresh, feed):
+        await ingest_alpha_vantage(await fetch_alpha_vantage("NEWS_SENTIMENT", topics=topic, limit=FEED_LIMIT), feed)
+    articles = await asyncio.to_thread(news_index.search, topic=topic, now=await replay_now())
+    if not articles:
         return "Sorry unable to retrive news as of now. Please try again later."
-    return topic_news
+    return project("get_topic_news", {"feed": articles})
+
+@function_tool(name_override="search_news", description_override="Search the indexed news by keywords, optionally for a stock symbol or topic.")
+@instrumented
+async def search_news(context: RunContextWrapper[StockContext], query: str, stock_symbol: str | None = None,
+                      topic: str | None = None, days: int = 7) -> str:
+    """
+    Full text search over the de-duplicated news already fetched for stocks and topics.
+    Args:
+        query: The keywords to look for, e.g. "antitrust ruling".
+        stock_symbol: Only news about this stock symbol.
+        topic: Only news on this topic, e.g. technology or ipo.
+        days: How many days back to search.
+    Returns:
+        The best matching articles.
+    """
+    if stock_symbol:
+        context.context.stock_symbol = stock_symbol
+    if topic:
+        context.context.topic = topic
+    articles = await asyncio.to_thread(news_index.search, ticker=stock_symbol, topic=topic, query=query, days=days, now=await replay_now())
+    if not articles:
+        return f"No news matching '{query}' in the last {days} days."
+    return project("search_news", {"feed": articles})
 
 @function_tool(name_override="get_etf_data", description_override="Get the ETF data for the given ETF symbol.")
-def get_etf_data(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
+@instrumented
+async def get_etf_data(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
     """
     Get the ETF data for the given stock symbol.
     Args:
@@ -103,15 +166,14 @@ def get_etf_data(context: RunContextWrapper[StockContext], stock_symbol: str) ->
     """
     context.context.stock_symbol = stock_symbol
     # fetch using API
-    response = requests.get(f"https://www.alphavantage.co/query?function=ETF_PROFILE&symbol={stock_symbol}&apikey={ALPHA_VANTAGE_API_KEY}")
-    if response.status_code == 200:
-        etf_data = response.json()
-    else:
-            return "Sorry unable to retrive etf data as of now. Please try again later."
-    return etf_data
+    etf_data = await fetch_alpha_vantage("ETF_PROFILE", symbol=stock_symbol)
+    if etf_data is None:
+        return "Sorry unable to retrive etf data as of now. Please try again later."
+    return project("get_etf_data", etf_data)
 
 @function_tool(name_override="get_corporate_action_dividend_data", description_override="Get the corporate action dividend data for the given stock symbol.")
-def get_corporate_action_dividend_data(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
+@instrumented
+async def get_corporate_action_dividend_data(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
     """
     Get the corporate action dividend data for the given stock symbol.
     Args:
@@ -121,15 +183,14 @@ def get_corporate_action_dividend_data(context: RunContextWrapper[StockContext],
     """
     context.context.stock_symbol = stock_symbol
     # fetch using API
-    response = requests.get(f"https://www.alphavantage.co/query?function=DIVIDENDS&symbol={stock_symbol}&apikey={ALPHA_VANTAGE_API_KEY}")
-    if response.status_code == 200:
-            corporate_action_dividend_data = response.json()
-    else:
-            return "Sorry unable to retrive corporate action dividend data as of now. Please try again later."
-    return corporate_action_dividend_data
+    corporate_action_dividend_data = await fetch_alpha_vantage("DIVIDENDS", symbol=stock_symbol)
+    if corporate_action_dividend_data is None:
+        return "Sorry unable to retrive corporate action dividend data as of now. Please try again later."
+    return project("get_corporate_action_dividend_data", corporate_action_dividend_data)
 
 @function_tool(name_override="get_company_overview_data", description_override="Get the company overview data for the given stock symbol.")
-def get_company_overview_data(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
+@instrumented
+async def get_company_overview_data(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
     """
     Get the company overview data for the given stock symbol.
     Args:
@@ -139,15 +200,16 @@ def get_company_overview_data(context: RunContextWrapper[StockContext], stock_sy
     """
     context.context.stock_symbol = stock_symbol
     # fetch using API
-    response = requests.get(f"https://www.alphavantage.co/query?function=OVERVIEW&symbol={stock_symbol}&apikey={ALPHA_VANTAGE_API_KEY}")
-    if response.status_code == 200:
-        company_overview_data = response.json()
-    else:
+    company_overview_data = await fetch_alpha_vantage("OVERVIEW", symbol=stock_symbol)
+    if company_overview_data is None:
         return "Sorry unable to retrive company overview data as of now. Please try again later."
-    return company_overview_data
+    # keep the ratios in the local store for screening
+    await asyncio.to_thread(store.ingest_overview, stock_symbol, company_overview_data)
+    return project("get_company_overview_data", company_overview_data)
 
 @function_tool(name_override="get_income_statement", description_override="Get the income statement data for the given stock symbol.")
-def get_income_statement(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
+@instrumented
+async def get_income_statement(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
     """
     Get the income statement data for the given stock symbol.
     Args:
@@ -157,29 +219,39 @@ def get_income_statement(context: RunContextWrapper[StockContext], stock_symbol:
     """
     context.context.stock_symbol = stock_symbol
     # fetch using API
-    response = requests.get(f"https://www.alphavantage.co/query?function=INCOME_STATEMENT&symbol={stock_symbol}&apikey={ALPHA_VANTAGE_API_KEY}")
-    if response.status_code == 200: 
-        income_statement_data = response.json()
-    else:
+    income_statement_data = await fetch_alpha_vantage("INCOME_STATEMENT", symbol=stock_symbol)
+    if income_statement_data is None:
         return "Sorry unable to retrive income statement data as of now. Please try again later."
-    return income_statement_data
+    # keep typed columns of the statement in the local store
+    await asyncio.to_thread(store.ingest_statement, stock_symbol, "INCOME_STATEMENT", income_statement_data)
+    projected = project("get_income_statement", income_statement_data)
+    if isinstance(projected, dict) and "annualReports" in income_statement_data:
+        # margins, growth, TTM and CAGR precomputed so the agent does not do the arithmetic
+        projected = {**projected, "derivedMetrics": derive_income_statement_metrics(income_statement_data)}
+    return projected
 
 @function_tool(name_override="income_statement_pattern_analysis", description_override="Analyze the income statement pattern for the given stock symbol.")
-def income_statement_pattern_analysis(context: RunContextWrapper[StockContext], income_stmt: str) -> str:
+@instrumented
+async def income_statement_pattern_analysis(context: RunContextWrapper[StockContext], income_stmt: str, preset: str = "default") -> str:
     """
     Analyze the income statement pattern for the given stock symbol.
     Args:
-        stock_symbol: The stock symbol to analyze the income statement pattern for.
+        income_stmt: The income statement data to chart.
+        preset: The metrics to chart: default, profitability or revenue.
     Returns:
         The income statement pattern analysis for the given stock symbol.
     """
     context.context.income_stmt = income_stmt
-    graph = plot_default_metrics(income_stmt)
-    graph.show()
-    return "Graph generated successfully and displayed in the browser."
+    # rendered headless in the chart worker pool, repeated charts come from the render cache
+    try:
+        chart_path = await save_chart(income_stmt, preset)
+    except ValueError as e:
+        return f"Sorry this chart request is not valid: {e}."
+    return f"Graph generated successfully and saved to {chart_path}."
 
 @function_tool(name_override="get_earning_data", description_override="Get the earning data for the given stock symbol.")
-def get_earning_data(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
+@instrumented
+async def get_earning_data(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
     """
     Get the earning data for the given stock symbol.
     Args:
@@ -189,15 +261,16 @@ def get_earning_data(context: RunContextWrapper[StockContext], stock_symbol: str
     """
     context.context.stock_symbol = stock_symbol
     # fetch using API
-    response = requests.get(f"https://www.alphavantage.co/query?function=EARNINGS&symbol={stock_symbol}&apikey={ALPHA_VANTAGE_API_KEY}")
-    if response.status_code == 200:
-        earning_data = response.json()
-    else:
+    earning_data = await fetch_alpha_vantage("EARNINGS", symbol=stock_symbol)
+    if earning_data is None:
         return "Sorry unable to retrive earning data as of now. Please try again later."
-    return earning_data
+    # keep typed columns of the statement in the local store
+    await asyncio.to_thread(store.ingest_statement, stock_symbol, "EARNINGS", earning_data)
+    return project("get_earning_data", earning_data)
 
 @function_tool(name_override="get_cashflow_data", description_override="Get the cashflow data for the given stock symbol.")
-def get_cashflow_data(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
+@instrumented
+async def get_cashflow_data(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
     """
     Get the cashflow data for the given stock symbol.
     Args:
@@ -207,15 +280,107 @@ def get_cashflow_data(context: RunContextWrapper[StockContext], stock_symbol: st
     """
     context.context.stock_symbol = stock_symbol
     # fetch using API
-    response = requests.get(f"https://www.alphavantage.co/query?function=CASH_FLOW&symbol={stock_symbol}&apikey={ALPHA_VANTAGE_API_KEY}")
-    if response.status_code == 200:
-        cashflow_data = response.json()
-    else:
+    cashflow_data = await fetch_alpha_vantage("CASH_FLOW", symbol=stock_symbol)
+    if cashflow_data is None:
+        return "Sorry unable to retrive cashflow data as of now. Please try again later."
+    # keep typed columns of the statement in the local store
+    await asyncio.to_thread(store.ingest_statement, stock_symbol, "CASH_FLOW", cashflow_data)
+    return project("get_cashflow_data", cashflow_data)
+
+@function_tool(name_override="compare_income_statements", description_override="Compare the income statements of several stock symbols in one table.")
+@instrumented
+async def compare_income_statements(context: RunContextWrapper[StockContext], stock_symbols: str, period: str = "annual", periods: int = 3) -> str:
+    """
+    Compare the income statements of several stock symbols in one table.
+    Args:
+        stock_symbols: The comma separated stock symbols to compare, e.g. AAPL,MSFT,GOOGL.
+        period: annual or quarterly.
+        periods: The number of latest periods per stock symbol.
+    Returns:
+        The aligned income statement comparison table.
+    """
+    context.context.stock_symbol = stock_symbols
+    # all symbols are fetched concurrently under the shared rate limit
+    comparison = await compare_statements(stock_symbols, "INCOME_STATEMENT", period, periods)
+    if comparison is None:
+        return "Sorry unable to retrive income statement data as of now. Please try again later."
+    return comparison
+
+@function_tool(name_override="compare_earning_data", description_override="Compare the earning data of several stock symbols in one table.")
+@instrumented
+async def compare_earning_data(context: RunContextWrapper[StockContext], stock_symbols: str, period: str = "annual", periods: int = 3) -> str:
+    """
+    Compare the earning data of several stock symbols in one table.
+    Args:
+        stock_symbols: The comma separated stock symbols to compare, e.g. AAPL,MSFT,GOOGL.
+        period: annual or quarterly.
+        periods: The number of latest periods per stock symbol.
+    Returns:
+        The aligned earning comparison table.
+    """
+    context.context.stock_symbol = stock_symbols
+    comparison = await compare_statements(stock_symbols, "EARNINGS", period, periods)
+    if comparison is None:
+        return "Sorry unable to retrive earning data as of now. Please try again later."
+    return comparison
+
+@function_tool(name_override="compare_cashflow_data", description_override="Compare the cashflow data of several stock symbols in one table.")
+@instrumented
+async def compare_cashflow_data(context: RunContextWrapper[StockContext], stock_symbols: str, period: str = "annual", periods: int = 3) -> str:
+    """
+    Compare the cashflow data of several stock symbols in one table.
+    Args:
+        stock_symbols: The comma separated stock symbols to compare, e.g. AAPL,MSFT,GOOGL.
+        period: annual or quarterly.
+        periods: The number of latest periods per stock symbol.
+    Returns:
+        The aligned cashflow comparison table.
+    """
+    context.context.stock_symbol = stock_symbols
+    comparison = await compare_statements(stock_symbols, "CASH_FLOW", period, periods)
+    if comparison is None:
         return "Sorry unable to retrive cashflow data as of now. Please try again later."
-    return cashflow_data
+    return comparison
+
+@function_tool(name_override="compare_company_overviews", description_override="Compare the company overview data of several stock symbols in one table.")
+@instrumented
+async def compare_company_overviews(context: RunContextWrapper[StockContext], stock_symbols: str) -> str:
+    """
+    Compare the company overview data of several stock symbols in one table.
+    Args:
+        stock_symbols: The comma separated stock symbols to compare, e.g. AAPL,MSFT,GOOGL.
+    Returns:
+        The key ratios and metrics of each stock symbol side by side.
+    """
+    context.context.stock_symbol = stock_symbols
+    comparison = await compare_overviews(stock_symbols)
+    if comparison is None:
+        return "Sorry unable to retrive company overview data as of now. Please try again later."
+    return comparison
+
+@function_tool(name_override="screen_stocks", description_override="Screen the locally stored stock universe with filters such as P/E < 20 or dividend yield > 3%.")
+@instrumented
+async def screen_stocks(context: RunContextWrapper[StockContext], filters: str, sort_by: str, limit: int) -> str:
+    """
+    Screen the locally stored stock universe.
+    Args:
+        filters: The comma separated filters, e.g. P/E < 20, revenue CAGR > 10%, dividend yield > 3%, sector = Technology.
+        sort_by: The metric to rank the matches by, e.g. market cap or dividend yield. Empty for market cap.
+        limit: How many matches to return, e.g. 20.
+    Returns:
+        The number of matching stocks and the top ranked matches with the filtered metrics.
+    """
+    try:
+        screen_data = await screener.run(filters, sort_by or None, limit=limit)
+    except ValueError as e:
+        return f"Sorry this screen is not valid: {e}."
+    if not screen_data["universe"]:
+        return "Sorry no stocks are stored for screening as of now. Please try again later."
+    return screen_data
 
 @function_tool(name_override="get_top_gainers_loosers_active_tickers", description_override="Get the top gainers, loosers and the most active traded tickers for the given stock symbol.")
-def get_top_gainers_loosers_active_tickers(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
+@instrumented
+async def get_top_gainers_loosers_active_tickers(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
     """
     Get the top gainers, loosers and the most active traded tickers for the given stock symbol.
     Args:
@@ -225,15 +390,14 @@ def get_top_gainers_loosers_active_tickers(context: RunContextWrapper[StockConte
     """
     context.context.stock_symbol = stock_symbol
     # fetch using API
-    response = requests.get(f"https://www.alphavantage.co/query?function=TOP_GAINERS_LOSERS&apikey={ALPHA_VANTAGE_API_KEY}")
-    if response.status_code == 200:
-        top_gainers_loosers_active_tickers_data = response.json()
-    else:
+    top_gainers_loosers_active_tickers_data = await fetch_alpha_vantage("TOP_GAINERS_LOSERS")
+    if top_gainers_loosers_active_tickers_data is None:
         return "Sorry unable to retrive top gainers, loosers and the most active traded tickers data as of now. Please try again later."
-    return top_gainers_loosers_active_tickers_data
+    return project("get_top_gainers_loosers_active_tickers", top_gainers_loosers_active_tickers_data)
 
 @function_tool(name_override="get_insider_trades", description_override="Get the insider trades for the given stock symbol.")
-def get_insider_trades(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
+@instrumented
+async def get_insider_trades(context: RunContextWrapper[StockContext], stock_symbol: str) -> str:
     """
     Get the insider trades for the given stock symbol.
     Args:
@@ -243,16 +407,15 @@ def get_insider_trades(context: RunContextWrapper[StockContext], stock_symbol: s
     """
     context.context.stock_symbol = stock_symbol
     # fetch using API
-    response = requests.get(f"https://www.alphavantage.co/query?function=INSIDER_TRANSACTIONS&symbol={stock_symbol}&apikey={ALPHA_VANTAGE_API_KEY}")
-    if response.status_code == 200:
-        insider_trades_data = response.json()
-    else:
+    insider_trades_data = await fetch_alpha_vantage("INSIDER_TRANSACTIONS", symbol=stock_symbol)
+    if insider_trades_data is None:
         return "Sorry unable to retrive insider trades data as of now. Please try again later."
-    return insider_trades_data
+    return project("get_insider_trades", insider_trades_data)
 
 # TOOLS FOR ANALYTICS_ADVANCED AGENT
 @function_tool(name_override="get_data_retrieval_processing", description_override="Get the data retrieval & processing for the given stock symbol.")
-def get_data_retrieval_processing(context: RunContextWrapper[AdvancedAnalyticsContext], stock_symbols: str, time_frame: str, interval: str, ohlc: str, calculations: str) -> str:
+@instrumented
+async def get_data_retrieval_processing(context: RunContextWrapper[StockContext], stock_symbols: str, time_frame: str, interval: str, ohlc: str, calculations: str) -> str:
     """
     Get the data retrieval & processing for the given stock symbol.
     Args:
@@ -265,16 +428,22 @@ def get_data_retrieval_processing(context: RunContextWrapper[AdvancedAnalyticsCo
     context.context.interval = interval
     context.context.ohlc = ohlc
     context.context.calculations = calculations
+    # compute locally from cached OHLC series, fall back to the API for calculations the engine does not cover
+    try:
+        data_retrieval_processing_data = await analyze(stock_symbols, time_frame, interval, ohlc, calculations)
+    except ValueError as e:
+        return f"Sorry these calculations are not valid: {e}."
+    if data_retrieval_processing_data is not None:
+        return data_retrieval_processing_data
     # fetch using API
-    response = requests.get(f"https://www.alphavantage.co/query?function=ANALYTICS_FIXED_WINDOW&SYMBOLS={stock_symbols}&RANGE={time_frame}&INTERVAL={interval}&OHLC={ohlc}&CALCULATIONS={calculations}&apikey={ALPHA_VANTAGE_API_KEY}")
-    if response.status_code == 200:
-        data_retrieval_processing_data = response.json()
-    else:
+    data_retrieval_processing_data = await fetch_alpha_vantage("ANALYTICS_FIXED_WINDOW", SYMBOLS=stock_symbols, RANGE=time_frame, INTERVAL=interval, OHLC=ohlc, CALCULATIONS=calculations)
+    if data_retrieval_processing_data is None:
         return "Sorry unable to retrive data retrieval & processing data as of now. Please try again later."
     return data_retrieval_processing_data
 
 @function_tool(name_override="get_statistical_analysis", description_override="Get the statistical analysis for the given stock symbol.")
-def get_statistical_analysis(context: RunContextWrapper[AdvancedAnalyticsContext], stock_symbols: str, time_frame: str, interval: str, ohlc: str, calculations: str) -> str:
+@instrumented
+async def get_statistical_analysis(context: RunContextWrapper[StockContext], stock_symbols: str, time_frame: str, interval: str, ohlc: str, calculations: str) -> str:
     """
     Get the statistical analysis for the given stock symbol.
     Args:
@@ -287,13 +456,157 @@ def get_statistical_analysis(context: RunContextWrapper[AdvancedAnalyticsContext
     context.context.interval = interval
     context.context.ohlc = ohlc
     context.context.calculations = calculations
+    # compute locally from cached OHLC series, fall back to the API for calculations the engine does not cover
+    try:
+        statistical_analysis_data = await analyze(stock_symbols, time_frame, interval, ohlc, calculations)
+    except ValueError as e:
+        return f"Sorry these calculations are not valid: {e}."
+    if statistical_analysis_data is not None:
+        return statistical_analysis_data
     # fetch using API
-    response = requests.get(f"https://www.alphavantage.co/query?function=ANALYTICS_FIXED_WINDOW&SYMBOLS={stock_symbols}&RANGE={time_frame}&INTERVAL={interval}&OHLC={ohlc}&CALCULATIONS={calculations}&apikey={ALPHA_VANTAGE_API_KEY}")
-    if response.status_code == 200:
-        statistical_analysis_data = response.json()
-    else:
+    statistical_analysis_data = await fetch_alpha_vantage("ANALYTICS_FIXED_WINDOW", SYMBOLS=stock_symbols, RANGE=time_frame, INTERVAL=interval, OHLC=ohlc, CALCULATIONS=calculations)
+    if statistical_analysis_data is None:
         return "Sorry unable to retrive statistical analysis data as of now. Please try again later."
     return statistical_analysis_data
+
+@function_tool(name_override="get_rolling_statistics", description_override="Get the rolling window statistics for the given stock symbols.")
+@instrumented
+async def get_rolling_statistics(context: RunContextWrapper[StockContext], stock_symbols: str, window: int, interval: str) -> str:
+    """
+    Get the rolling window statistics for the given stock symbols.
+    Args:
+        stock_symbols: The comma separated stock symbols to get the statistics for.
+        window: The number of bars in the rolling window, e.g. 20.
+        interval: The interval of the price bars, e.g. DAILY or WEEKLY.
+    Returns:
+        The rolling mean, variance, min/max, drawdown and cumulative return for each stock symbol.
+    """
+    context.context.stock_symbols = stock_symbols
+    context.context.interval = interval
+    rolling_statistics = {}
+    try:
+        for stock_symbol in [s.strip() for s in stock_symbols.split(",") if s.strip()]:
+            rolling_statistics[stock_symbol.upper()] = await rolling_engine.query(stock_symbol, window, interval or "DAILY")
+    except ValueError as e:
+        return f"Sorry this window is not valid: {e}."
+    if not any(rolling_statistics.values()):
+        return "Sorry unable to retrive rolling statistics as of now. Please try again later."
+    return rolling_statistics
+
+@function_tool(name_override="get_correlation_time_series", description_override="Get the correlation, covariance and autocorrelation for the given stock symbols.")
+@instrumented
+async def get_correlation_time_series(context: RunContextWrapper[StockContext], stock_symbols: str, time_frame: str, interval: str, ohlc: str, calculations: str) -> str:
+    """
+    Get the correlation, covariance and autocorrelation for the given stock symbols.
+    Args:
+        stock_symbols: The comma separated stock symbols to get the data for.
+        time_frame: The range to analyze, e.g. full, 1year or 2023-01-01,2023-12-31.
+        interval: The interval of the price bars, e.g. DAILY or WEEKLY.
+        ohlc: The price field to use, e.g. close.
+        calculations: The calculations, e.g. CORRELATION(method=spearman),COVARIANCE,AUTOCORRELATION(max_lag=10).
+    Returns:
+        The correlation & time series analysis for the given stock symbols.
+    """
+    context.context.stock_symbols = stock_symbols
+    context.context.time_frame = time_frame
+    context.context.interval = interval
+    context.context.ohlc = ohlc
+    context.context.calculations = calculations
+    try:
+        correlation_time_series_data = await analyze_correlations(stock_symbols, time_frame, interval, ohlc, calculations)
+    except ValueError as e:
+        return f"Sorry these calculations are not valid: {e}."
+    if correlation_time_series_data is not None:
+        return correlation_time_series_data
+    # fetch using API
+    correlation_time_series_data = await fetch_alpha_vantage("ANALYTICS_FIXED_WINDOW", SYMBOLS=stock_symbols, RANGE=time_frame, INTERVAL=interval, OHLC=ohlc, CALCULATIONS=calculations)
+    if correlation_time_series_data is None:
+        return "Sorry unable to retrive correlation & time series data as of now. Please try again later."
+    return correlation_time_series_data
+
+@function_tool(name_override="get_output_formatting_validation", description_override="Validate the advanced analytics parameters for the given stock symbols.")
+@instrumented
+async def get_output_formatting_validation(context: RunContextWrapper[StockContext], stock_symbols: str, time_frame: str, interval: str, ohlc: str, calculations: str) -> str:
+    """
+    Validate the advanced analytics parameters for the given stock symbols.
+    Args:
+        stock_symbols: The comma separated stock symbols.
+    Returns:
+        The validation result with any problems found.
+    """
+    problems = validate_parameters(stock_symbols, time_frame, interval, ohlc, calculations)
+    if problems:
+        return {"valid": False, "problems": problems}
+    return {"valid": True, "stock_symbols": stock_symbols.upper(), "time_frame": time_frame, "interval": interval.upper(), "ohlc": ohlc.lower(), "calculations": calculations.upper()}
+
+@function_tool(name_override="backtest_strategy", description_override="Backtest a trading rule (RSI, moving average cross, Bollinger bands) or a sweep of its parameters on the given stock symbol.")
+@instrumented
+async def backtest_strategy(context: RunContextWrapper[StockContext], stock_symbol: str, strategy: str, parameters: str, time_frame: str, position_size: float, fee_bps: float, slippage_bps: float) -> str:
+    """
+    Backtest a trading rule on the given stock symbol.
+    Args:
+        stock_symbol: The stock symbol to backtest on.
+        strategy: One of RSI, SMA_CROSS, EMA_CROSS or BOLLINGER.
+        parameters: The rule parameters, e.g. period=14; lower=30; upper=70. Use lists (20,25,30) or start:stop:step ranges (20:40:5) to sweep them. Empty for the defaults.
+        time_frame: The range to test, e.g. 5year or 2020-01-01,2024-12-31.
+        position_size: The fraction of equity invested when the rule is long, e.g. 1.0.
+        fee_bps: The fees per trade side in basis points, e.g. 1.
+        slippage_bps: The slippage per trade side in basis points, e.g. 5.
+    Returns:
+        The return, CAGR, Sharpe ratio, max drawdown and trade count of the best parameters next to buy and hold.
+    """
+    context.context.stock_symbol = stock_symbol
+    context.context.time_frame = time_frame
+    try:
+        backtest_data = await backtest(stock_symbol, strategy, parameters or None, time_frame or None, "DAILY",
+                                       position_size if position_size else 1.0, fee_bps, slippage_bps)
+    except ValueError as e:
+        return f"Sorry this backtest is not valid: {e}."
+    if backtest_data is None:
+        return "Sorry unable to retrive price history for the backtest as of now. Please try again later."
+    return backtest_data
+
+@function_tool(name_override="get_portfolio_analytics", description_override="Get the volatility, beta, VaR/CVaR, risk contributions and optimized weights of a portfolio of stock symbols.")
+@instrumented
+async def get_portfolio_analytics(context: RunContextWrapper[StockContext], holdings: str, time_frame: str, benchmark: str, confidence: float, objective: str) -> str:
+    """
+    Get the risk analytics and optimized weights of a portfolio.
+    Args:
+        holdings: The comma separated stock symbols with weights, e.g. AAPL:0.4, MSFT:0.3, GOOGL:0.3. Without weights the holdings are equally weighted.
+        time_frame: The range of returns to use, e.g. 3year or 2022-01-01,2024-12-31.
+        benchmark: The stock symbol betas are measured against, e.g. SPY. Empty for SPY, NONE to skip betas.
+        confidence: The value at risk confidence level, e.g. 0.95 or 0.99.
+        objective: The optimization, MIN_VARIANCE, MEAN_VARIANCE or NONE.
+    Returns:
+        The portfolio return, volatility, Sharpe ratio, beta and VaR/CVaR, each holding's risk share, and the optimized weights.
+    """
+    context.context.stock_symbol = holdings
+    context.context.time_frame = time_frame
+    try:
+        portfolio_data = await analyze_portfolio(holdings, time_frame or None, "DAILY", benchmark or DEFAULT_BENCHMARK,
+                                                 confidence or 0.95, objective or "MIN_VARIANCE")
+    except ValueError as e:
+        return f"Sorry this portfolio is not valid: {e}."
+    if portfolio_data is None:
+        return "Sorry unable to retrive portfolio data as of now. Please try again later."
+    return portfolio_data
+
+@function_tool(name_override="resolve_stock_symbol", description_override="Resolve a company name, ETF name or alias to its stock symbol.")
+@instrumented
+async def resolve_stock_symbol(context: RunContextWrapper[StockContext], query: str) -> str:
+    """
+    Resolve a company name, ETF name or alias to its stock symbol.
+    Args:
+        query: The company name, ETF name, alias or partial/misspelled ticker, e.g. Amazon or spdr s&p.
+    Returns:
+        The best matching stock symbols with name, exchange and asset type.
+    """
+    # the first call may download the listing and build the index
+    index = await load_index()
+    matches = index.search(query)
+    if not matches:
+        return "Sorry unable to find a stock symbol for the given name. Please try again with the company name or ticker."
+    return matches
 # AGENTS
 
 income_statement_agent = Agent[StockContext](name="Income Statement Agent", 
@@ -304,8 +617,10 @@ instructions="You are a income statement expert that performs income statement a
 "Tabulate quarterly income statements corresponding to the last 5 quarters including date, revenue, gross profit, operating income, net income, cogs, ebitda, operating expenses, operating income, net income, and other relevant metrics."
 "Tabulate annual income statements corresponding to the last 5 years including date, revenue, gross profit, operating income, net income, cogs, ebitda, operating expenses, operating income, net income, and other relevant metrics."
 "Use the get_income_statement tool to get the income statement data using the stock symbol."
+"Use the precomputed derivedMetrics (margins, YoY/QoQ growth, TTM and CAGR) from the tool output instead of calculating them yourself."
+"To compare several stock symbols, call the compare_income_statements tool once with all of them and tabulate the returned rows."
 "If you are unable to resolve the stock symbol, return 'Sorry this is not a valid stock symbol. Do you want to go with 'AMZN' for Amazon stock?'.",
-tools=[get_income_statement],
+tools=[get_income_statement, compare_income_statements],
 )
 
 company_overview_agent = Agent[StockContext](name="Company Overview Agent", 
@@ -316,8 +631,9 @@ instructions="You are a company overview expert that performs financial analysis
 "Show basic information about the company like name, address, phone number, website, etc."
 "Tabulate all the realtime data for information purposes (including financial ratios, key metrics, etc.)."
 "Use the get_stock_data tool to get the company overview data using the stock symbol."
+"To compare several stock symbols, call the compare_company_overviews tool once with all of them and tabulate the returned rows."
 "If you are unable to resolve the stock symbol, return 'Sorry this is not a valid stock symbol. Do you want to go with 'AMZN' for Amazon stock?'.",
-tools=[get_company_overview_data],
+tools=[get_company_overview_data, compare_company_overviews],
 )
 
 corporate_action_agent = Agent[StockContext](name="Corporate Action Dividend Agent", 
@@ -349,29 +665,34 @@ instructions="A stock analysis agent that can help with stock market analysis an
 "You are a stock analyst expert. You generate a 3-4 lines analysis for a given stock only based on the real time data. "
 "It should be engaging, simple and with emojis for better understanding for a layman."
 "Use the get_stock_data tool to get the stock data using the stock symbol."
+"For trend and momentum questions (e.g. is it above its 200-day average, what is the RSI, MACD, Bollinger bands, ATR or VWAP), use the get_technical_indicators tool and quote its numbers, never estimate them. "
+"Pass all the stock symbols of a question to one get_technical_indicators call as a comma separated list."
 "If you are unable to resolve the stock symbol, return 'Sorry this is not a valid stock symbol. Do you want to go with 'AMZN' for Amazon stock?'.",
-tools=[get_stock_data],
+tools=[get_stock_data, get_technical_indicators],
 )
 
 topic_news_agent = Agent[StockContext](name="Topic News Agent", 
 handoff_description="A topic news agent that can help with the latest topic news.",
 instructions="Fetch the latest topic news for the given topic using the get_topic_news tool."
 "Topic should be one of: [blockchain, earnings, ipo, mergers_and_acquisitions, financial_markets, economy_fiscal, economy_monetary, economy_macro, energy_transportation, finance, life_sciences, manufacturing, real_estate, retail_wholesale, technology]"
-"Sort the news items ordered by latest date in tabular format with columns - date, ticker, ticker_sentiment, title, link, source, summary, overall_sentiment, topic",
-tools=[get_topic_news],
+"Sort the news items ordered by latest date in tabular format with columns - date, ticker, ticker_sentiment, title, link, source, summary, overall_sentiment, topic"
+"For news about a specific event or keywords within a topic, use the search_news tool with the topic.",
+tools=[get_topic_news, search_news],
 )
 
 stock_news_agent = Agent[StockContext](name="Stock News Agent", 
 handoff_description="A stock news agent that can help with the latest stock news.",
 instructions="For topic related news, route it to the topic news agent."
 "For a stock ticker related news, fetch the latest news using either WebSearch tool or get_stock_news tool."
+"For news about a specific event or keywords, e.g. a lawsuit or a product launch, use the search_news tool with the stock symbol."
+"A story carried by several outlets has a syndicated count above 1, mention it once."
 "Generate 3-4 lines easy to understand summary of the news explaining using analogies and metaphors for a layman."
 "For example"
 "Apple AAPL Stock hits 52 week high (source: CNBC) [2025-06-18]![Link](https://www.cnbc.com/quotes/AAPL)"
 "Seems like Apple is doing well. If you already have in portfolio,👍 to you..."
 "If not you might need to buy it. 🤔"
 "Do you wish to deep dive into stock analysis?",
-tools=[get_stock_news, WebSearchTool(search_context_size="medium", user_location= None)],
+tools=[get_stock_news, search_news, WebSearchTool(search_context_size="medium", user_location= None)],
 handoffs=[topic_news_agent]
 )
 
@@ -384,8 +705,9 @@ instructions="You are a earning(EPS) analyst expert."
 "- Tabulate the earnings data for the last 5 years including reportedEPS."
 "- Tabulate the earnings data for past 6 quarters including fiscal ending date, reportedEPS, estimatedEPS, surprise, surprise percentage, and other relevant metrics."
 "- Use the 'get_earning_data' tool to get the earning data using the stock symbol."
+"- To compare several stock symbols, call the 'compare_earning_data' tool once with all of them and tabulate the returned rows."
 "- If you are unable to resolve the stock symbol, return 'Sorry this is not a valid stock symbol. Do you want to go with 'AMZN' for Amazon stock?'.",
-tools=[get_earning_data],
+tools=[get_earning_data, compare_earning_data],
 )
 
 cashflow_analysis_agent = Agent[StockContext](name="Cashflow Analysis Agent", 
@@ -397,8 +719,9 @@ instructions="You are a cashflow analyst expert."
 "- Tabulate annual cashflow for the last 5 years including fiscal ending date, operating cash flow, capital expenditure, dividend payout, netincome, cash flow from financing denoted by currency"
 "- Tabulate quarterly cashflow for past 6 quarters including fiscal ending date, operating cash flow, capital expenditure, dividend payout, netincome, cash flow from financing denoted by currency"
 "- Use the 'get_cashflow_data' tool to get the cashflow data using the stock symbol."
+"- To compare several stock symbols, call the 'compare_cashflow_data' tool once with all of them and tabulate the returned rows."
 "- If you are unable to resolve the stock symbol, return 'Sorry this is not a valid stock symbol. Do you want to go with 'AMZN' for Amazon stock?'.",
-tools=[get_cashflow_data],
+tools=[get_cashflow_data, compare_cashflow_data],
 )
 
 top_gainers_loosers_agent = Agent[StockContext](name="Top Gainers/Loosers Agent", 
@@ -431,7 +754,7 @@ tools=[get_insider_trades],
 # Sub-Agents for ANALYTICS_ADVANCED AGENT
 
 # 1. Data Retrieval & Processing Agent
-data_retrieval_processing_agent = Agent[AdvancedAnalyticsContext](name="Data Retrieval & Processing Agent", 
+data_retrieval_processing_agent = Agent[StockContext](name="Data Retrieval & Processing Agent", 
 handoff_description="A data retrieval & processing agent that can help with a company's data retrieval & processing.",
 instructions="You are a data retrieval & processing expert."
 "- Validate symbols and date ranges"
@@ -442,18 +765,19 @@ tools=[get_data_retrieval_processing],
 )
 
 # 2. Statistical Analysis Agent
-statistical_analysis_agent = Agent[AdvancedAnalyticsContext](name="Statistical Analysis Agent", 
+statistical_analysis_agent = Agent[StockContext](name="Statistical Analysis Agent", 
 handoff_description="A statistical analysis agent that can help with a company's statistical analysis.",
 instructions="You are a statistical analysis expert."
 "- Calculate MIN, MAX, MEAN, MEDIAN, VARIANCE, STDDEV"
 "- Compute MAX_DRAWDOWN and CUMULATIVE_RETURN"
 "- Generate HISTOGRAM distributions"
-"- Handle annualization options for variance/standard deviation",
-tools=[get_statistical_analysis],
+"- Handle annualization options for variance/standard deviation"
+"- For the latest rolling window (e.g. 20-day mean, volatility, drawdown), use the get_rolling_statistics tool instead of refetching the full time frame",
+tools=[get_statistical_analysis, get_rolling_statistics],
 )
 
 # 3. Correlation & Time Series Agent
-correlation_time_series_agent = Agent[AdvancedAnalyticsContext](name="Correlation & Time Series Agent", 
+correlation_time_series_agent = Agent[StockContext](name="Correlation & Time Series Agent", 
 handoff_description="A correlation & time series agent that can help with a company's correlation & time series analysis.",
 instructions="You are a correlation & time series expert."
 "- Compute CORRELATION and COVARIANCE matrices"
@@ -464,7 +788,7 @@ tools=[get_correlation_time_series],
 )
 
 # 4. Output Formatting & Validation Agent
-output_formatting_validation_agent = Agent[AdvancedAnalyticsContext](name="Output Formatting & Validation Agent", 
+output_formatting_validation_agent = Agent[StockContext](name="Output Formatting & Validation Agent", 
 handoff_description="An output formatting & validation agent that can help with a company's output formatting & validation.",
 instructions="You are a output formatting & validation expert."
 "- Structure JSON responses with proper formatting"
@@ -483,8 +807,12 @@ instructions="You are a expert in advanced analytics metrics (e.g. total return,
 "3. Assume interval as daily if not provided."
 "4. Assume ohlc as close if not provided."
 "*Assume calculations as mean, stddev, correlation if not provided."
-"*You can use the WebSearch tool to resolve the stock symbols based on user input only if a stock symbol is not found in the user input.",
-tools=[WebSearchTool(search_context_size="medium", user_location= None)],
+"*You can use the resolve_stock_symbol tool to resolve the stock symbols based on user input only if a stock symbol is not found in the user input. If it finds no match, use the WebSearch tool instead."
+"*For what-if trading questions (e.g. 'what if I had bought when RSI < 30' or 'does a 50/200 day moving average cross work'), use the backtest_strategy tool directly instead of the steps above. "
+"Assume a 5 year time frame, a position size of 1, 1 bps fees and 5 bps slippage if not provided. Report its numbers next to buy and hold and never estimate results yourself."
+"*For portfolio questions (portfolio volatility, beta, value at risk, risk contributions or optimal weights of several holdings), use the get_portfolio_analytics tool directly. "
+"Assume equal weights, a 3 year time frame, SPY as benchmark, 95% confidence and a minimum variance optimization if not provided.",
+tools=[resolve_stock_symbol, WebSearchTool(search_context_size="medium", user_location= None), backtest_strategy, get_portfolio_analytics],
 handoffs=[
     data_retrieval_processing_agent,
     statistical_analysis_agent,
@@ -493,11 +821,21 @@ handoffs=[
 ]
 )
 
+screener_agent = Agent[StockContext](name="Stock Screener Agent", 
+handoff_description="A stock screener agent that can find stocks matching fundamental filters such as P/E, dividend yield or revenue growth.",
+instructions="You are a stock screening expert. Translate the user's criteria into filters for the screen_stocks tool, e.g. 'P/E < 20, dividend yield > 3%, revenue CAGR > 10%, sector = Technology'."
+"Percentages are written with a % sign and market caps with B or T suffixes, e.g. market cap > 10B."
+"Available metrics include P/E, forward P/E, PEG, price to book, price to sales, dividend yield, market cap, EPS, beta, profit margin, operating margin, ROE, ROA, revenue growth, revenue CAGR (3 years), net margin, free cash flow and FCF margin."
+"Present the matches in tabular format with the screened metrics and say how many stocks matched out of the screened universe."
+"If the screen is not valid, explain which filter is wrong and suggest a valid one.",
+tools=[screen_stocks],
+)
+
 stock_triage_agent = Agent(
     name="Stock Triage Agent",
     handoff_description="A stock triage agent that can delegate tasks to the appropriate agent based on the user's request.",
-    instructions="You are a stock triage agent. You can use your tools to delegate tasks to the appropriate agent based on the user's request. You can also use the WebSearch tool to retrieve the stock symbol based on user input only if a stock symbol is not found in the user input.",
-    tools=[WebSearchTool(search_context_size="medium", user_location= None)],
+    instructions="You are a stock triage agent. You can use your tools to delegate tasks to the appropriate agent based on the user's request. You can also use the resolve_stock_symbol tool to retrieve the stock symbol based on user input only if a stock symbol is not found in the user input. If it finds no match, use the WebSearch tool instead.",
+    tools=[resolve_stock_symbol, WebSearchTool(search_context_size="medium", user_location= None)],
     handoffs=[ 
         handoff(agent=stock_analysis_agent, on_handoff=on_stock_analysis_handoff),
         stock_news_agent,
@@ -509,42 +847,136 @@ stock_triage_agent = Agent(
         cashflow_analysis_agent,
         top_gainers_loosers_agent,
         insider_trades_agent,
-        advanced_analytics_agent
+        advanced_analytics_agent,
+        screener_agent
      ]
 )
 
+# Specialists the pre-router may dispatch to directly, skipping the LLM triage
+ROUTED_AGENTS = {
+    "stock_analysis": stock_analysis_agent,
+    "stock_news": stock_news_agent,
+    "etf": etf_agent,
+    "corporate_action": corporate_action_agent,
+    "company_overview": company_overview_agent,
+    "income_statement": income_statement_agent,
+    "earning_analysis": earning_analysis_agent,
+    "cashflow_analysis": cashflow_analysis_agent,
+    "top_gainers_loosers": top_gainers_loosers_agent,
+    "insider_trades": insider_trades_agent,
+    "advanced_analytics": advanced_analytics_agent,
+    "screener": screener_agent,
+}
+
 # MAIN
-async def main():
-    current_agent: Agent[StockContext] = stock_triage_agent
-    input_items: list[TResponseInputItem] = []
-    context = StockContext()
-    # Normally, each input from the user would be an API request to your app, and you can wrap the request in a trace()
-    # Here, we'll just use a random UUID for the conversation ID
-    conversation_id = uuid.uuid4().hex[:16]
-
-    while True:
-        user_input = input("Enter your message: ")
-        with trace("Stock Triage", group_id=conversation_id):
-            input_items.append({"content": user_input, "role": "user"})
-            result = await Runner.run(current_agent, input_items, context=context)
-
-            for new_item in result.new_items:
-                agent_name = new_item.agent.name
-                if isinstance(new_item, MessageOutputItem):
-                    print(f"{agent_name}: {ItemHelpers.text_message_output(new_item)}")
-                elif isinstance(new_item, HandoffOutputItem):
-                    print(
-                        f"Handed off from {new_item.source_agent.name} to {new_item.target_agent.name}"
-                    )
-                elif isinstance(new_item, ToolCallItem):
-                    print(f"{agent_name}: Calling a tool")
-                elif isinstance(new_item, ToolCallOutputItem):
-                    print(f"{agent_name}: Tool call output: {new_item.output}")
-                else:
-                    print(f"{agent_name}: Skipping item: {new_item.__class__.__name__}")
-            input_items = result.to_input_list()
-            current_agent = result.last_agent
+class StockSession:
+    """One conversation: its run context, bounded history and the agent that answers next."""
+
+    def __init__(self, conversation_id: str | None = None, run_config: RunConfig | None = None):
+        # Normally, each input from the user would be an API request to your app, and you can wrap the request in a trace()
+        # Here, we'll just use a random UUID for the conversation ID
+        self.conversation_id = conversation_id or uuid.uuid4().hex[:16]
+        self.context = StockContext()
+        self.history = ConversationHistory()
+        self.current_agent: Agent[StockContext] = stock_triage_agent
+        # e.g. a RunConfig with the replay model provider for benchmarks
+        self.run_config = run_config
+        # Turns of one conversation run one at a time
+        self.lock = asyncio.Lock()
+
+
+async def stream_turn(session: StockSession, user_input: str):
+    """
+    Run one conversation turn with Runner.run_streamed and yield its progress as it happens.
+    If the caller stops iterating or is cancelled before the turn finishes, the run is cancelled.
+    Args:
+        session: The conversation.
+        user_input: The user message.
+    Yields:
+        Event dicts with a "type" of routed, agent, delta, message, handoff, tool_call, tool_output or done.
+    """
+    async with session.lock:
+        with trace("Stock Triage", group_id=session.conversation_id):
+            session.history.append_user(user_input)
+            # Confident rule-based routing skips the LLM triage round-trip
+            # Only messages the triage agent would answer count towards the router's hit rate
+            from_triage = session.current_agent is stock_triage_agent
+            decision = pre_router.route(user_input, triage=from_triage)
+            if decision is not None:
+                session.current_agent = ROUTED_AGENTS[decision.agent_key]
+                if decision.stock_symbol:
+                    session.context.stock_symbol = decision.stock_symbol
+                if decision.agent_key == "stock_analysis":
+                    session.context.time_frame = "daily"
+                yield {"type": "routed", "agent": session.current_agent.name, "reason": decision.reason}
+            started = time.perf_counter()
+            # Old tool outputs are elided or summarized once the history passes its token budget
+            input_items: list[TResponseInputItem] = session.history.compact(session.context)
+            # Tool metrics are tagged with the conversation id and, through the hooks, the calling agent
+            conversation_id_var.set(session.conversation_id)
+            result = Runner.run_streamed(session.current_agent, input_items, context=session.context, hooks=InstrumentationHooks(), run_config=session.run_config)
+            completed = False
+            try:
+                async for event in result.stream_events():
+                    if event.type == "raw_response_event":
+                        if isinstance(event.data, ResponseTextDeltaEvent):
+                            yield {"type": "delta", "text": event.data.delta}
+                    elif event.type == "agent_updated_stream_event":
+                        yield {"type": "agent", "agent": event.new_agent.name}
+                    elif event.type == "run_item_stream_event":
+                        new_item = event.item
+                        agent_name = new_item.agent.name
+                        if isinstance(new_item, MessageOutputItem):
+                            yield {"type": "message", "agent": agent_name, "text": ItemHelpers.text_message_output(new_item)}
+                        elif isinstance(new_item, HandoffOutputItem):
+                            yield {"type": "handoff", "from": new_item.source_agent.name, "to": new_item.target_agent.name}
+                        elif isinstance(new_item, ToolCallItem):
+                            yield {"type": "tool_call", "agent": agent_name, "tool": getattr(new_item.raw_item, "name", "tool")}
+                        elif isinstance(new_item, ToolCallOutputItem):
+                            yield {"type": "tool_output", "agent": agent_name, "output": new_item.output}
+                completed = True
+            finally:
+                if not completed:
+                    # the consumer went away, e.g. a disconnected client: stop the model and tool calls
+                    result.cancel()
+            if from_triage:
+                pre_router.record_run(decision is not None, time.perf_counter() - started)
+            session.history.replace(result.to_input_list())
+            session.current_agent = result.last_agent
+            yield {"type": "done", "agent": session.current_agent.name, "seconds": round(time.perf_counter() - started, 3)}
 
 
+async def main():
+    session = StockSession()
+    # Keeps STOCKS_WATCHLIST warm in the response cache while the CLI waits for input
+    cache_warmer.start()
+    # Polls the news of STOCKS_NEWS_TICKERS and STOCKS_NEWS_TOPICS into the local index
+    news_poller.start()
+    try:
+        while True:
+            user_input = await asyncio.to_thread(input, "Enter your message: ")
+            # Text is printed as it streams in, so long analyses show their first tokens right away
+            async for event in stream_turn(session, user_input):
+                if event["type"] == "routed":
+                    print(f"Routed to {event['agent']} ({event['reason']})")
+                elif event["type"] == "delta":
+                    print(event["text"], end="", flush=True)
+                elif event["type"] == "message":
+                    print("\n")
+                elif event["type"] == "handoff":
+                    print(f"Handed off from {event['from']} to {event['to']}")
+                elif event["type"] == "tool_call":
+                    print(f"{event['agent']}: Calling a tool ({event['tool']})")
+                elif event["type"] == "tool_output":
+                    print(f"{event['agent']}: Tool call output: {event['output']}")
+    finally:
+        print(f"Pre-router: {pre_router.report()}")
+        print(f"History: {session.history.report()}")
+        print(f"Tool metrics: {metrics.report()}")
+        print(f"News index: {news_poller.report()}")
+        await cache_warmer.stop()
+        await news_poller.stop()
+        await close_client()
+
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,294 @@
+import asyncio
+import itertools
+import re
+
+import numpy as np
+
+from analytics_engine import load_series, range_mask, OHLC_COLUMNS, PERIODS_PER_YEAR
+from indicators import bollinger_bands, ema, rsi, sma
+
+# Strategy -> parameter defaults. A parameter given as a list or range is swept.
+STRATEGIES = {
+    # long when RSI falls below `lower`, flat again when it rises above `upper`
+    "RSI": {"period": [14], "lower": [30], "upper": [70]},
+    # long while the fast moving average is above the slow one
+    "SMA_CROSS": {"fast": [50], "slow": [200]},
+    "EMA_CROSS": {"fast": [12], "slow": [26]},
+    # long when the close drops below the lower band, flat again at the middle band
+    "BOLLINGER": {"window": [20], "width": [2]},
+}
+# Look-back parameters must be whole numbers of bars, the band width and RSI thresholds positive
+PERIOD_PARAMETERS = {"period", "fast", "slow", "window"}
+THRESHOLD_PARAMETERS = {"lower", "upper"}
+# Parameter pairs that must be ordered, (smaller, larger); other combinations are skipped
+ORDERED_PARAMETERS = {"RSI": ("lower", "upper"), "SMA_CROSS": ("fast", "slow"), "EMA_CROSS": ("fast", "slow")}
+DEFAULT_TIME_FRAME = "5year"
+DEFAULT_FEE_BPS = 1.0
+DEFAULT_SLIPPAGE_BPS = 5.0
+MAX_COMBINATIONS = 5000
+# Parameter combinations simulated together, bounds the (dates, combinations) matrices in memory
+CHUNK_SIZE = 250
+TOP_RESULTS = 5
+
+_PARAMETER_PATTERN = re.compile(r"^\s*([a-z_]+)\s*=\s*(.+?)\s*$")
+
+
+def _number(text: str) -> float:
+    try:
+        value = float(text)
+    except ValueError:
+        raise ValueError(f"'{text.strip()}' is not a number")
+    if not np.isfinite(value):
+        raise ValueError(f"'{text.strip()}' is not a finite number")
+    return value
+
+
+def _parse_values(text: str) -> list[float]:
+    # "20:40:5" is an inclusive range, "20,25,30" or "20|25|30" a list
+    if ":" in text:
+        parts = [_number(part) for part in text.split(":")]
+        start, stop, step = parts[0], parts[1], parts[2] if len(parts) > 2 else 1.0
+        if step <= 0 or stop < start:
+            raise ValueError(f"'{text}' is not a valid range, use start:stop:step with stop >= start and step > 0")
+        if (stop - start) / step + 1 > MAX_COMBINATIONS:
+            raise ValueError(f"'{text}' holds more than {MAX_COMBINATIONS} values")
+        return np.round(np.arange(start, stop + step / 2, step), 6).tolist()
+    return [_number(part) for part in re.split(r"[,|]", text) if part.strip()]
+
+
+def _check_values(name: str, values: list[float]) -> None:
+    if not values:
+        raise ValueError(f"{name} has no values")
+    if name in PERIOD_PARAMETERS and any(value < 1 or value != int(value) for value in values):
+        raise ValueError(f"{name} must be a whole number of bars of at least 1")
+    if name == "width" and any(value <= 0 for value in values):
+        raise ValueError("width must be greater than 0")
+    if name in THRESHOLD_PARAMETERS and any(not 0 < value < 100 for value in values):
+        raise ValueError(f"{name} must be an RSI level between 0 and 100")
+
+
+def parse_grid(strategy: str, parameters: str | None) -> tuple[str, dict[str, list[float]]]:
+    """
+    Parse a strategy name and its parameter grid, e.g. "period=14; lower=20:35:5; upper=65,70,75".
+    Args:
+        strategy: One of STRATEGIES.
+        parameters: Semicolon separated name=values. Values are one number, a comma separated list
+            or an inclusive start:stop:step range. Missing parameters take the defaults.
+    Returns:
+        The strategy name and parameter -> values.
+    Raises:
+        ValueError: If the strategy or a parameter is unknown, a value is out of range
+            (look-back periods below 1 bar or fractional, widths not above 0), or the grid is too large.
+    """
+    strategy = (strategy or "").strip().upper().replace(" ", "_").replace("-", "_")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown strategy '{strategy}', use one of {', '.join(STRATEGIES)}")
+    grid = {name: list(values) for name, values in STRATEGIES[strategy].items()}
+    for part in (parameters or "").split(";"):
+        if not part.strip():
+            continue
+        match = _PARAMETER_PATTERN.match(part.lower())
+        if match is None or match.group(1) not in grid:
+            raise ValueError(f"'{part.strip()}' is not one of the {strategy} parameters {', '.join(grid)}")
+        try:
+            values = _parse_values(match.group(2))
+            _check_values(match.group(1), values)
+        except ValueError as e:
+            raise ValueError(f"'{part.strip()}' is not valid: {e}")
+        grid[match.group(1)] = values
+    size = int(np.prod([len(values) for values in grid.values()]))
+    if size > MAX_COMBINATIONS:
+        raise ValueError(f"{size} parameter combinations, at most {MAX_COMBINATIONS} are allowed")
+    return strategy, grid
+
+
+def combinations(strategy: str, grid: dict[str, list[float]]) -> dict[str, np.ndarray]:
+    """
+    Expand a parameter grid into one array per parameter, entry i of each array forming combination i.
+    Combinations violating ORDERED_PARAMETERS, such as a fast average slower than the slow one, are dropped.
+    """
+    names = list(grid)
+    rows = np.array(list(itertools.product(*(grid[name] for name in names))), dtype=np.float64).reshape(-1, len(names))
+    params = {name: rows[:, j] for j, name in enumerate(names)}
+    if strategy in ORDERED_PARAMETERS:
+        smaller, larger = ORDERED_PARAMETERS[strategy]
+        keep = params[smaller] < params[larger]
+        params = {name: values[keep] for name, values in params.items()}
+    return params
+
+
+def _by_value(compute, *values: np.ndarray) -> np.ndarray:
+    """Compute an indicator once per distinct parameter tuple and spread it over the combinations."""
+    distinct, inverse = np.unique(np.column_stack(values), axis=0, return_inverse=True)
+    columns = np.column_stack([compute(*row) for row in distinct])
+    return columns[:, inverse.reshape(-1)]
+
+
+def signals(strategy: str, close: np.ndarray, params: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Entry and exit signals of every parameter combination.
+    Args:
+        strategy: One of STRATEGIES.
+        close: The close prices, oldest first.
+        params: Parameter -> one value per combination.
+    Returns:
+        (dates, combinations) boolean entry and exit matrices, evaluated at each bar's close.
+    """
+    prices = close[:, None]
+    with np.errstate(invalid="ignore"):
+        if strategy == "RSI":
+            values = _by_value(lambda period: rsi(prices, int(period))[:, 0], params["period"])
+            return values < params["lower"], values > params["upper"]
+        if strategy in ("SMA_CROSS", "EMA_CROSS"):
+            average = sma if strategy == "SMA_CROSS" else ema
+            fast = _by_value(lambda window: average(prices, int(window))[:, 0], params["fast"])
+            slow = _by_value(lambda window: average(prices, int(window))[:, 0], params["slow"])
+            above = fast > slow
+            return above, ~above
+        # BOLLINGER
+        lower = _by_value(lambda window, width: bollinger_bands(prices, int(window), width)[2][:, 0], params["window"], params["width"])
+        middle = _by_value(lambda window: sma(prices, int(window))[:, 0], params["window"])
+        return prices < lower, prices > middle
+
+
+def positions(entries: np.ndarray, exits: np.ndarray) -> np.ndarray:
+    """
+    Latch entry and exit signals into long (1) or flat (0) positions without a Python loop.
+    A bar with an exit signal is flat, a bar with only an entry signal is long, any other bar
+    keeps the previous position.
+    """
+    state = np.full(entries.shape, np.nan)
+    state[entries] = 1.0
+    state[exits] = 0.0
+    # Forward fill: each bar takes the state of the latest bar with a signal
+    rows = np.where(np.isnan(state), 0, np.arange(len(state))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = np.take_along_axis(state, rows, axis=0)
+    return np.nan_to_num(filled, nan=0.0)
+
+
+def simulate(close: np.ndarray, position: np.ndarray, size: float, cost_bps: float, periods_per_year: int) -> dict[str, np.ndarray]:
+    """
+    Simulate every combination's positions and compute its performance.
+    Signals act at the next bar: the position held over bar t is the one decided at the close of t - 1.
+    Args:
+        close: The close prices, oldest first.
+        position: (dates, combinations) target positions from positions().
+        size: The fraction of equity invested when long.
+        cost_bps: Fees plus slippage per side, in basis points of the traded value.
+        periods_per_year: Bars per year, for the annualized figures.
+    Returns:
+        Metric -> one value per combination.
+    """
+    asset_returns = np.r_[0.0, close[1:] / close[:-1] - 1.0][:, None]
+    held = np.vstack([np.zeros((1, position.shape[1])), position[:-1]])
+    turnover = np.abs(np.diff(held, axis=0, prepend=0.0))
+    returns = held * asset_returns * size - turnover * size * cost_bps / 10_000
+    equity = np.cumprod(1.0 + returns, axis=0)
+    years = len(close) / periods_per_year
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = returns.mean(axis=0) / returns.std(axis=0, ddof=1) * np.sqrt(periods_per_year)
+        cagr = np.where(equity[-1] > 0, equity[-1] ** (1 / years) - 1.0, -1.0)
+    return {
+        "total_return": equity[-1] - 1.0,
+        "cagr": cagr,
+        "sharpe": np.nan_to_num(sharpe, nan=0.0, posinf=0.0, neginf=0.0),
+        "max_drawdown": (equity / np.maximum.accumulate(equity, axis=0) - 1.0).min(axis=0),
+        "trades": (np.diff(held, axis=0) > 0).sum(axis=0),
+        "exposure": held.mean(axis=0),
+    }
+
+
+def _round(value: float, digits: int = 4) -> float:
+    return round(float(value), digits)
+
+
+def run_grid(strategy: str, grid: dict[str, list[float]], close: np.ndarray, window: np.ndarray, size: float,
+             cost_bps: float, periods_per_year: int, top: int = TOP_RESULTS) -> dict:
+    """
+    Backtest every combination of a parameter grid, in chunks of CHUNK_SIZE combinations.
+    Indicators are computed over the full history so they are warmed up when the window starts.
+    Args:
+        strategy: One of STRATEGIES.
+        grid: The parameter grid from parse_grid().
+        close: The full close price history.
+        window: Boolean mask of the bars inside the tested time frame.
+        size: The fraction of equity invested when long.
+        cost_bps: Fees plus slippage per side, in basis points.
+        periods_per_year: Bars per year.
+        top: How many of the best combinations to return.
+    Returns:
+        The best combinations by Sharpe ratio and the spread of results over the whole grid.
+    """
+    params = combinations(strategy, grid)
+    count = len(next(iter(params.values())))
+    if not count:
+        raise ValueError(f"no valid combination, {' must be below '.join(ORDERED_PARAMETERS[strategy])}")
+    results = {}
+    for start in range(0, count, CHUNK_SIZE):
+        chunk = {name: values[start:start + CHUNK_SIZE] for name, values in params.items()}
+        entries, exits = signals(strategy, close, chunk)
+        position = positions(entries, exits)[window]
+        for metric, values in simulate(close[window], position, size, cost_bps, periods_per_year).items():
+            results.setdefault(metric, []).append(values)
+    results = {metric: np.concatenate(values) for metric, values in results.items()}
+    best = np.argsort(-results["sharpe"], kind="stable")[:top]
+    return {
+        "combinations": count,
+        "best": [
+            {"parameters": {name: _round(params[name][i], 2) for name in params},
+             **{metric: int(values[i]) if metric == "trades" else _round(values[i]) for metric, values in results.items()}}
+            for i in best
+        ],
+        "sharpe_spread": {"min": _round(results["sharpe"].min()), "median": _round(np.median(results["sharpe"])),
+                          "max": _round(results["sharpe"].max())},
+        "profitable_share": _round((results["total_return"] > 0).mean(), 3),
+    }
+
+
+async def backtest(stock_symbol: str, strategy: str, parameters: str | None = None, time_frame: str | None = None,
+                   interval: str = "DAILY", position_size: float = 1.0, fee_bps: float = DEFAULT_FEE_BPS,
+                   slippage_bps: float = DEFAULT_SLIPPAGE_BPS) -> dict | None:
+    """
+    Backtest a long-only signal strategy, or a sweep of its parameters, on a symbol's cached price history.
+    Args:
+        stock_symbol: The stock symbol.
+        strategy: RSI, SMA_CROSS, EMA_CROSS or BOLLINGER.
+        parameters: The parameter grid, e.g. "period=14; lower=20:35:5; upper=65,70,75".
+        time_frame: The tested RANGE, e.g. "5year" or "2020-01-01,2024-12-31".
+        interval: DAILY, WEEKLY or MONTHLY.
+        position_size: The fraction of equity invested when long, between 0 and 1.
+        fee_bps: Fees per side, in basis points.
+        slippage_bps: Slippage per side, in basis points.
+    Returns:
+        The grid results next to buy and hold, or None if the price history could not be retrieved.
+    Raises:
+        ValueError: If the strategy, its parameters or the time frame are not valid.
+    """
+    strategy, grid = parse_grid(strategy, parameters)
+    interval = (interval or "DAILY").strip().upper()
+    series = await load_series(stock_symbol, interval)
+    if series is None:
+        return None
+    close = series.ohlcv[:, OHLC_COLUMNS["CLOSE"]]
+    window = range_mask(series.dates, time_frame or DEFAULT_TIME_FRAME)
+    if window.sum() < 3:
+        raise ValueError(f"the time frame '{time_frame}' holds fewer than 3 bars")
+    size = min(max(float(position_size), 0.0), 1.0)
+    cost_bps = max(float(fee_bps), 0.0) + max(float(slippage_bps), 0.0)
+    periods = PERIODS_PER_YEAR.get(interval, 252)
+    result = await asyncio.to_thread(run_grid, strategy, grid, close, window, size, cost_bps, periods)
+    hold = simulate(close[window], np.ones((int(window.sum()), 1)), 1.0, 0.0, periods)
+    dates = series.dates[window]
+    return {
+        "symbol": stock_symbol.strip().upper(),
+        "strategy": strategy,
+        "interval": interval,
+        "start": str(dates[0].astype("datetime64[D]")),
+        "end": str(dates[-1].astype("datetime64[D]")),
+        "bars": int(len(dates)),
+        "position_size": size,
+        "cost_bps_per_side": cost_bps,
+        **result,
+        "buy_and_hold": {metric: _round(values[0]) for metric, values in hold.items() if metric not in ("trades", "exposure")},
+    }
@@ -0,0 +1,143 @@
+import asyncio
+import math
+
+from columnar_store import LABEL_FIELDS, normalize_reports, store
+from http_client import fetch_alpha_vantage
+from projections import ANNUAL_EARNINGS_FIELDS, CASHFLOW_FIELDS, INCOME_STATEMENT_FIELDS, QUARTERLY_EARNINGS_FIELDS
+
+MAX_BATCH_SYMBOLS = 10
+
+# Statement function -> (annual report key, quarterly report key, compared metrics)
+BATCH_STATEMENTS = {
+    "INCOME_STATEMENT": ("annualReports", "quarterlyReports", [f for f in INCOME_STATEMENT_FIELDS if f not in LABEL_FIELDS]),
+    "CASH_FLOW": ("annualReports", "quarterlyReports", [f for f in CASHFLOW_FIELDS if f not in LABEL_FIELDS]),
+    "EARNINGS": ("annualEarnings", "quarterlyEarnings",
+                 [f for f in dict.fromkeys(ANNUAL_EARNINGS_FIELDS + QUARTERLY_EARNINGS_FIELDS) if f not in LABEL_FIELDS]),
+}
+# OVERVIEW fields put side by side for a company comparison
+OVERVIEW_COMPARISON_FIELDS = [
+    "Symbol", "Name", "Sector", "Industry", "Currency", "FiscalYearEnd", "MarketCapitalization",
+    "EBITDA", "PERatio", "PEGRatio", "BookValue", "DividendYield", "EPS", "ProfitMargin",
+    "OperatingMarginTTM", "ReturnOnAssetsTTM", "ReturnOnEquityTTM", "RevenueTTM",
+    "QuarterlyEarningsGrowthYOY", "QuarterlyRevenueGrowthYOY", "AnalystTargetPrice",
+    "TrailingPE", "ForwardPE", "PriceToSalesRatioTTM", "PriceToBookRatio", "Beta",
+    "52WeekHigh", "52WeekLow",
+]
+
+
+def parse_symbols(stock_symbols: str) -> list[str]:
+    """Split a comma separated symbol list into distinct upper case symbols, capped at MAX_BATCH_SYMBOLS."""
+    symbols = []
+    for symbol in stock_symbols.replace(" ", ",").split(","):
+        symbol = symbol.strip().upper()
+        if symbol and symbol not in symbols:
+            symbols.append(symbol)
+    return symbols[:MAX_BATCH_SYMBOLS]
+
+
+async def fetch_many(function: str, symbols: list[str]) -> dict[str, dict | None]:
+    """
+    Fetch one Alpha Vantage function for several symbols concurrently.
+    Every request still goes through the shared cache, single-flight and quota scheduler,
+    so the fan-out never exceeds the rate limit.
+    Args:
+        function: The Alpha Vantage function, e.g. CASH_FLOW.
+        symbols: The stock symbols.
+    Returns:
+        The payload per symbol, None where it could not be retrieved.
+    """
+    payloads = await asyncio.gather(*(fetch_alpha_vantage(function, symbol=symbol) for symbol in symbols), return_exceptions=True)
+    return {symbol: payload if isinstance(payload, dict) else None for symbol, payload in zip(symbols, payloads)}
+
+
+def _number(value: float) -> float | None:
+    return None if math.isnan(value) else float(value)
+
+
+def comparison_table(function: str, payloads: dict[str, dict | None], period: str = "annual", periods: int = 3) -> dict:
+    """
+    Align several symbols' statements into one table.
+    Annual rows are aligned on the fiscal year, since companies close their fiscal years in
+    different months; quarterly rows on the calendar quarter of the fiscal date.
+    Args:
+        function: The statement function, one of BATCH_STATEMENTS.
+        payloads: The payload per symbol.
+        period: annual or quarterly.
+        periods: How many of the latest periods to keep.
+    Returns:
+        The column names, one row of values per (period, symbol) with the latest period first,
+        and the symbols with no data.
+    """
+    annual_key, quarterly_key, metrics = BATCH_STATEMENTS[function]
+    reports_key = annual_key if period == "annual" else quarterly_key
+    rows, currencies, missing = [], {}, []
+    for symbol, payload in payloads.items():
+        table = normalize_reports(symbol, (payload or {}).get(reports_key))
+        if not len(table.dates):
+            missing.append(symbol)
+            continue
+        currencies[symbol] = table.currency
+        values = table.columns(metrics)
+        for i in range(len(table.dates) - 1, max(len(table.dates) - 1 - periods, -1), -1):
+            date = str(table.dates[i])
+            label = f"FY{date[:4]}" if period == "annual" else f"{date[:4]}-Q{(int(date[5:7]) - 1) // 3 + 1}"
+            rows.append([label, symbol, date, *(_number(value) for value in values[i])])
+    order = list(payloads)
+    rows.sort(key=lambda row: (row[0], -order.index(row[1])), reverse=True)
+    return {
+        "statement": function,
+        "period": period,
+        "columns": ["period", "symbol", "fiscalDateEnding", *metrics],
+        "currency": currencies,
+        "rows": rows,
+        "missing": missing,
+    }
+
+
+async def compare_statements(stock_symbols: str, function: str, period: str = "annual", periods: int = 3) -> dict | None:
+    """
+    Fetch a statement for several symbols at once and return the aligned comparison table.
+    Args:
+        stock_symbols: The comma separated stock symbols.
+        function: The statement function, one of BATCH_STATEMENTS.
+        period: annual or quarterly.
+        periods: How many of the latest periods per symbol.
+    Returns:
+        The comparison table, or None if no symbol could be retrieved.
+    """
+    symbols = parse_symbols(stock_symbols)
+    payloads = await fetch_many(function, symbols)
+    if not any(payloads.values()):
+        return None
+    # keep typed columns of the statements in the local store
+    for symbol, payload in payloads.items():
+        if payload:
+            await asyncio.to_thread(store.ingest_statement, symbol, function, payload)
+    period = "quarterly" if period.strip().lower().startswith("q") else "annual"
+    return comparison_table(function, payloads, period, max(1, periods))
+
+
+async def compare_overviews(stock_symbols: str) -> dict | None:
+    """
+    Fetch the company overview for several symbols at once and put the key ratios side by side.
+    Args:
+        stock_symbols: The comma separated stock symbols.
+    Returns:
+        The OVERVIEW_COMPARISON_FIELDS columns and one row of values per symbol, or None if no symbol could be retrieved.
+    """
+    payloads = await fetch_many("OVERVIEW", parse_symbols(stock_symbols))
+    # error and throttle notices, and the {} Alpha Vantage returns for unknown symbols, carry no Symbol
+    overviews = {symbol: payload for symbol, payload in payloads.items() if payload and payload.get("Symbol")}
+    if not overviews:
+        return None
+    for symbol, payload in overviews.items():
+        await asyncio.to_thread(store.ingest_overview, symbol, payload)
+    rows = [
+        [None if payload.get(field) in ("None", "-") else payload.get(field) for field in OVERVIEW_COMPARISON_FIELDS]
+        for payload in overviews.values()
+    ]
+    return {
+        "columns": OVERVIEW_COMPARISON_FIELDS,
+        "rows": rows,
+        "missing": [symbol for symbol in payloads if symbol not in overviews],
+    }
@@ -0,0 +1,144 @@
+"""
+Drive scripted conversations through the Stocks agents and report turn latency, tool counts and tokens.
+
+Record fixtures once with live access, then benchmark offline:
+    python benchmark.py --mode record --iterations 1
+    python benchmark.py --mode replay --iterations 5 --save baseline.json
+    python benchmark.py --mode replay --iterations 5 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONVERSATIONS = os.path.join(BENCHMARK_DIR, "benchmark_conversations.json")
+# Report fields compared against a baseline, higher is worse
+REGRESSION_FIELDS = ["p50_turn_seconds", "p95_turn_seconds", "p50_first_token_seconds", "tool_calls", "input_tokens", "output_tokens", "tool_output_tokens"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["record", "replay", "off"], default="replay", help="record fixtures, replay them, or run live")
+    parser.add_argument("--conversations", default=DEFAULT_CONVERSATIONS, help="JSON list of {name, turns}")
+    parser.add_argument("--iterations", type=int, default=3, help="times each conversation is run")
+    parser.add_argument("--fixtures", help="fixture directory, defaults to STOCKS_FIXTURE_DIR")
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="compare with a saved report and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative increase over the baseline")
+    return parser.parse_args()
+
+
+def configure(args) -> None:
+    """Set up the environment before the app modules read it at import time."""
+    os.environ["STOCKS_REPLAY_MODE"] = args.mode
+    if args.fixtures:
+        os.environ["STOCKS_FIXTURE_DIR"] = args.fixtures
+    if args.mode == "replay":
+        # fixtures are local, so the free tier quota must not throttle the replay
+        os.environ["ALPHA_VANTAGE_CALLS_PER_MINUTE"] = "100000"
+        os.environ["ALPHA_VANTAGE_CALLS_PER_DAY"] = "1000000"
+        os.environ.setdefault("OPENAI_API_KEY", "replay")
+        os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+    # every conversation starts cold, a shared disk tier would hide the tool latency
+    os.environ.pop("STOCKS_CACHE_DIR", None)
+    os.environ.pop("STOCKS_WATCHLIST", None)
+    if args.mode in ("record", "replay"):
+        # a persisted news index or columnar store would serve rows the fixtures never saw
+        scratch = tempfile.mkdtemp(prefix="stocks-benchmark-")
+        os.environ["STOCKS_NEWS_DB"] = os.path.join(scratch, "news.db")
+        os.environ["STOCKS_STORE_DIR"] = os.path.join(scratch, "store")
+
+
+def percentile(values: list[float], q: float) -> float:
+    import numpy as np
+
+    return round(float(np.percentile(values, q)), 4) if values else 0.0
+
+
+async def run(args) -> dict:
+    from agents import RunConfig
+
+    from app import StockSession, stream_turn
+    from http_client import close_client
+    from instrumentation import metrics
+    from replay import ReplayModelProvider
+    from response_cache import response_cache
+
+    with open(args.conversations, encoding="utf-8") as f:
+        conversations = json.load(f)
+
+    results = {}
+    try:
+        for conversation in conversations:
+            turn_seconds, first_token_seconds, tool_calls, failures = [], [], 0, 0
+            provider = ReplayModelProvider()
+            tool_tokens_before = metrics.total_tokens
+            for _ in range(args.iterations):
+                response_cache.clear()
+                session = StockSession(run_config=RunConfig(model_provider=provider))
+                for user_input in conversation["turns"]:
+                    started, first_token = time.perf_counter(), None
+                    try:
+                        async for event in stream_turn(session, user_input):
+                            if event["type"] == "delta" and first_token is None:
+                                first_token = time.perf_counter() - started
+                            elif event["type"] == "tool_call":
+                                tool_calls += 1
+                    except Exception as e:
+                        failures += 1
+                        print(f"{conversation['name']}: {type(e).__name__}: {e}", file=sys.stderr)
+                        break
+                    turn_seconds.append(time.perf_counter() - started)
+                    if first_token is not None:
+                        first_token_seconds.append(first_token)
+            results[conversation["name"]] = {
+                "turns": len(turn_seconds),
+                "failures": failures,
+                "p50_turn_seconds": percentile(turn_seconds, 50),
+                "p95_turn_seconds": percentile(turn_seconds, 95),
+                "p50_first_token_seconds": percentile(first_token_seconds, 50),
+                "p95_first_token_seconds": percentile(first_token_seconds, 95),
+                "tool_calls": tool_calls / args.iterations,
+                "model_requests": provider.usage["requests"] / args.iterations,
+                "input_tokens": provider.usage["input_tokens"] / args.iterations,
+                "output_tokens": provider.usage["output_tokens"] / args.iterations,
+                "tool_output_tokens": (metrics.total_tokens - tool_tokens_before) / args.iterations,
+            }
+    finally:
+        await close_client()
+    return results
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """List the fields that got worse than the baseline by more than the tolerance."""
+    found = []
+    for name, result in report.items():
+        for field in REGRESSION_FIELDS:
+            old, new = baseline.get(name, {}).get(field), result.get(field)
+            if old and new is not None and new > old * (1 + tolerance):
+                found.append(f"{name}.{field}: {old} -> {new}")
+    return found
+
+
+def main():
+    args = parse_args()
+    configure(args)
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for line in found:
+            print(f"Regression: {line}", file=sys.stderr)
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+from analytics_engine import OUTPUT_SIZE, load_series
+from columnar_store import store
+from market_calendar import MARKET_TIMEZONE, REGULAR, session_at
+from http_client import close_client, fetch_alpha_vantage, fetch_quote, quote_keys
+from rate_limiter import PRIORITY_BACKGROUND, quota_scheduler
+from response_cache import make_key, response_cache, ttl_for
+
+WATCHLIST = [s.strip().upper() for s in os.getenv("STOCKS_WATCHLIST", "").split(",") if s.strip()]
+QUOTE_REFRESH_SECONDS = float(os.getenv("STOCKS_WARM_QUOTE_SECONDS", "900"))
+MOVERS_REFRESH_SECONDS = float(os.getenv("STOCKS_WARM_MOVERS_SECONDS", "300"))
+FUNDAMENTALS_CHECK_SECONDS = float(os.getenv("STOCKS_WARM_FUNDAMENTALS_SECONDS", "3600"))
+TICK_SECONDS = 30.0
+
+# Refreshed when new earnings are reported, or when their cache entry is about to expire
+FUNDAMENTAL_FUNCTIONS = ["EARNINGS", "INCOME_STATEMENT", "CASH_FLOW", "OVERVIEW"]
+
+
+def _latest_report_timestamp(earnings: dict | None) -> float | None:
+    """
+    Get the end of the day the latest quarterly earnings were reported, from a cached EARNINGS payload.
+    Reports come out before the open or after the close, so statements are complete by then.
+    """
+    dates = [r.get("reportedDate") for r in (earnings or {}).get("quarterlyEarnings", []) if r.get("reportedDate")]
+    if not dates:
+        return None
+    return (datetime.fromisoformat(max(dates)).replace(tzinfo=MARKET_TIMEZONE) + timedelta(days=1)).timestamp()
+
+
+class CacheWarmer:
+    """
+    Background worker that keeps a watchlist warm in the response cache.
+    Quotes are refreshed during market hours, TOP_GAINERS_LOSERS every few minutes while the
+    market is open, and fundamentals once new earnings are reported or their entry is about
+    to expire. Every call runs at PRIORITY_BACKGROUND, so the quota scheduler serves
+    interactive calls first and sheds warming before it can eat the daily reserve.
+    """
+
+    def __init__(self, symbols: list[str] | None = None):
+        self.symbols = symbols if symbols is not None else WATCHLIST
+        self.refreshed = 0
+        self.skipped = 0
+        self._next_run = {"fundamentals": 0.0, "quotes": 0.0, "movers": 0.0}
+        self._task: asyncio.Task | None = None
+
+    async def _refresh(self, function: str, **params) -> bool:
+        payload = await fetch_alpha_vantage(function, priority=PRIORITY_BACKGROUND, refresh=True, **params)
+        if payload is None:
+            self.skipped += 1
+            return False
+        self.refreshed += 1
+        # fundamentals also feed the screener's universe in the local store
+        if function == "OVERVIEW":
+            await asyncio.to_thread(store.ingest_overview, params["symbol"], payload)
+        elif function in ("INCOME_STATEMENT", "CASH_FLOW", "EARNINGS"):
+            await asyncio.to_thread(store.ingest_statement, params["symbol"], function, payload)
+        return True
+
+    async def warm_quotes(self, session_open: bool = True) -> None:
+        """
+        Refresh the quotes and daily series of the watchlist.
+        Quotes are warmed through fetch_quote, so they land under the keys get_stock_data reads.
+        During the session an entry is refreshed when it expires before the next pass.
+        Outside it only missing entries are fetched, the session aware TTL keeps the close fresh.
+        """
+        for symbol in self.symbols:
+            try:
+                if self._due(quote_keys(symbol)[0], session_open):
+                    await self._warm_quote(symbol)
+                key = make_key("TIME_SERIES_DAILY", {"symbol": symbol, "outputsize": OUTPUT_SIZE})
+                if self._due(key, session_open) and await self._refresh("TIME_SERIES_DAILY", symbol=symbol, outputsize=OUTPUT_SIZE):
+                    # parse once here so the first analytics question finds the series in the store
+                    await load_series(symbol)
+            except Exception as e:
+                self.skipped += 1
+                print(f"Cache warmer quote error for {symbol}: {e}")
+
+    @staticmethod
+    def _due(key: str, session_open: bool) -> bool:
+        expires_at = response_cache.expires_at(key)
+        return expires_at is None or (session_open and expires_at - time.time() <= QUOTE_REFRESH_SECONDS)
+
+    async def _warm_quote(self, symbol: str) -> None:
+        if await fetch_quote(symbol, priority=PRIORITY_BACKGROUND, refresh=True) is None:
+            self.skipped += 1
+            return
+        self.refreshed += 1
+        # a warmed quote that the tool cannot find means the key builders drifted apart
+        if all(response_cache.expires_at(key) is None for key in quote_keys(symbol)):
+            print(f"Cache warmer warning: the quote of {symbol} is not cached under the keys get_stock_data reads")
+
+    async def warm_movers(self) -> None:
+        """Refresh the market wide top gainers, losers and most active list."""
+        await self._refresh("TOP_GAINERS_LOSERS")
+
+    async def warm_fundamentals(self) -> None:
+        """Refresh each symbol's fundamentals that are missing, about to expire, or older than its latest earnings report."""
+        for symbol in self.symbols:
+            try:
+                await self._warm_fundamentals(symbol)
+            except Exception as e:
+                # e.g. a malformed reportedDate, the rest of the watchlist is still warmed
+                self.skipped += 1
+                print(f"Cache warmer fundamentals error for {symbol}: {e}")
+
+    async def _warm_fundamentals(self, symbol: str) -> None:
+        earnings = response_cache.get(make_key("EARNINGS", {"symbol": symbol}), allow_stale=True)
+        reported_at = _latest_report_timestamp(earnings)
+        for function in FUNDAMENTAL_FUNCTIONS:
+            expires_at = response_cache.expires_at(make_key(function, {"symbol": symbol}))
+            cached_at = None if expires_at is None else expires_at - ttl_for(function)
+            stale = expires_at is None or expires_at - time.time() <= FUNDAMENTALS_CHECK_SECONDS
+            reported = reported_at is not None and cached_at is not None and cached_at < reported_at <= time.time()
+            if stale or reported:
+                await self._refresh(function, symbol=symbol)
+                if function == "EARNINGS":
+                    reported_at = _latest_report_timestamp(response_cache.get(make_key("EARNINGS", {"symbol": symbol})))
+
+    async def run_once(self) -> None:
+        """Run every task that is due."""
+        now = time.monotonic()
+        # exchange holidays and early closes come from the market calendar
+        is_open = session_at() == REGULAR
+        if now >= self._next_run["fundamentals"]:
+            self._next_run["fundamentals"] = now + FUNDAMENTALS_CHECK_SECONDS
+            await self.warm_fundamentals()
+        if now >= self._next_run["quotes"]:
+            self._next_run["quotes"] = now + QUOTE_REFRESH_SECONDS
+            await self.warm_quotes(is_open)
+        if is_open and now >= self._next_run["movers"]:
+            self._next_run["movers"] = now + MOVERS_REFRESH_SECONDS
+            await self.warm_movers()
+
+    async def run(self) -> None:
+        """Warm the cache until cancelled."""
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Cache warmer error: {e}")
+            await asyncio.sleep(TICK_SECONDS)
+
+    def start(self) -> asyncio.Task | None:
+        """Start the worker on the running event loop if there is a watchlist."""
+        if self.symbols and self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Cancel the worker."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def report(self) -> dict:
+        """Summarize the warming work done so far."""
+        return {
+            "symbols": self.symbols,
+            "refreshed": self.refreshed,
+            "skipped": self.skipped,
+            "daily_remaining": quota_scheduler.metrics()["daily_remaining"],
+        }
+
+
+# Process wide warmer, started by the CLI and the API server when STOCKS_WATCHLIST is set
+cache_warmer = CacheWarmer()
+
+
+async def main():
+    try:
+        await cache_warmer.run()
+    finally:
+        print(f"Cache warmer: {cache_warmer.report()}")
+        await close_client()
+
+
+if __name__ == "__main__":
+    # Standalone warming, e.g. before the open. Set STOCKS_CACHE_DIR so the app
+    # process reads the warmed entries from the shared disk tier.
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+import asyncio
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from single_flight import flights
+from income_stmt_trend import DEFAULT_METRICS, PROFITABILITY_METRICS, REVENUE_METRICS, _as_dict, draw_timeline
+
+PRESETS = {
+    "default": DEFAULT_METRICS,
+    "profitability": PROFITABILITY_METRICS,
+    "revenue": REVENUE_METRICS,
+}
+CHART_DIR = os.getenv("STOCKS_CHART_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "charts"))
+CACHE_SIZE = 64
+FORMATS = {"png", "svg"}
+_UNSAFE_SYMBOL = re.compile(r"[^A-Z0-9.\-]")
+_UNSAFE_DATE = re.compile(r"[^0-9\-]")
+
+# Figures are built with the object oriented API on the Agg canvas, never through pyplot's
+# global state, so renders in different threads do not share a figure.
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CHART_WORKERS", "2")), thread_name_prefix="chart")
+_cache: OrderedDict[tuple, bytes] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def render_timeline(income_stmt, metrics=None, fmt="png"):
+    """
+    Render the annual metrics timeline to image bytes without a GUI backend.
+
+    Args:
+        income_stmt (dict): Income statement data
+        metrics (list): List of metrics to plot (default: DEFAULT_METRICS)
+        fmt (str): 'png' or 'svg'
+    """
+    figure = Figure(figsize=(12, 6))
+    FigureCanvasAgg(figure)
+    draw_timeline(figure.add_subplot(), income_stmt, metrics)
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def _cache_key(income_stmt, metrics, fmt):
+    dates = [report.get("fiscalDateEnding", "") for report in income_stmt.get("annualReports", [])]
+    return (income_stmt.get("symbol"), tuple(metrics), max(dates, default=""), fmt)
+
+
+def _validate(preset, metrics, fmt):
+    if not metrics and preset not in PRESETS:
+        raise ValueError(f"preset must be one of {', '.join(PRESETS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(sorted(FORMATS))}")
+
+
+async def render_chart(income_stmt, preset="default", metrics=None, fmt="png"):
+    """
+    Render a chart in the worker pool, reusing a cached render of the same statement.
+
+    Args:
+        income_stmt (dict): Income statement data
+        preset (str): One of PRESETS, used when metrics is not given
+        metrics (list): Custom list of metrics to plot
+        fmt (str): 'png' or 'svg'
+    Returns:
+        The image bytes.
+    Raises:
+        ValueError: If the preset or format is not known.
+    """
+    income_stmt = _as_dict(income_stmt)
+    _validate(preset, metrics, fmt)
+    metrics = list(metrics or PRESETS[preset])
+    key = _cache_key(income_stmt, metrics, fmt)
+    with _cache_lock:
+        image = _cache.get(key)
+        if image is not None:
+            _cache.move_to_end(key)
+            return image
+    # Concurrent requests for the same chart share one render
+    loop = asyncio.get_running_loop()
+    image = await flights.do(("chart", *key), loop.run_in_executor, _executor, render_timeline, income_stmt, metrics, fmt)
+    with _cache_lock:
+        _cache[key] = image
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return image
+
+
+async def save_chart(income_stmt, preset="default", metrics=None, fmt="png"):
+    """
+    Render a chart and write it under CHART_DIR.
+    The file name only keeps safe characters of the statement's symbol and date, so it cannot
+    point outside CHART_DIR.
+
+    Returns:
+        The path of the written file.
+    Raises:
+        ValueError: If the preset or format is not known.
+    """
+    income_stmt = _as_dict(income_stmt)
+    image = await render_chart(income_stmt, preset, metrics, fmt)
+    symbol, _, last_date, _ = _cache_key(income_stmt, list(metrics or PRESETS[preset]), fmt)
+    symbol = _UNSAFE_SYMBOL.sub("", str(symbol or "").upper()).strip(".") or "chart"
+    last_date = _UNSAFE_DATE.sub("", str(last_date or "")) or "latest"
+    label = "custom" if metrics else preset
+    path = os.path.join(CHART_DIR, f"{symbol}_{label}_{last_date}.{fmt}")
+
+    def write():
+        os.makedirs(CHART_DIR, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(image)
+
+    await asyncio.get_running_loop().run_in_executor(_executor, write)
+    return path
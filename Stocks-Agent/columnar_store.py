@@ -0,0 +1,267 @@
+import os
+import threading
+
+import numpy as np
+
+STORE_DIR = os.getenv("STOCKS_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "store"))
+
+# Payload keys holding the report lists of each statement type
+PERIOD_KEYS = {
+    "annual": ("annualReports", "annualEarnings"),
+    "quarterly": ("quarterlyReports", "quarterlyEarnings"),
+}
+# Report fields that are labels rather than numbers
+LABEL_FIELDS = {"fiscalDateEnding", "reportedCurrency", "reportedDate", "reportTime"}
+# OVERVIEW fields kept as text labels, every other numeric field is stored as a metric
+OVERVIEW_LABEL_FIELDS = ["Name", "AssetType", "Exchange", "Currency", "Country", "Sector", "Industry", "LatestQuarter"]
+
+
+class StatementTable:
+    """One statement's periods as typed columns: dates x metrics float64 values, NaN where missing."""
+
+    def __init__(self, symbol: str, dates: np.ndarray, metrics: np.ndarray, values: np.ndarray, currency: str = ""):
+        self.symbol = symbol
+        self.dates = dates
+        self.metrics = metrics
+        self.values = values
+        self.currency = currency
+
+    def column(self, metric: str) -> np.ndarray:
+        """Get one metric over all periods, NaN if the metric is not stored."""
+        index = np.flatnonzero(self.metrics == metric)
+        return self.values[:, index[0]] if len(index) else np.full(len(self.dates), np.nan)
+
+    def columns(self, metrics: list[str]) -> np.ndarray:
+        """Get several metrics as a (periods, metrics) matrix."""
+        return np.column_stack([self.column(metric) for metric in metrics]) if metrics else np.empty((len(self.dates), 0))
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # Alpha Vantage sends missing values as the literal string "None"
+        return np.nan
+
+
+def normalize_reports(symbol: str, reports: list[dict]) -> StatementTable:
+    """
+    Convert a list of Alpha Vantage reports of string values into a typed table.
+    Args:
+        symbol: The stock symbol.
+        reports: The annualReports or quarterlyReports list.
+    Returns:
+        The table, oldest period first.
+    """
+    reports = sorted((r for r in reports or [] if r.get("fiscalDateEnding")), key=lambda r: r["fiscalDateEnding"])
+    metrics = sorted({key for report in reports for key in report} - LABEL_FIELDS)
+    dates = np.array([r["fiscalDateEnding"] for r in reports], dtype="datetime64[D]")
+    values = np.array([[_to_float(r.get(metric)) for metric in metrics] for r in reports], dtype=np.float64).reshape(len(reports), len(metrics))
+    currency = next((r["reportedCurrency"] for r in reports if r.get("reportedCurrency")), "")
+    return StatementTable(symbol, dates, np.array(metrics, dtype=str), values, currency)
+
+
+def merge_tables(old: StatementTable, new: StatementTable) -> StatementTable:
+    """
+    Append new periods and metrics to an existing table. Newer values win for periods in both.
+    Args:
+        old: The stored table.
+        new: The freshly normalized table.
+    Returns:
+        The merged table.
+    """
+    dates = np.union1d(old.dates, new.dates)
+    metrics = np.union1d(old.metrics, new.metrics)
+    values = np.full((len(dates), len(metrics)), np.nan)
+    for table in (old, new):
+        rows = np.searchsorted(dates, table.dates)
+        cols = np.searchsorted(metrics, table.metrics)
+        block = values[np.ix_(rows, cols)]
+        values[np.ix_(rows, cols)] = np.where(np.isnan(table.values), block, table.values)
+    return StatementTable(new.symbol, dates, metrics, values, new.currency or old.currency)
+
+
+def _same_arrays(old: dict, new: dict) -> bool:
+    """Check whether two sets of stored arrays hold the same values, NaN equal to NaN."""
+    return old.keys() == new.keys() and all(
+        old[name].shape == new[name].shape and old[name].dtype.kind == new[name].dtype.kind
+        and np.array_equal(old[name], new[name], equal_nan=old[name].dtype.kind == "f")
+        for name in new
+    )
+
+
+class ColumnarStore:
+    """
+    Local store of typed fundamentals and OHLC history, one .npz file per symbol and table.
+    Layout:
+        fundamentals/<SYMBOL>/<STATEMENT>_<annual|quarterly>.npz  dates, metrics, values, currency
+        fundamentals/<SYMBOL>/OVERVIEW.npz                        metrics, values, label_names, labels
+        ohlc/<SYMBOL>_<INTERVAL>.npz                              dates, ohlcv
+    """
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        # Last payload object written per (symbol, statement), cached payloads are only written once
+        self._ingested: dict[tuple[str, str], object] = {}
+        # Bumped when a fundamentals write changes a table, readers rebuild derived views when it changes
+        self.version = 0
+
+    def _statement_path(self, symbol: str, statement: str, period: str) -> str:
+        return os.path.join(self.root, "fundamentals", symbol.upper(), f"{statement.upper()}_{period}.npz")
+
+    def _overview_path(self, symbol: str) -> str:
+        return os.path.join(self.root, "fundamentals", symbol.upper(), "OVERVIEW.npz")
+
+    def _series_path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, "ohlc", f"{symbol.upper()}_{interval.upper()}.npz")
+
+    def _save(self, path: str, **arrays) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def _load(self, path: str):
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+
+    def read_statement(self, symbol: str, statement: str, period: str = "annual") -> StatementTable | None:
+        """
+        Read a stored statement table.
+        Args:
+            symbol: The stock symbol.
+            statement: The Alpha Vantage function, e.g. INCOME_STATEMENT.
+            period: annual or quarterly.
+        Returns:
+            The table, or None if nothing is stored.
+        """
+        data = self._load(self._statement_path(symbol, statement, period))
+        if data is None:
+            return None
+        return StatementTable(symbol.upper(), data["dates"], data["metrics"], data["values"], str(data["currency"]))
+
+    def write_statement(self, symbol: str, statement: str, payload: dict) -> None:
+        """
+        Normalize a statement payload and append it to the stored tables.
+        Args:
+            symbol: The stock symbol.
+            statement: The Alpha Vantage function, e.g. INCOME_STATEMENT.
+            payload: The decoded statement payload.
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            for period, keys in PERIOD_KEYS.items():
+                reports = next((payload[key] for key in keys if payload.get(key)), None)
+                if not reports:
+                    continue
+                path = self._statement_path(symbol, statement, period)
+                stored = self._load(path)
+                table = normalize_reports(symbol, reports)
+                if stored is not None:
+                    table = merge_tables(StatementTable(symbol, stored["dates"], stored["metrics"], stored["values"], str(stored["currency"])), table)
+                arrays = {"dates": table.dates, "metrics": table.metrics, "values": table.values, "currency": np.array(table.currency)}
+                if stored is not None and _same_arrays(stored, arrays):
+                    continue
+                self._save(path, **arrays)
+                self.version += 1
+
+    def ingest_statement(self, symbol: str, statement: str, payload: dict) -> None:
+        """Write a statement payload unless this same payload object was already written."""
+        key = (symbol.upper(), statement.upper())
+        if self._ingested.get(key) is payload:
+            return
+        self.write_statement(symbol, statement, payload)
+        self._ingested[key] = payload
+
+    def read_overview(self, symbol: str) -> dict | None:
+        """
+        Read a stored company overview.
+        Args:
+            symbol: The stock symbol.
+        Returns:
+            The metric names, their values and the label fields, or None if nothing is stored.
+        """
+        data = self._load(self._overview_path(symbol))
+        if data is None:
+            return None
+        return {"metrics": data["metrics"], "values": data["values"], "labels": dict(zip(data["label_names"].tolist(), data["labels"].tolist()))}
+
+    def write_overview(self, symbol: str, payload: dict) -> None:
+        """
+        Store the latest company overview, numeric fields as metrics and OVERVIEW_LABEL_FIELDS as labels.
+        Args:
+            symbol: The stock symbol.
+            payload: The decoded OVERVIEW payload.
+        """
+        # CIK parses as a number but is an identifier
+        metrics = sorted(key for key, value in payload.items()
+                         if key not in OVERVIEW_LABEL_FIELDS and key != "CIK" and not np.isnan(_to_float(value)))
+        arrays = {
+            "metrics": np.array(metrics, dtype=str),
+            "values": np.array([_to_float(payload[metric]) for metric in metrics], dtype=np.float64),
+            "label_names": np.array(OVERVIEW_LABEL_FIELDS, dtype=str),
+            "labels": np.array([str(payload.get(field) or "") for field in OVERVIEW_LABEL_FIELDS], dtype=str),
+        }
+        with self._lock:
+            path = self._overview_path(symbol)
+            stored = self._load(path)
+            if stored is not None and _same_arrays(stored, arrays):
+                return
+            self._save(path, **arrays)
+            self.version += 1
+
+    def ingest_overview(self, symbol: str, payload: dict) -> None:
+        """Write an overview payload unless this same payload object was already written."""
+        key = (symbol.upper(), "OVERVIEW")
+        if self._ingested.get(key) is payload or not payload.get("Symbol"):
+            return
+        self.write_overview(symbol, payload)
+        self._ingested[key] = payload
+
+    def read_series(self, symbol: str, interval: str = "DAILY") -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Read stored OHLCV history.
+        Returns:
+            The dates and the (dates, 5) OHLCV matrix, or None if nothing is stored.
+        """
+        data = self._load(self._series_path(symbol, interval))
+        return None if data is None else (data["dates"], data["ohlcv"])
+
+    def write_series(self, symbol: str, interval: str, dates: np.ndarray, ohlcv: np.ndarray) -> None:
+        """
+        Append OHLCV bars to the stored history. Bars already stored are replaced by the new ones.
+        Args:
+            symbol: The stock symbol.
+            interval: The bar interval, e.g. DAILY.
+            dates: The bar timestamps, ascending.
+            ohlcv: The (dates, 5) OHLCV matrix.
+        """
+        with self._lock:
+            stored = self.read_series(symbol, interval)
+            if stored is not None:
+                old_dates, old_ohlcv = stored
+                keep = ~np.isin(old_dates, dates)
+                dates = np.concatenate([old_dates[keep], dates])
+                ohlcv = np.concatenate([old_ohlcv[keep], ohlcv])
+                order = np.argsort(dates, kind="stable")
+                dates, ohlcv = dates[order], ohlcv[order]
+            self._save(self._series_path(symbol, interval), dates=dates, ohlcv=ohlcv)
+
+    def symbols(self, statement: str | None = None) -> list[str]:
+        """List the symbols with stored fundamentals, optionally only those with the given statement."""
+        root = os.path.join(self.root, "fundamentals")
+        if not os.path.isdir(root):
+            return []
+        return sorted(
+            symbol for symbol in os.listdir(root)
+            if statement is None or os.path.exists(self._statement_path(symbol, statement, "annual"))
+            or os.path.exists(self._statement_path(symbol, statement, "quarterly"))
+        )
+
+
+# Process wide store. Set STOCKS_STORE_DIR to move it.
+store = ColumnarStore()
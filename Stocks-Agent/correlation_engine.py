@@ -0,0 +1,161 @@
+import asyncio
+
+import numpy as np
+
+from analytics_engine import align, load_series, parse_calculations, parse_lags, range_mask, OHLC_COLUMNS
+
+SUPPORTED_CALCULATIONS = {"CORRELATION", "COVARIANCE", "AUTOCORRELATION"}
+DEFAULT_MAX_LAG = 10
+
+# Above this many symbols only the strongest and weakest pairs are returned, not the full matrix
+MATRIX_SYMBOL_LIMIT = 20
+TOP_PAIRS = 10
+
+
+def returns_matrix(prices: np.ndarray) -> np.ndarray:
+    """Simple period returns of a (dates, symbols) price matrix."""
+    return prices[1:] / prices[:-1] - 1.0
+
+
+def _ranks(returns: np.ndarray) -> np.ndarray:
+    # Ordinal ranks per column, ties are rare for continuous returns
+    return returns.argsort(axis=0, kind="stable").argsort(axis=0).astype(np.float64)
+
+
+def covariance_matrix(returns: np.ndarray) -> np.ndarray:
+    """
+    Sample covariance of every pair of symbols in one matrix product.
+    Args:
+        returns: A (dates, symbols) return matrix.
+    Returns:
+        The (symbols, symbols) covariance matrix.
+    """
+    centered = returns - returns.mean(axis=0)
+    return centered.T @ centered / (len(returns) - 1)
+
+
+def correlation_matrix(returns: np.ndarray, method: str = "pearson") -> np.ndarray:
+    """
+    Correlation of every pair of symbols.
+    Args:
+        returns: A (dates, symbols) return matrix.
+        method: pearson or spearman.
+    Returns:
+        The (symbols, symbols) correlation matrix.
+    """
+    if method == "spearman":
+        returns = _ranks(returns)
+    covariance = covariance_matrix(returns)
+    std = np.sqrt(np.diag(covariance))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = covariance / np.outer(std, std)
+    np.fill_diagonal(correlation, 1.0)
+    return np.clip(correlation, -1.0, 1.0)
+
+
+def autocorrelation(returns: np.ndarray, max_lag: int) -> np.ndarray:
+    """
+    Autocorrelation of every symbol for lags 0..max_lag, computed with an FFT.
+    Args:
+        returns: A (dates, symbols) return matrix.
+        max_lag: The largest lag.
+    Returns:
+        A (max_lag + 1, symbols) matrix, row k holds the lag k autocorrelation.
+    """
+    n = len(returns)
+    centered = returns - returns.mean(axis=0)
+    # Zero pad to at least 2n so the circular correlation equals the linear one
+    size = 1 << (2 * n - 1).bit_length()
+    spectrum = np.fft.rfft(centered, n=size, axis=0)
+    acov = np.fft.irfft(spectrum * np.conj(spectrum), n=size, axis=0)[: max_lag + 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return acov / acov[0]
+
+
+def _pairs(symbols: list[str], matrix: np.ndarray) -> list[dict]:
+    upper_i, upper_j = np.triu_indices(len(symbols), k=1)
+    values = matrix[upper_i, upper_j]
+    order = np.argsort(values)
+    picked = np.r_[order[::-1][:TOP_PAIRS], order[:TOP_PAIRS]] if len(order) > 2 * TOP_PAIRS else order[::-1]
+    return [{"pair": f"{symbols[upper_i[k]]}/{symbols[upper_j[k]]}", "value": round(float(values[k]), 4)} for k in picked]
+
+
+def _format_matrix(symbols: list[str], matrix: np.ndarray, digits: int) -> dict:
+    if len(symbols) > MATRIX_SYMBOL_LIMIT:
+        return {"strongest_and_weakest_pairs": _pairs(symbols, matrix)}
+    return {"index": symbols, "matrix": np.round(matrix, digits).tolist()}
+
+
+def compute_correlations(symbols: list[str], returns: np.ndarray, calculations: dict[str, dict[str, str]]) -> dict:
+    """
+    Run the requested correlation and time series calculations over an aligned return matrix.
+    Args:
+        symbols: The symbol of each column.
+        returns: A (dates, symbols) return matrix.
+        calculations: Parsed calculations from parse_calculations().
+    Returns:
+        Calculation name -> formatted result.
+    """
+    results = {}
+    for name, options in calculations.items():
+        if name == "CORRELATION":
+            method = options.get("method", "pearson")
+            results[name] = {"method": method, **_format_matrix(symbols, correlation_matrix(returns, method), 4)}
+        elif name == "COVARIANCE":
+            results[name] = _format_matrix(symbols, covariance_matrix(returns), 8)
+        elif name == "AUTOCORRELATION":
+            # lags beyond the sample have no pairs of returns left, they are clamped to len(returns) - 1
+            lags = sorted({min(lag, len(returns) - 1) for lag in parse_lags(options, DEFAULT_MAX_LAG)})
+            acf = autocorrelation(returns, max(lags))
+            results[name] = {symbol: {str(lag): round(float(acf[lag, i]), 4) for lag in lags} for i, symbol in enumerate(symbols)}
+    return results
+
+
+async def analyze_correlations(stock_symbols: str, time_frame: str, interval: str, ohlc: str, calculations: str) -> dict | None:
+    """
+    Compute correlation, covariance and autocorrelation for a set of symbols.
+    Args:
+        stock_symbols: Comma separated stock symbols.
+        time_frame: The RANGE, e.g. "full", "10year" or "2023-01-01,2023-12-31".
+        interval: DAILY, WEEKLY, MONTHLY or an intraday interval.
+        ohlc: The price field to use (open, high, low or close).
+        calculations: e.g. "CORRELATION(method=spearman),COVARIANCE,AUTOCORRELATION(max_lag=20)".
+    Returns:
+        The results with the shared calendar's metadata, or None if a calculation is
+        unsupported or the data could not be retrieved.
+    Raises:
+        ValueError: If the AUTOCORRELATION lag or max_lag is not at least 1.
+    """
+    parsed = parse_calculations(calculations or "CORRELATION")
+    if not parsed or not parsed.keys() <= SUPPORTED_CALCULATIONS:
+        return None
+    if "AUTOCORRELATION" in parsed:
+        parse_lags(parsed["AUTOCORRELATION"], DEFAULT_MAX_LAG)
+    if parsed.get("CORRELATION", {}).get("method", "pearson") not in ("pearson", "spearman"):
+        return None
+    symbols = [s.strip().upper() for s in stock_symbols.split(",") if s.strip()]
+    interval = (interval or "DAILY").strip().upper()
+    column = OHLC_COLUMNS.get((ohlc or "close").strip().upper(), OHLC_COLUMNS["CLOSE"])
+    series_list = await asyncio.gather(*(load_series(symbol, interval) for symbol in symbols))
+    if not symbols or any(series is None for series in series_list):
+        return None
+    dates, prices = align(series_list, column)
+    try:
+        mask = range_mask(dates, time_frame)
+    except ValueError:
+        return None
+    dates, prices = dates[mask], prices[mask]
+    if len(dates) < 3:
+        return None
+    results = await asyncio.to_thread(compute_correlations, symbols, returns_matrix(prices), parsed)
+    return {
+        "meta_data": {
+            "symbols": ",".join(symbols),
+            "min_dt": str(dates[0].astype("datetime64[D]")),
+            "max_dt": str(dates[-1].astype("datetime64[D]")),
+            "ohlc": ohlc,
+            "interval": interval,
+            "observations": int(len(dates)),
+        },
+        "payload": {"RETURNS_CALCULATIONS": results},
+    }
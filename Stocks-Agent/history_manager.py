@@ -0,0 +1,161 @@
+import os
+
+from projections import estimate_tokens
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("STOCKS_HISTORY_TOKEN_BUDGET", "12000"))
+# Most recent user turns that are always kept verbatim
+HISTORY_KEEP_TURNS = int(os.getenv("STOCKS_HISTORY_KEEP_TURNS", "2"))
+SUMMARY_CHARS = 240
+# Summary lines of dropped turns, older lines are folded into one once either limit is passed
+SUMMARY_MAX_LINES = int(os.getenv("STOCKS_HISTORY_SUMMARY_LINES", "20"))
+SUMMARY_BUDGET_SHARE = 0.25
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+
+def _text(content) -> str:
+    """Flatten message content, which is either a string or a list of content parts."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def _clip(text: str, limit: int = SUMMARY_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def _is_user_message(item: dict) -> bool:
+    return item.get("role") == "user" and item.get("type", "message") == "message"
+
+
+class ConversationHistory:
+    """
+    Input items of the CLI conversation, kept under a token budget.
+    Compaction runs in two steps, oldest turns first and never touching the last
+    `keep_turns` user turns:
+        1. Tool outputs are replaced by a one line stub. The function call and its output
+           item stay, so every call_id still has its output.
+        2. If that is not enough, whole turns are dropped and folded into one summary
+           message with the user questions, the answers and the tools used.
+    The summary keeps at most SUMMARY_MAX_LINES lines and SUMMARY_BUDGET_SHARE of the budget,
+    older lines are merged into a single line with the number of turns and their tools.
+    Structured state lives in the run context and is repeated in the summary, so the
+    agents keep the ticker and other fields after their raw outputs are gone.
+    """
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET, keep_turns: int = HISTORY_KEEP_TURNS):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.items: list[dict] = []
+        self._summary: list[str] = []
+        # tools of each summary line, and of the turns already merged into the folded line
+        self._summary_tools: list[set[str]] = []
+        self._folded_turns = 0
+        self._folded_tools: set[str] = set()
+        self.elided_outputs = 0
+        self.dropped_turns = 0
+
+    def append_user(self, text: str) -> None:
+        """Add a user message."""
+        self.items.append({"content": text, "role": "user"})
+
+    def replace(self, items: list[dict]) -> None:
+        """Replace the history with a run's full input list, e.g. result.to_input_list()."""
+        # The run input started with our summary message, which is rebuilt on every call
+        self.items = [item for item in items if not _text(item.get("content")).startswith(SUMMARY_HEADER)]
+
+    def tokens(self) -> int:
+        """Estimate the prompt tokens of the current history."""
+        return estimate_tokens(self.items)
+
+    def _turns(self) -> list[list[dict]]:
+        turns: list[list[dict]] = []
+        for item in self.items:
+            if _is_user_message(item) or not turns:
+                turns.append([])
+            turns[-1].append(item)
+        return turns
+
+    def compact(self, context=None) -> list[dict]:
+        """
+        Shrink the history until it fits the budget.
+        Args:
+            context: The run context model, its set fields are kept in the summary message.
+        Returns:
+            The input items to pass to the next run.
+        """
+        if self.tokens() + self._summary_tokens() <= self.token_budget:
+            return self.input_items(context)
+        turns = self._turns()
+        old = max(len(turns) - self.keep_turns, 0)
+
+        for turn in turns[:old]:
+            names = {item.get("call_id"): item.get("name") for item in turn if item.get("type") == "function_call"}
+            for i, item in enumerate(turn):
+                if item.get("type") == "function_call_output" and not str(item.get("output", "")).startswith("[elided"):
+                    name = names.get(item.get("call_id"), "tool")
+                    turn[i] = {**item, "output": f"[elided {name} output, {estimate_tokens(item.get('output', ''))} tokens]"}
+                    self.elided_outputs += 1
+        self.items = [item for turn in turns for item in turn]
+
+        while old and self.tokens() + self._summary_tokens() > self.token_budget:
+            self._add_summary(turns.pop(0))
+            self.dropped_turns += 1
+            old -= 1
+            self.items = [item for turn in turns for item in turn]
+        return self.input_items(context)
+
+    def _summary_lines(self) -> list[str]:
+        if not self._folded_turns:
+            return self._summary
+        folded = f"- {self._folded_turns} earlier turns"
+        if self._folded_tools:
+            folded += f" | Tools: {', '.join(sorted(self._folded_tools))}"
+        return [folded, *self._summary]
+
+    def _summary_tokens(self) -> int:
+        return estimate_tokens(self._summary_lines())
+
+    def _add_summary(self, turn: list[dict]) -> None:
+        question = next((_text(item.get("content")) for item in turn if _is_user_message(item)), "")
+        answer = next((_text(item.get("content")) for item in reversed(turn) if item.get("role") == "assistant"), "")
+        tools = {item.get("name") for item in turn if item.get("type") == "function_call" and item.get("name")}
+        line = f"- User: {_clip(question)}"
+        if tools:
+            line += f" | Tools: {', '.join(sorted(tools))}"
+        if answer:
+            line += f" | Answer: {_clip(answer)}"
+        self._summary.append(line)
+        self._summary_tools.append(tools)
+        # the summary must not grow with the session, or it alone would outgrow the budget
+        while len(self._summary) > 1 and (len(self._summary) > SUMMARY_MAX_LINES
+                                          or self._summary_tokens() > self.token_budget * SUMMARY_BUDGET_SHARE):
+            self._summary.pop(0)
+            self._folded_tools |= self._summary_tools.pop(0)
+            self._folded_turns += 1
+
+    def input_items(self, context=None) -> list[dict]:
+        """
+        Get the items for the next run: the summary of dropped turns, if any, then the kept items.
+        Args:
+            context: The run context model, its set fields are kept in the summary message.
+        """
+        if not self._summary:
+            return list(self.items)
+        lines = [SUMMARY_HEADER, *self._summary_lines()]
+        if context is not None:
+            state = {key: _clip(str(value), 80) for key, value in context.model_dump().items() if value}
+            if state:
+                lines.append(f"Known context: {state}")
+        return [{"content": "\n".join(lines), "role": "system"}, *self.items]
+
+    def report(self) -> dict:
+        """Summarize what compaction has done so far."""
+        return {
+            "tokens": self.tokens(),
+            "token_budget": self.token_budget,
+            "elided_tool_outputs": self.elided_outputs,
+            "dropped_turns": self.dropped_turns,
+        }
@@ -0,0 +1,218 @@
+import asyncio
+import os
+import random
+import re
+from typing import Awaitable, Callable
+
+import httpx
+import yfinance as yf
+
+from instrumentation import note_cache, upstream_call
+from rate_limiter import priority_for, quota_scheduler
+from replay import fixture_key, http_key, replayable
+from response_cache import make_key, response_cache, ttl_for
+from single_flight import flights
+
+ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
+ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
+
+# Connection settings shared by every Alpha Vantage tool
+REQUEST_TIMEOUT = httpx.Timeout(float(os.getenv("HTTP_TIMEOUT_SECONDS", "10")), connect=5.0)
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Wording of the throttle notices, premium-only endpoints and invalid keys also answer with "Information"
+_THROTTLE_TEXT = re.compile(r"rate limit|requests per|calls per|call frequency", re.IGNORECASE)
+# get_stock_data answers quotes from yfinance and falls back to this Alpha Vantage function
+QUOTE_FALLBACK_FUNCTION = "TIME_SERIES_DAILY"
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Get the shared async HTTP client, creating it on first use.
+    The client keeps connections alive between calls so tools reuse the same pool.
+    Returns:
+        The shared httpx.AsyncClient.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=REQUEST_TIMEOUT, limits=POOL_LIMITS)
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared HTTP client and release its pooled connections."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given retry attempt."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+async def get_json(url: str, params: dict | None = None, timeout: float | None = None,
+                   acquire: Callable[[], Awaitable[bool]] | None = None) -> dict | None:
+    """
+    Send a GET request through the shared client and decode the JSON body.
+    Timeouts, connection errors and retryable status codes are retried with backoff.
+    With STOCKS_REPLAY_MODE set, responses are recorded to or served from fixtures.
+    Args:
+        url: The URL to request.
+        params: The query string parameters.
+        timeout: Optional per-request timeout in seconds, overriding the default.
+        acquire: Optional quota gate awaited before every retry, the caller has paid for the first
+            attempt. A retry is not sent when it returns False.
+    Returns:
+        The decoded JSON payload, or None if the request did not succeed.
+    """
+    request = {"url": url, "params": {k: v for k, v in (params or {}).items() if k != "apikey"}}
+    return await replayable("http", http_key(url, params), lambda: _get_json(url, params, timeout, acquire), request)
+
+
+async def _get_json(url: str, params: dict | None, timeout: float | None, acquire: Callable[[], Awaitable[bool]] | None) -> dict | None:
+    client = get_client()
+    request_timeout = REQUEST_TIMEOUT if timeout is None else httpx.Timeout(timeout)
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt and acquire is not None and not await acquire():
+            return None
+        try:
+            response = await client.get(url, params=params, timeout=request_timeout)
+        except (httpx.TimeoutException, httpx.TransportError):
+            if attempt == MAX_RETRIES:
+                return None
+        else:
+            if response.status_code == 200:
+                try:
+                    return response.json()
+                except ValueError:
+                    return None
+            if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+                return None
+        await asyncio.sleep(_backoff_delay(attempt))
+    return None
+
+
+def is_error_payload(payload: object) -> bool:
+    """
+    Check whether an Alpha Vantage payload is an error or notice rather than data.
+    Alpha Vantage answers invalid symbols and throttled calls with HTTP 200 and a message body.
+    Args:
+        payload: The decoded JSON payload.
+    Returns:
+        True if the payload carries no data.
+    """
+    return isinstance(payload, dict) and bool(payload.keys() & {"Error Message", "Note", "Information"})
+
+
+def is_throttle_notice(payload: object) -> bool:
+    """
+    Check whether an Alpha Vantage payload is a rate limit notice instead of data.
+    Other notices, e.g. a premium-only endpoint, are plain errors and must not stall the quota.
+    """
+    if not isinstance(payload, dict):
+        return False
+    return any(isinstance(payload.get(field), str) and _THROTTLE_TEXT.search(payload[field]) for field in ("Note", "Information"))
+
+
+async def fetch_alpha_vantage(function: str, timeout: float | None = None, use_cache: bool = True, priority: int | None = None, refresh: bool = False, **params) -> dict | None:
+    """
+    Call an Alpha Vantage query function.
+    Responses are served from the shared response cache while fresh, concurrent identical
+    calls share one upstream request, and upstream calls go through the shared quota
+    scheduler. When a call is shed or throttled, a stale cached response is returned if
+    there is one.
+    Args:
+        function: The Alpha Vantage function name, e.g. INCOME_STATEMENT.
+        timeout: Optional per-request timeout in seconds.
+        use_cache: Whether to read and populate the response cache.
+        priority: Optional scheduling priority, defaults to the function's priority.
+        refresh: Skip a fresh cached entry and fetch upstream, e.g. to warm the cache before it expires.
+        params: The remaining query parameters, e.g. symbol="IBM".
+    Returns:
+        The decoded JSON payload, or None if the request did not succeed.
+    """
+    key = make_key(function, params)
+    if use_cache and not refresh:
+        cached = response_cache.get(key)
+        note_cache(cached is not None)
+        if cached is not None:
+            return cached
+    return await flights.do(("alpha_vantage", key), _fetch_upstream, key, function, timeout, use_cache, priority, params)
+
+
+async def _fetch_upstream(key: str, function: str, timeout: float | None, use_cache: bool, priority: int | None, params: dict) -> dict | None:
+    priority = priority_for(function) if priority is None else priority
+    if not await quota_scheduler.acquire(priority):
+        return response_cache.get(key, allow_stale=True) if use_cache else None
+    query = {"function": function, **params, "apikey": ALPHA_VANTAGE_API_KEY}
+    with upstream_call():
+        # every retry of a timeout or a 429 is another call against the quota
+        payload = await get_json(ALPHA_VANTAGE_URL, query, timeout=timeout, acquire=lambda: quota_scheduler.acquire(priority))
+    if is_throttle_notice(payload):
+        quota_scheduler.throttled()
+        return response_cache.get(key, allow_stale=True) if use_cache else None
+    if payload is not None and use_cache and not is_error_payload(payload):
+        response_cache.set(key, payload, ttl_for(function))
+    return payload
+
+
+def yfinance_key(stock_symbol: str, attr: str) -> str:
+    """Cache key of a yfinance Ticker attribute."""
+    return make_key(f"YFINANCE_{attr.upper()}", {"symbol": stock_symbol})
+
+
+async def fetch_yfinance(stock_symbol: str, attr: str, refresh: bool = False):
+    """
+    Read a yfinance Ticker attribute (e.g. info, news) off the event loop.
+    Concurrent lookups of the same symbol and attribute share one fetch, and values are kept
+    in the response cache, quotes until the market session can change them.
+    Args:
+        stock_symbol: The stock symbol to look up.
+        attr: The Ticker attribute to read.
+        refresh: Skip a fresh cached value, e.g. to warm the cache before it expires.
+    Returns:
+        The attribute value.
+    """
+    function = f"YFINANCE_{attr.upper()}"
+    key = yfinance_key(stock_symbol, attr)
+    if not refresh:
+        cached = response_cache.get(key)
+        note_cache(cached is not None)
+        if cached is not None:
+            return cached
+    with upstream_call():
+        value = await replayable(
+            "yfinance", fixture_key(attr, stock_symbol.upper()),
+            lambda: flights.do(("yfinance", attr, stock_symbol.upper()), asyncio.to_thread, lambda: getattr(yf.Ticker(stock_symbol), attr)),
+        )
+    if value:
+        response_cache.set(key, value, ttl_for(function))
+    return value
+
+
+async def fetch_quote(stock_symbol: str, priority: int | None = None, refresh: bool = False) -> dict | None:
+    """
+    Fetch a quote the way get_stock_data answers it: yfinance info, then QUOTE_FALLBACK_FUNCTION.
+    Args:
+        stock_symbol: The stock symbol to look up.
+        priority: Optional scheduling priority of the Alpha Vantage fallback.
+        refresh: Skip a fresh cached yfinance value. A fresh fallback entry is still reused.
+    Returns:
+        The quote payload, or None if neither source answered.
+    """
+    quote = await fetch_yfinance(stock_symbol, "info", refresh)
+    if quote is None:
+        quote = await fetch_alpha_vantage(QUOTE_FALLBACK_FUNCTION, priority=priority, symbol=stock_symbol)
+    return quote
+
+
+def quote_keys(stock_symbol: str) -> list[str]:
+    """Cache keys fetch_quote reads, in order."""
+    return [yfinance_key(stock_symbol, "info"), make_key(QUOTE_FALLBACK_FUNCTION, {"symbol": stock_symbol})]
@@ -2834,74 +2834,206 @@
 #   ]
 # }
 
+import json
+
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.ticker import FuncFormatter
 
+from columnar_store import normalize_reports
 
-def create_timeline_graph(income_stmt, metrics=None):
+# Ratio name -> numerator, all over totalRevenue
+MARGIN_METRICS = {
+    'grossMargin': 'grossProfit',
+    'operatingMargin': 'operatingIncome',
+    'netMargin': 'netIncome',
+    'ebitdaMargin': 'ebitda',
+}
+# Metrics that get growth rates, TTM sums and CAGR
+GROWTH_METRICS = ['totalRevenue', 'grossProfit', 'operatingIncome', 'netIncome', 'ebitda', 'operatingExpenses', 'costOfRevenue']
+
+
+def _as_dict(income_stmt):
+    """Accept the income statement as a dict or as the JSON string an agent passes to a tool."""
+    return json.loads(income_stmt) if isinstance(income_stmt, str) else income_stmt
+
+
+def statement_table(income_stmt, period='annual'):
     """
-    Create an inline timeline graph for annual reports with specified metrics.
+    Convert annualReports or quarterlyReports into a typed (periods x metrics) table, oldest first.
+    Any fiscal year end is kept, missing values become NaN.
+
+    Args:
+        income_stmt (dict): Income statement data
+        period (str): 'annual' or 'quarterly'
+    """
+    income_stmt = _as_dict(income_stmt)
+    key = 'annualReports' if period == 'annual' else 'quarterlyReports'
+    return normalize_reports(income_stmt.get('symbol', ''), income_stmt.get(key, []))
+
+
+def growth(values, lag=1):
+    """Period over period growth of every column, (current - prior) / |prior|. The first lag rows are NaN."""
+    out = np.full(values.shape, np.nan)
+    if len(values) > lag:
+        prior = values[:-lag]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[lag:] = np.where(prior != 0, (values[lag:] - prior) / np.abs(prior), np.nan)
+    return out
+
+
+def trailing_sum(values, window=4):
+    """Rolling sum of every column over the last window rows (e.g. TTM from quarters). Earlier rows are NaN."""
+    out = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        cumulative = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+        out[window - 1:] = cumulative[window:] - cumulative[:-window]
+    return out
+
+
+def cagr(dates, values):
+    """
+    Compound annual growth rate of every column between the first and last row.
+    NaN where either end is not positive.
+    """
+    if len(dates) < 2:
+        return np.full(values.shape[1], np.nan)
+    years = (dates[-1] - dates[0]).astype('timedelta64[D]').astype(np.int64) / 365.25
+    first, last = values[0], values[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where((first > 0) & (last > 0), (last / first) ** (1 / years) - 1, np.nan)
+
+
+def margins(table):
+    """Margin ratios of every period as a (periods x len(MARGIN_METRICS)) matrix."""
+    revenue = table.column('totalRevenue')[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(revenue != 0, table.columns(list(MARGIN_METRICS.values())) / revenue, np.nan)
+
+
+def _clean(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def _rows(dates, columns):
+    """Build one record per period, latest first, from name -> column arrays."""
+    return [
+        {'fiscalDateEnding': str(dates[i]), **{name: _clean(values[i]) for name, values in columns.items()}}
+        for i in range(len(dates) - 1, -1, -1)
+    ]
+
+
+def derive_income_statement_metrics(income_stmt, years=5, quarters=5):
+    """
+    Precompute margins, YoY/QoQ growth, TTM sums and CAGR for the income statement agent.
+
+    Args:
+        income_stmt (dict): Income statement data
+        years (int): Number of latest annual periods to report
+        quarters (int): Number of latest quarters to report
+    """
+    annual = statement_table(income_stmt, 'annual')
+    quarterly = statement_table(income_stmt, 'quarterly')
+    margin_names = list(MARGIN_METRICS)
+
+    annual_values = annual.columns(GROWTH_METRICS)
+    annual_margins = margins(annual)
+    annual_yoy = growth(annual_values, 1)
+    annual_columns = {name: annual_margins[:, i] for i, name in enumerate(margin_names)}
+    annual_columns.update({f'{metric}YoY': annual_yoy[:, i] for i, metric in enumerate(GROWTH_METRICS)})
+
+    quarterly_values = quarterly.columns(GROWTH_METRICS)
+    quarterly_margins = margins(quarterly)
+    quarterly_qoq = growth(quarterly_values, 1)
+    quarterly_yoy = growth(quarterly_values, 4)
+    quarterly_columns = {name: quarterly_margins[:, i] for i, name in enumerate(margin_names)}
+    for i, metric in enumerate(GROWTH_METRICS):
+        quarterly_columns[f'{metric}QoQ'] = quarterly_qoq[:, i]
+        quarterly_columns[f'{metric}YoY'] = quarterly_yoy[:, i]
+
+    ttm = trailing_sum(quarterly_values, 4)
+    window = slice(-years - 1, None) if len(annual.dates) > years else slice(None)
+    annual_cagr = cagr(annual.dates[window], annual_values[window])
+
+    return {
+        'symbol': annual.symbol,
+        'currency': annual.currency,
+        'annual': _rows(annual.dates, annual_columns)[:years],
+        'quarterly': _rows(quarterly.dates, quarterly_columns)[:quarters],
+        'ttm': {
+            'asOf': str(quarterly.dates[-1]) if len(quarterly.dates) else None,
+            **{metric: _clean(ttm[-1, i]) if len(ttm) else None for i, metric in enumerate(GROWTH_METRICS)},
+        },
+        'cagr': {
+            'from': str(annual.dates[window][0]) if len(annual.dates) else None,
+            'to': str(annual.dates[-1]) if len(annual.dates) else None,
+            **{metric: _clean(annual_cagr[i]) for i, metric in enumerate(GROWTH_METRICS)},
+        },
+    }
+
+
+DEFAULT_METRICS = ['grossProfit', 'totalRevenue', 'netIncome']
+PROFITABILITY_METRICS = ['grossProfit', 'operatingIncome', 'netIncome', 'ebitda']
+REVENUE_METRICS = ['totalRevenue', 'costOfRevenue', 'grossProfit']
+COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
+
+
+def format_y_axis(x, pos):
+    """Format y-axis values in billions/millions"""
+    if abs(x) >= 1e9:
+        return f'${x/1e9:.1f}B'
+    elif abs(x) >= 1e6:
+        return f'${x/1e6:.1f}M'
+    else:
+        return f'${x:.0f}'
+
+
+def draw_timeline(ax, income_stmt, metrics=None):
+    """
+    Draw the annual metrics timeline onto a matplotlib Axes.
+    Works with any Axes, so it is shared by pyplot and the headless chart renderer.
     
     Args:
+        ax (Axes): Axes to draw on
         income_stmt (dict): Income statement data
-        metrics (list): List of metrics to plot (default: ['grossProfit', 'totalRevenue', 'netIncome'])
+        metrics (list): List of metrics to plot (default: DEFAULT_METRICS)
     """
     if metrics is None:
-        metrics = ['grossProfit', 'totalRevenue', 'netIncome']
-    
-    # Extract annual reports data
-    annual_reports = income_stmt['annualReports']
-    
-    # Filter for annual reports only (those ending in -12-31)
-    annual_data = [report for report in annual_reports if report['fiscalDateEnding'].endswith('-12-31')]
-    
-    # Sort by fiscal date
-    annual_data.sort(key=lambda x: x['fiscalDateEnding'])
-    
-    # Prepare data for plotting
-    years = []
-    data_dict = {metric: [] for metric in metrics}
+        metrics = DEFAULT_METRICS
     
-    for report in annual_data:
-        year = report['fiscalDateEnding'][:4]  # Extract year
-        years.append(year)
-        
-        for metric in metrics:
-            value = report.get(metric, '0')
-            # Convert string to float, handle 'None' values
-            if value == 'None' or value is None:
-                value = 0
-            else:
-                value = float(value)
-            data_dict[metric].append(value)
+    # Typed annual table, any fiscal year end, sorted by fiscal date
+    income_stmt = _as_dict(income_stmt)
+    table = statement_table(income_stmt, 'annual')
+    years = [str(date)[:4] for date in table.dates]
+    values = table.columns(metrics)
     
-    # Create the plot
-    plt.figure(figsize=(12, 6))
-    
-    # Plot each metric
-    colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
+    # Plot each metric, missing values show as gaps
     for i, metric in enumerate(metrics):
-        color = colors[i % len(colors)]
-        plt.plot(years, data_dict[metric], marker='o', linewidth=2, markersize=6, 
+        color = COLORS[i % len(COLORS)]
+        ax.plot(years, values[:, i], marker='o', linewidth=2, markersize=6, 
                 label=metric.replace('_', ' ').title(), color=color)
     
     # Customize the plot
-    plt.title(f'Annual Financial Metrics Timeline - {income_stmt["symbol"]}', fontsize=14, fontweight='bold')
-    plt.xlabel('Year', fontsize=12)
-    plt.ylabel('Amount (USD)', fontsize=12)
-    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.grid(True, alpha=0.3)
-    plt.xticks(rotation=45)
-    
-    # Format y-axis to show values in billions/millions
-    def format_y_axis(x, pos):
-        if abs(x) >= 1e9:
-            return f'${x/1e9:.1f}B'
-        elif abs(x) >= 1e6:
-            return f'${x/1e6:.1f}M'
-        else:
-            return f'${x:.0f}'
+    ax.set_title(f'Annual Financial Metrics Timeline - {income_stmt["symbol"]}', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Year', fontsize=12)
+    ax.set_ylabel('Amount (USD)', fontsize=12)
+    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    ax.grid(True, alpha=0.3)
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.yaxis.set_major_formatter(FuncFormatter(format_y_axis))
+
+
+def create_timeline_graph(income_stmt, metrics=None):
+    """
+    Create an inline timeline graph for annual reports with specified metrics.
     
-    plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(format_y_axis))
+    Args:
+        income_stmt (dict): Income statement data
+        metrics (list): List of metrics to plot (default: ['grossProfit', 'totalRevenue', 'netIncome'])
+    """
+    # Create the plot
+    plt.figure(figsize=(12, 6))
+    draw_timeline(plt.gca(), income_stmt, metrics)
     
     # Adjust layout to prevent label cutoff
     plt.tight_layout()
@@ -2919,13 +3051,11 @@ def plot_custom_metrics(income_stmt, metrics_list):
 
 def plot_profitability_metrics(income_stmt):
     """Plot profitability-focused metrics"""
-    profitability_metrics = ['grossProfit', 'operatingIncome', 'netIncome', 'ebitda']
-    return create_timeline_graph(income_stmt, profitability_metrics)
+    return create_timeline_graph(income_stmt, PROFITABILITY_METRICS)
 
 def plot_revenue_metrics(income_stmt):
     """Plot revenue and cost metrics"""
-    revenue_metrics = ['totalRevenue', 'costOfRevenue', 'grossProfit']
-    return create_timeline_graph(income_stmt, revenue_metrics)
+    return create_timeline_graph(income_stmt, REVENUE_METRICS)
 
 # Example usage:
 # plot_default_metrics(income_stmt).show()
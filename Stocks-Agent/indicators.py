@@ -0,0 +1,305 @@
+import asyncio
+import re
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from analytics_engine import load_series, INTRADAY_INTERVALS, OHLC_COLUMNS
+
+# Indicators computed when none are requested
+DEFAULT_INDICATORS = "SMA(20),SMA(50),SMA(200),EMA(12),EMA(26),RSI(14),MACD(12,26,9),BBANDS(20,2),ATR(14),VWAP(20)"
+SUPPORTED_INDICATORS = {"SMA", "EMA", "RSI", "MACD", "BBANDS", "ATR", "VWAP"}
+DEFAULT_PARAMETERS = {
+    "SMA": (20,),
+    "EMA": (20,),
+    "RSI": (14,),
+    "MACD": (12, 26, 9),
+    "BBANDS": (20, 2),
+    "ATR": (14,),
+    "VWAP": (20,),
+}
+# EMA based indicators need several times their span of history to forget the seed value
+WARMUP_FACTOR = 4
+MIN_BARS = 250
+# Bounds the history right_align allocates, WARMUP_FACTOR times the longest period
+MAX_PERIOD = 1000
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD = 30
+
+_INDICATOR_PATTERN = re.compile(r"([A-Z]+)\s*(?:\(([^)]*)\))?")
+
+
+def parse_indicators(indicators: str | None) -> list[tuple[str, tuple[float, ...]]]:
+    """
+    Parse a comma separated indicator list such as "SMA(50),SMA(200),RSI,MACD(12,26,9)".
+    Args:
+        indicators: The indicators, parameters in parentheses are optional.
+    Returns:
+        (name, parameters) pairs, missing parameters filled with the defaults.
+    Raises:
+        ValueError: If an indicator is unknown or a parameter is not a number between 1 and MAX_PERIOD.
+    """
+    parsed = []
+    for name, options in _INDICATOR_PATTERN.findall((indicators or DEFAULT_INDICATORS).upper()):
+        if name not in SUPPORTED_INDICATORS:
+            raise ValueError(f"{name} is not one of {', '.join(sorted(SUPPORTED_INDICATORS))}")
+        values = []
+        for part in (options.split(",") if options else []):
+            if not part.strip():
+                continue
+            try:
+                values.append(float(part))
+            except ValueError:
+                raise ValueError(f"{name} parameter '{part.strip()}' is not a number")
+        if not all(1 <= value <= MAX_PERIOD for value in values):
+            raise ValueError(f"{name} parameters must be between 1 and {MAX_PERIOD}")
+        defaults = DEFAULT_PARAMETERS[name]
+        parameters = tuple(values[i] if i < len(values) else default for i, default in enumerate(defaults))
+        parsed.append((name, parameters))
+    if not parsed:
+        raise ValueError("no indicators given")
+    return parsed
+
+
+def right_align(arrays: list[np.ndarray], bars: int) -> np.ndarray:
+    """
+    Stack the last `bars` rows of several series into one matrix, shorter histories padded with NaN at the top.
+    Args:
+        arrays: One (dates, columns) array per symbol, oldest row first.
+        bars: The number of rows to keep.
+    Returns:
+        A (bars, symbols, columns) array whose last row is each symbol's latest bar.
+    """
+    matrix = np.full((bars, len(arrays), arrays[0].shape[1]), np.nan)
+    for i, array in enumerate(arrays):
+        tail = array[-bars:]
+        matrix[bars - len(tail):, i] = tail
+    return matrix
+
+
+def _windows(values: np.ndarray, window: int) -> np.ndarray:
+    # (dates - window + 1, symbols, window) view, no copy
+    return sliding_window_view(values, window, axis=0)
+
+
+def _pad(values: np.ndarray, window: int) -> np.ndarray:
+    return np.concatenate([np.full((window - 1,) + values.shape[1:], np.nan), values])
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Simple moving average of every column.
+    Args:
+        values: A (dates, symbols) matrix.
+        window: The number of bars averaged.
+    Returns:
+        A matrix of the same shape, NaN until a full window is available.
+    """
+    if window > len(values):
+        return np.full(values.shape, np.nan)
+    return _pad(_windows(values, window).mean(axis=-1), window)
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """Population standard deviation over a rolling window, as used by Bollinger bands."""
+    if window > len(values):
+        return np.full(values.shape, np.nan)
+    return _pad(_windows(values, window).std(axis=-1), window)
+
+
+def smooth(values: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    Exponential smoothing of every column, one vectorized step per bar.
+    Each column is seeded with its first valid value, leading NaN stay NaN.
+    Args:
+        values: A (dates, symbols) matrix.
+        alpha: The smoothing factor.
+    Returns:
+        A matrix of the same shape.
+    """
+    out = np.empty_like(values)
+    previous = np.full(values.shape[1:], np.nan)
+    for t, row in enumerate(values):
+        previous = np.where(np.isnan(previous), row, previous + alpha * (row - previous))
+        out[t] = previous
+    return out
+
+
+def ema(values: np.ndarray, span: int) -> np.ndarray:
+    """Exponential moving average with alpha = 2 / (span + 1)."""
+    return smooth(values, 2.0 / (span + 1))
+
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    Relative strength index with Wilder's smoothing.
+    Args:
+        close: A (dates, symbols) close price matrix.
+        period: The smoothing period.
+    Returns:
+        RSI values between 0 and 100, NaN for the first bar.
+    """
+    change = np.diff(close, axis=0, prepend=np.nan)
+    gains = smooth(np.where(change > 0, change, np.where(np.isnan(change), np.nan, 0.0)), 1.0 / period)
+    losses = smooth(np.where(change < 0, -change, np.where(np.isnan(change), np.nan, 0.0)), 1.0 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(losses == 0, 100.0, 100.0 - 100.0 / (1.0 + gains / losses))
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Moving average convergence divergence.
+    Returns:
+        The MACD line, its signal line and the histogram.
+    """
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger_bands(close: np.ndarray, window: int = 20, width: float = 2.0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Bollinger bands around a simple moving average.
+    Returns:
+        The upper band, the middle band and the lower band.
+    """
+    middle = sma(close, window)
+    deviation = width * rolling_std(close, window)
+    return middle + deviation, middle, middle - deviation
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    Average true range with Wilder's smoothing.
+    Args:
+        high: A (dates, symbols) high price matrix.
+        low: A (dates, symbols) low price matrix.
+        close: A (dates, symbols) close price matrix.
+        period: The smoothing period.
+    Returns:
+        A matrix of the same shape.
+    """
+    previous_close = np.vstack([np.full((1,) + close.shape[1:], np.nan), close[:-1]])
+    # fmax ignores the missing previous close of the first bar, its range is high - low
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    return smooth(true_range, 1.0 / period)
+
+
+def vwap(high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray, window: int = 20) -> np.ndarray:
+    """
+    Volume weighted average of the typical price over the last `window` bars.
+    Returns:
+        A matrix of the same shape, NaN until a full window is available.
+    """
+    typical = (high + low + close) / 3.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return sma(typical * volume, window) / sma(volume, window)
+
+
+def _label(name: str, parameters: tuple) -> str:
+    return f"{name.lower()}_{'_'.join(f'{p:g}' for p in parameters)}" if parameters else name.lower()
+
+
+def compute_indicators(bars: np.ndarray, indicators: list[tuple[str, tuple]]) -> dict[str, np.ndarray]:
+    """
+    Compute every requested indicator for every symbol in one pass.
+    Args:
+        bars: A (dates, symbols, OHLCV) array from right_align().
+        indicators: Parsed indicators from parse_indicators().
+    Returns:
+        Output label -> (dates, symbols) matrix.
+    """
+    high, low, close, volume = (bars[:, :, OHLC_COLUMNS[column]] for column in ("HIGH", "LOW", "CLOSE", "VOLUME"))
+    results = {}
+    for name, parameters in indicators:
+        label = _label(name, parameters)
+        if name == "SMA":
+            results[label] = sma(close, int(parameters[0]))
+        elif name == "EMA":
+            results[label] = ema(close, int(parameters[0]))
+        elif name == "RSI":
+            results[label] = rsi(close, int(parameters[0]))
+        elif name == "MACD":
+            line, signal, histogram = macd(close, *(int(p) for p in parameters))
+            results.update({f"{label}_line": line, f"{label}_signal": signal, f"{label}_histogram": histogram})
+        elif name == "BBANDS":
+            upper, middle, lower = bollinger_bands(close, int(parameters[0]), parameters[1])
+            results.update({f"{label}_upper": upper, f"{label}_middle": middle, f"{label}_lower": lower})
+            with np.errstate(divide="ignore", invalid="ignore"):
+                results[f"{label}_percent_b"] = (close - lower) / (upper - lower)
+        elif name == "ATR":
+            results[label] = atr(high, low, close, int(parameters[0]))
+        elif name == "VWAP":
+            results[label] = vwap(high, low, close, volume, int(parameters[0]))
+    return results
+
+
+def _round(value: float, digits: int = 4) -> float | None:
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def summarize(symbol_index: int, close: np.ndarray, results: dict[str, np.ndarray]) -> dict:
+    """
+    Reduce one symbol's indicator matrices to the latest values and a few derived signals.
+    Args:
+        symbol_index: The symbol's column.
+        close: The (dates, symbols) close price matrix.
+        results: The output of compute_indicators().
+    Returns:
+        The latest value of each indicator, the distance of the price to each moving average
+        and signals such as RSI overbought/oversold or MACD crossovers.
+    """
+    last = close[-1, symbol_index]
+    latest = {label: _round(values[-1, symbol_index]) for label, values in results.items()}
+    signals = {}
+    for label, value in latest.items():
+        if value is None:
+            continue
+        if label.startswith(("sma_", "ema_", "vwap_")):
+            signals[f"price_vs_{label}_pct"] = _round((last / value - 1.0) * 100, 2)
+        elif label.startswith("rsi_"):
+            signals[f"{label}_state"] = "overbought" if value >= RSI_OVERBOUGHT else "oversold" if value <= RSI_OVERSOLD else "neutral"
+        elif label.startswith("atr_"):
+            signals[f"{label}_pct_of_price"] = _round(value / last * 100, 2)
+        elif label.endswith("_histogram"):
+            previous = results[label][-2, symbol_index]
+            crossed = not np.isnan(previous) and (previous > 0) != (value > 0)
+            signals[label.replace("_histogram", "_cross")] = ("bullish" if value > 0 else "bearish") if crossed else "none"
+    if latest.get("sma_50") is not None and latest.get("sma_200") is not None:
+        signals["sma_50_vs_200"] = "golden_cross_regime" if latest["sma_50"] > latest["sma_200"] else "death_cross_regime"
+    return {"last_close": _round(last), "indicators": latest, "signals": signals}
+
+
+async def technical_indicators(stock_symbols: str, interval: str = "DAILY", indicators: str | None = None) -> dict | None:
+    """
+    Compute technical indicators for a batch of symbols from the cached price series.
+    Args:
+        stock_symbols: Comma separated stock symbols.
+        interval: DAILY, WEEKLY, MONTHLY or an intraday interval such as 5MIN.
+        indicators: e.g. "SMA(50),SMA(200),RSI(14),MACD(12,26,9),BBANDS(20,2),ATR(14),VWAP(20)", defaults to all of them.
+    Returns:
+        Symbol -> compact indicator summary, or None if no series could be retrieved.
+    Raises:
+        ValueError: If an indicator or one of its parameters is not valid.
+    """
+    parsed = parse_indicators(indicators)
+    symbols = [s.strip().upper() for s in stock_symbols.split(",") if s.strip()]
+    interval = (interval or "DAILY").strip().upper()
+    series_list = await asyncio.gather(*(load_series(symbol, interval) for symbol in symbols))
+    loaded = [(symbol, series) for symbol, series in zip(symbols, series_list) if series is not None and len(series)]
+    if not loaded:
+        return None
+    # Only the tail matters for the latest values
+    longest = max(max(parameters, default=1) for _, parameters in parsed)
+    bars = max(MIN_BARS, int(longest * WARMUP_FACTOR))
+    matrix = right_align([series.ohlcv for _, series in loaded], bars)
+    results = await asyncio.to_thread(compute_indicators, matrix, parsed)
+    close = matrix[:, :, OHLC_COLUMNS["CLOSE"]]
+    unit = "datetime64[m]" if interval in INTRADAY_INTERVALS else "datetime64[D]"
+    summary = {
+        symbol: {"as_of": str(series.dates[-1].astype(unit)), "bars": int(min(len(series), bars)), **summarize(i, close, results)}
+        for i, (symbol, series) in enumerate(loaded)
+    }
+    for symbol in symbols:
+        summary.setdefault(symbol, None)
+    return {"interval": interval, "symbols": summary}
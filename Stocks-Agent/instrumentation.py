@@ -0,0 +1,206 @@
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from agents import RunHooks, custom_span
+
+from projections import estimate_tokens
+
+# Wall time histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RECENT_RECORDS = 500
+
+# Set per turn by the CLI/server, the run task inherits it
+conversation_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("conversation_id", default=None)
+# Attribute InstrumentationHooks sets on the tool's run context
+AGENT_ATTR = "_instrumented_agent"
+# Record of the tool call in progress, upstream and cache events are added to it
+_current_record: contextvars.ContextVar[dict | None] = contextvars.ContextVar("tool_record", default=None)
+
+
+def _payload_bytes(result: object) -> int:
+    text = result if isinstance(result, str) else json.dumps(result, default=str, separators=(",", ":"))
+    return len(text.encode("utf-8"))
+
+
+def note_cache(hit: bool) -> None:
+    """Count a response cache hit or miss against the tool call in progress."""
+    record = _current_record.get()
+    if record is not None:
+        record["cache_hits" if hit else "cache_misses"] += 1
+
+
+@contextmanager
+def upstream_call():
+    """Time one upstream request and count it against the tool call in progress."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = _current_record.get()
+        if record is not None:
+            record["upstream_calls"] += 1
+            record["upstream_seconds"] += time.perf_counter() - started
+
+
+class ToolMetrics:
+    """
+    Aggregated per (tool, agent) metrics and the most recent raw call records.
+    Conversation ids only go to the records and trace spans, they would explode the
+    label cardinality of the Prometheus series.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records: deque[dict] = deque(maxlen=RECENT_RECORDS)
+        # Monotonic totals, unlike the records they never wrap
+        self.total_calls = 0
+        self.total_tokens = 0
+        self._series: dict[tuple[str, str], dict] = defaultdict(lambda: {
+            "calls": 0, "errors": 0, "wall_seconds": 0.0, "upstream_seconds": 0.0, "upstream_calls": 0,
+            "cache_hits": 0, "cache_misses": 0, "bytes": 0, "tokens": 0,
+            "buckets": [0] * len(LATENCY_BUCKETS),
+        })
+
+    def observe(self, record: dict) -> None:
+        """Add one finished tool call."""
+        with self._lock:
+            self.records.append(record)
+            self.total_calls += 1
+            self.total_tokens += record["tokens"]
+            series = self._series[(record["tool"], record["agent"] or "unknown")]
+            series["calls"] += 1
+            series["errors"] += record["error"] is not None
+            for field in ("wall_seconds", "upstream_seconds", "upstream_calls", "cache_hits", "cache_misses", "bytes", "tokens"):
+                series[field] += record[field]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if record["wall_seconds"] <= bound:
+                    series["buckets"][i] += 1
+
+    def report(self) -> dict:
+        """Summarize per tool: calls, average wall and upstream time, cache hit rate, bytes and tokens."""
+        with self._lock:
+            tools: dict[str, dict] = {}
+            for (tool, _), series in self._series.items():
+                total = tools.setdefault(tool, defaultdict(float))
+                for field, value in series.items():
+                    if field != "buckets":
+                        total[field] += value
+        return {
+            tool: {
+                "calls": int(total["calls"]),
+                "avg_wall_seconds": round(total["wall_seconds"] / total["calls"], 3),
+                "avg_upstream_seconds": round(total["upstream_seconds"] / total["calls"], 3),
+                "upstream_calls": int(total["upstream_calls"]),
+                "cache_hit_rate": round(total["cache_hits"] / max(total["cache_hits"] + total["cache_misses"], 1), 2),
+                "avg_bytes": int(total["bytes"] / total["calls"]),
+                "avg_tokens": int(total["tokens"] / total["calls"]),
+            }
+            for tool, total in sorted(tools.items())
+        }
+
+    def prometheus_text(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        counters = [
+            ("stocks_tool_calls_total", "calls", "Function tool calls."),
+            ("stocks_tool_errors_total", "errors", "Function tool calls that raised."),
+            ("stocks_tool_upstream_seconds_total", "upstream_seconds", "Time spent in upstream requests."),
+            ("stocks_tool_upstream_calls_total", "upstream_calls", "Upstream requests, i.e. API quota used."),
+            ("stocks_tool_cache_hits_total", "cache_hits", "Response cache hits."),
+            ("stocks_tool_cache_misses_total", "cache_misses", "Response cache misses."),
+            ("stocks_tool_response_bytes_total", "bytes", "Bytes of tool output returned to the model."),
+            ("stocks_tool_response_tokens_total", "tokens", "Estimated tokens of tool output returned to the model."),
+        ]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines = []
+            for metric, field, help_text in counters:
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                lines += [f'{metric}{{tool="{tool}",agent="{agent}"}} {values[field]}' for (tool, agent), values in series]
+            metric = "stocks_tool_wall_seconds"
+            lines += [f"# HELP {metric} Function tool wall time.", f"# TYPE {metric} histogram"]
+            for (tool, agent), values in series:
+                labels = f'tool="{tool}",agent="{agent}"'
+                lines += [f'{metric}_bucket{{{labels},le="{bound}"}} {count}' for bound, count in zip(LATENCY_BUCKETS, values["buckets"])]
+                lines += [
+                    f'{metric}_bucket{{{labels},le="+Inf"}} {values["calls"]}',
+                    f"{metric}_sum{{{labels}}} {values['wall_seconds']}",
+                    f"{metric}_count{{{labels}}} {values['calls']}",
+                ]
+        return "\n".join(lines) + "\n"
+
+
+def instrumented(func):
+    """
+    Record wall time, upstream time, cache hits and misses, output bytes and estimated tokens
+    of a function tool, tagged with the agent and conversation id. Apply it under @function_tool;
+    the signature and docstring are kept, so the tool schema does not change.
+    """
+    tool = func.__name__
+
+    def start(args: tuple) -> dict:
+        return {
+            "tool": tool, "agent": getattr(args[0], AGENT_ATTR, None) if args else None, "conversation_id": conversation_id_var.get(),
+            "started_at": time.time(), "wall_seconds": 0.0, "upstream_seconds": 0.0, "upstream_calls": 0,
+            "cache_hits": 0, "cache_misses": 0, "bytes": 0, "tokens": 0, "error": None,
+        }
+
+    def finish(record: dict, span, started: float, result: object) -> None:
+        record["wall_seconds"] = time.perf_counter() - started
+        if record["error"] is None:
+            record["bytes"] = _payload_bytes(result)
+            record["tokens"] = estimate_tokens(result)
+        span.span_data.data.update({k: v for k, v in record.items() if k != "tool"})
+        metrics.observe(record)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            record, started, result = start(args), time.perf_counter(), None
+            token = _current_record.set(record)
+            with custom_span(f"tool_metrics:{tool}") as span:
+                try:
+                    result = await func(*args, **kwargs)
+                    return result
+                except Exception as e:
+                    record["error"] = type(e).__name__
+                    raise
+                finally:
+                    _current_record.reset(token)
+                    finish(record, span, started, result)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record, started, result = start(args), time.perf_counter(), None
+            token = _current_record.set(record)
+            with custom_span(f"tool_metrics:{tool}") as span:
+                try:
+                    result = func(*args, **kwargs)
+                    return result
+                except Exception as e:
+                    record["error"] = type(e).__name__
+                    raise
+                finally:
+                    _current_record.reset(token)
+                    finish(record, span, started, result)
+    return wrapper
+
+
+class InstrumentationHooks(RunHooks):
+    """
+    Run hooks that tag each tool call with the agent that made it.
+    Hooks run in their own tasks, so the agent name travels on the context object the
+    tool receives rather than in a context variable.
+    """
+
+    async def on_tool_start(self, context, agent, tool) -> None:
+        setattr(context, AGENT_ATTR, agent.name)
+
+
+# Process wide metrics, exported by server.py at /metrics
+metrics = ToolMetrics()
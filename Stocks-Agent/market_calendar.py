@@ -0,0 +1,188 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+
+# Trading sessions of a US equity exchange day
+PRE_MARKET = "pre_market"
+REGULAR = "regular"
+AFTER_HOURS = "after_hours"
+CLOSED = "closed"
+
+PRE_MARKET_OPEN = time(4, 0)
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+AFTER_HOURS_CLOSE = time(20, 0)
+EARLY_CLOSE = time(13, 0)
+EARLY_AFTER_HOURS_CLOSE = time(17, 0)
+
+# Quote-like data and how long it stays fresh in each session where it can change.
+# In any other session the data cannot move, so it stays fresh until the next session that changes it.
+SESSION_TTLS = {
+    "GLOBAL_QUOTE": {PRE_MARKET: 300, REGULAR: 60, AFTER_HOURS: 300},
+    "TIME_SERIES_INTRADAY": {PRE_MARKET: 300, REGULAR: 60, AFTER_HOURS: 300},
+    "TIME_SERIES_DAILY": {REGULAR: 3600, AFTER_HOURS: 3600},
+    "TOP_GAINERS_LOSERS": {REGULAR: 300, AFTER_HOURS: 1800},
+    "YFINANCE_INFO": {PRE_MARKET: 300, REGULAR: 60, AFTER_HOURS: 300},
+}
+# Upper bound, so a calendar gap cannot pin an entry for weeks
+MAX_CLOSED_TTL = 4 * 24 * 3600
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """The n-th given weekday of a month, n=-1 for the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> date:
+    # Anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    return date(year, month, (h + l - 7 * m + 33 * month + 19) % 32)
+
+
+def _observed(day: date) -> date:
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=16)
+def holidays(year: int) -> frozenset[date]:
+    """
+    NYSE full day holidays of a year.
+    Args:
+        year: The calendar year.
+    Returns:
+        The dates the exchange is closed, besides weekends.
+    """
+    days = {
+        _nth_weekday(year, 1, 0, 3),   # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),   # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),   # Independence Day
+        _nth_weekday(year, 9, 0, 1),   # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),  # Christmas
+    }
+    # New Year's Day falling on a Saturday is not observed on the prior Friday
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.add(_observed(new_year))
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(days)
+
+
+@lru_cache(maxsize=16)
+def early_closes(year: int) -> frozenset[date]:
+    """NYSE 1 p.m. early close days of a year: July 3, the day after Thanksgiving and Christmas Eve."""
+    days = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1)}
+    for day in (date(year, 7, 3), date(year, 12, 24)):
+        if day.weekday() < 5 and day not in holidays(year):
+            days.add(day)
+    return frozenset(days)
+
+
+def is_trading_day(day: date) -> bool:
+    """Check whether the exchange opens on a date."""
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+
+def session_bounds(day: date) -> dict[str, tuple[datetime, datetime]]:
+    """
+    Get the start and end of each session on a trading day.
+    Args:
+        day: A trading day.
+    Returns:
+        Session name -> (start, end), as New York time.
+    """
+    early = day in early_closes(day.year)
+    close = EARLY_CLOSE if early else REGULAR_CLOSE
+    after_close = EARLY_AFTER_HOURS_CLOSE if early else AFTER_HOURS_CLOSE
+
+    def at(clock: time) -> datetime:
+        return datetime.combine(day, clock, MARKET_TIMEZONE)
+
+    return {
+        PRE_MARKET: (at(PRE_MARKET_OPEN), at(REGULAR_OPEN)),
+        REGULAR: (at(REGULAR_OPEN), at(close)),
+        AFTER_HOURS: (at(close), at(after_close)),
+    }
+
+
+def _now(now: datetime | None) -> datetime:
+    return (now or datetime.now(MARKET_TIMEZONE)).astimezone(MARKET_TIMEZONE)
+
+
+def session_at(now: datetime | None = None) -> str:
+    """
+    Get the session in progress.
+    Args:
+        now: The time to check, defaults to now.
+    Returns:
+        PRE_MARKET, REGULAR, AFTER_HOURS or CLOSED.
+    """
+    now = _now(now)
+    if not is_trading_day(now.date()):
+        return CLOSED
+    for session, (start, end) in session_bounds(now.date()).items():
+        if start <= now < end:
+            return session
+    return CLOSED
+
+
+def next_session_start(sessions: set[str] | dict, now: datetime | None = None) -> datetime:
+    """
+    Get when the next of the given sessions starts.
+    Args:
+        sessions: The session names to look for.
+        now: The time to start from, defaults to now.
+    Returns:
+        The start of the next matching session, as New York time.
+    """
+    now = _now(now)
+    day = now.date()
+    # Long weekends and holidays never span more than a few days
+    for _ in range(10):
+        if is_trading_day(day):
+            starts = [start for session, (start, _) in session_bounds(day).items() if session in sessions and start > now]
+            if starts:
+                return min(starts)
+        day += timedelta(days=1)
+    return now + timedelta(seconds=MAX_CLOSED_TTL)
+
+
+def session_ttl(function: str, now: datetime | None = None) -> float | None:
+    """
+    Get how long quote-like data fetched now stays fresh.
+    Args:
+        function: The data source name, e.g. GLOBAL_QUOTE or YFINANCE_INFO.
+        now: The fetch time, defaults to now.
+    Returns:
+        The session's TTL while the data can change, otherwise the seconds until the next
+        session that changes it. None if the function is not session aware.
+    """
+    ttls = SESSION_TTLS.get(function.upper())
+    if ttls is None:
+        return None
+    now = _now(now)
+    session = session_at(now)
+    if session in ttls:
+        return float(ttls[session])
+    return min(float(MAX_CLOSED_TTL), (next_session_start(ttls, now) - now).total_seconds())
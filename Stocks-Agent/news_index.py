@@ -0,0 +1,451 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from http_client import close_client, fetch_alpha_vantage, fetch_yfinance
+from rate_limiter import PRIORITY_BACKGROUND
+
+NEWS_DB = os.getenv("STOCKS_NEWS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "news.db"))
+NEWS_TICKERS = [s.strip().upper() for s in os.getenv("STOCKS_NEWS_TICKERS", os.getenv("STOCKS_WATCHLIST", "")).split(",") if s.strip()]
+NEWS_TOPICS = [s.strip().lower() for s in os.getenv("STOCKS_NEWS_TOPICS", "").split(",") if s.strip()]
+POLL_SECONDS = float(os.getenv("STOCKS_NEWS_POLL_SECONDS", "900"))
+# A feed polled within this long is answered from the index without a live fetch
+FRESH_SECONDS = float(os.getenv("STOCKS_NEWS_FRESH_SECONDS", str(2 * POLL_SECONDS)))
+# Articles per NEWS_SENTIMENT request, the quota cost is the same for 3 or 50
+FEED_LIMIT = 50
+DEFAULT_DAYS = 7
+DEFAULT_LIMIT = 10
+# Articles published longer ago than this are pruned by the poller
+RETENTION_DAYS = float(os.getenv("STOCKS_NEWS_RETENTION_DAYS", "90"))
+# Alpha Vantage ticker relevance below this is a passing mention
+MIN_TICKER_RELEVANCE = 0.1
+# Words of the summary hashed with the title, so syndicated copies with trailing edits still match
+HASH_SUMMARY_WORDS = 10
+
+_TRACKING_PARAMS = re.compile(r"^(utm_|guccounter|guce_|ncid|cmpid|soc_)", re.IGNORECASE)
+_WORD = re.compile(r"[a-z0-9]+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    content_hash TEXT UNIQUE NOT NULL,
+    title TEXT NOT NULL,
+    summary TEXT,
+    source TEXT,
+    published_at TEXT NOT NULL,
+    overall_sentiment_score REAL,
+    overall_sentiment_label TEXT,
+    syndicated INTEGER NOT NULL DEFAULT 1,
+    ingested_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_published ON articles (published_at);
+CREATE TABLE IF NOT EXISTS article_urls (
+    url TEXT PRIMARY KEY,
+    article_id INTEGER NOT NULL REFERENCES articles (id)
+);
+CREATE TABLE IF NOT EXISTS article_tickers (
+    article_id INTEGER NOT NULL REFERENCES articles (id),
+    ticker TEXT NOT NULL,
+    relevance REAL,
+    sentiment_score REAL,
+    sentiment_label TEXT,
+    PRIMARY KEY (article_id, ticker)
+);
+CREATE INDEX IF NOT EXISTS article_tickers_ticker ON article_tickers (ticker);
+CREATE TABLE IF NOT EXISTS article_topics (
+    article_id INTEGER NOT NULL REFERENCES articles (id),
+    topic TEXT NOT NULL,
+    relevance REAL,
+    PRIMARY KEY (article_id, topic)
+);
+CREATE INDEX IF NOT EXISTS article_topics_topic ON article_topics (topic);
+CREATE TABLE IF NOT EXISTS feeds (
+    feed TEXT PRIMARY KEY,
+    polled_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5 (title, summary, content='articles', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, summary) VALUES (new.id, new.title, new.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, summary) VALUES ('delete', old.id, old.title, old.summary);
+END;
+"""
+
+# Alpha Vantage feed topic labels that do not map to their request names by lower casing and underscores
+TOPIC_ALIASES = {
+    "economy - monetary": "economy_monetary", "economy - fiscal": "economy_fiscal", "economy - macro": "economy_macro",
+    "energy & transportation": "energy_transportation", "real estate & construction": "real_estate",
+    "retail & wholesale": "retail_wholesale", "mergers & acquisitions": "mergers_and_acquisitions",
+}
+
+
+def normalize_url(url: str) -> str:
+    """Lower case the scheme and host, drop tracking parameters, the fragment and a trailing slash."""
+    parts = urlsplit((url or "").strip())
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(k)])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), query, ""))
+
+
+def content_hash(title: str, summary: str | None) -> str:
+    """Hash of the normalized title and the start of the summary, shared by syndicated copies of a story."""
+    words = _WORD.findall((title or "").lower()) + _WORD.findall((summary or "").lower())[:HASH_SUMMARY_WORDS]
+    return hashlib.sha1(" ".join(words).encode()).hexdigest()
+
+
+def _topic(name: str) -> str:
+    name = (name or "").strip().lower()
+    return TOPIC_ALIASES.get(name, name.replace(" ", "_"))
+
+
+def _float(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def from_alpha_vantage(item: dict) -> dict | None:
+    """Normalize one NEWS_SENTIMENT feed item, None if it has no title or link."""
+    if not item.get("title") or not item.get("url"):
+        return None
+    try:
+        published = datetime.strptime(item.get("time_published", ""), "%Y%m%dT%H%M%S").isoformat()
+    except ValueError:
+        return None
+    return {
+        "url": item["url"], "title": item["title"], "summary": item.get("summary"), "source": item.get("source"),
+        "published_at": published,
+        "overall_sentiment_score": _float(item.get("overall_sentiment_score")),
+        "overall_sentiment_label": item.get("overall_sentiment_label"),
+        "tickers": [
+            (t["ticker"].upper(), _float(t.get("relevance_score")), _float(t.get("ticker_sentiment_score")), t.get("ticker_sentiment_label"))
+            for t in item.get("ticker_sentiment") or [] if t.get("ticker")
+        ],
+        "topics": [(_topic(t["topic"]), _float(t.get("relevance_score"))) for t in item.get("topics") or [] if t.get("topic")],
+    }
+
+
+def from_yfinance(item: dict, symbol: str) -> dict | None:
+    """Normalize one yfinance Ticker.news item, in either the flat or the nested "content" layout."""
+    content = item.get("content") if isinstance(item.get("content"), dict) else item
+    url = (content.get("canonicalUrl") or content.get("clickThroughUrl") or {}).get("url") or content.get("link")
+    if not content.get("title") or not url:
+        return None
+    if content.get("pubDate"):
+        published = content["pubDate"].rstrip("Z")
+    elif content.get("providerPublishTime"):
+        published = datetime.fromtimestamp(content["providerPublishTime"], timezone.utc).replace(tzinfo=None).isoformat()
+    else:
+        return None
+    related = [symbol.upper()] + [t.upper() for t in content.get("relatedTickers") or [] if t.upper() != symbol.upper()]
+    return {
+        "url": url, "title": content["title"], "summary": content.get("summary"),
+        "source": (content.get("provider") or {}).get("displayName") or content.get("publisher"),
+        "published_at": published[:19], "overall_sentiment_score": None, "overall_sentiment_label": None,
+        "tickers": [(ticker, None, None, None) for ticker in related], "topics": [],
+    }
+
+
+class NewsIndex:
+    """
+    Local SQLite store of de-duplicated news articles with an FTS5 index over titles and summaries.
+    An article seen again under another URL or from another syndication partner is merged into the
+    first copy: its tickers and topics are added and its syndication count goes up.
+    """
+
+    def __init__(self, path: str = NEWS_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def add(self, articles: list[dict]) -> int:
+        """
+        Insert normalized articles, merging duplicates by URL and content hash.
+        Args:
+            articles: Articles from from_alpha_vantage() or from_yfinance().
+        Returns:
+            The number of new articles.
+        """
+        added = 0
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                for article in articles:
+                    url, digest = normalize_url(article["url"]), content_hash(article["title"], article["summary"])
+                    row = connection.execute("SELECT article_id FROM article_urls WHERE url = ?", (url,)).fetchone()
+                    if row is None:
+                        row = connection.execute("SELECT id AS article_id FROM articles WHERE content_hash = ?", (digest,)).fetchone()
+                        if row is not None:
+                            # the same story under a new URL, e.g. a syndication partner
+                            connection.execute("UPDATE articles SET syndicated = syndicated + 1 WHERE id = ?", (row["article_id"],))
+                            connection.execute("INSERT INTO article_urls (url, article_id) VALUES (?, ?)", (url, row["article_id"]))
+                    if row is None:
+                        article_id = connection.execute(
+                            "INSERT INTO articles (url, content_hash, title, summary, source, published_at, overall_sentiment_score,"
+                            " overall_sentiment_label, ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (url, digest, article["title"], article["summary"], article["source"], article["published_at"],
+                             article["overall_sentiment_score"], article["overall_sentiment_label"], time.time()),
+                        ).lastrowid
+                        connection.execute("INSERT INTO article_urls (url, article_id) VALUES (?, ?)", (url, article_id))
+                        added += 1
+                    else:
+                        article_id = row["article_id"]
+                        # sentiment from Alpha Vantage wins over a yfinance copy without it
+                        connection.execute(
+                            "UPDATE articles SET overall_sentiment_score = COALESCE(overall_sentiment_score, ?),"
+                            " overall_sentiment_label = COALESCE(overall_sentiment_label, ?) WHERE id = ?",
+                            (article["overall_sentiment_score"], article["overall_sentiment_label"], article_id),
+                        )
+                    connection.executemany(
+                        "INSERT INTO article_tickers (article_id, ticker, relevance, sentiment_score, sentiment_label) VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT (article_id, ticker) DO UPDATE SET relevance = COALESCE(excluded.relevance, relevance),"
+                        " sentiment_score = COALESCE(excluded.sentiment_score, sentiment_score),"
+                        " sentiment_label = COALESCE(excluded.sentiment_label, sentiment_label)",
+                        [(article_id, *ticker) for ticker in article["tickers"]],
+                    )
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO article_topics (article_id, topic, relevance) VALUES (?, ?, ?)",
+                        [(article_id, *topic) for topic in article["topics"]],
+                    )
+        return added
+
+    def mark_polled(self, feed: str) -> None:
+        """Record that a feed, e.g. ticker:AAPL or topic:ipo, was just fetched."""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("INSERT OR REPLACE INTO feeds (feed, polled_at) VALUES (?, ?)", (feed, time.time()))
+
+    def polled_at(self, feed: str) -> float | None:
+        """Get when a feed was last fetched, None if never."""
+        with self._lock:
+            row = self._connect().execute("SELECT polled_at FROM feeds WHERE feed = ?", (feed,)).fetchone()
+        return row["polled_at"] if row else None
+
+    def is_fresh(self, feed: str) -> bool:
+        """Check whether a feed was fetched within FRESH_SECONDS."""
+        polled_at = self.polled_at(feed)
+        return polled_at is not None and time.time() - polled_at < FRESH_SECONDS
+
+    def search(self, ticker: str | None = None, topic: str | None = None, query: str | None = None,
+               days: int = DEFAULT_DAYS, limit: int = DEFAULT_LIMIT, now: datetime | None = None) -> list[dict]:
+        """
+        Query recent de-duplicated articles.
+        Args:
+            ticker: Only articles about this ticker, relevant ones when Alpha Vantage scored the relevance.
+            topic: Only articles on this Alpha Vantage topic, e.g. ipo or technology.
+            query: Full text query over titles and summaries; matches are ranked by BM25, otherwise newest first.
+            days: How many days back to look.
+            limit: How many articles to return.
+            now: End of the window as naive UTC, defaults to the wall clock. Replays pass the recording time.
+        Returns:
+            The articles in the NEWS_SENTIMENT field names, with the sentiment for the ticker if one is given,
+            otherwise for every ticker the article mentions.
+        """
+        joins, where, params = [], ["a.published_at >= ?"], []
+        if now is None:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+        else:
+            # a replayed window must not pick up articles indexed after the recording
+            where.append("a.published_at <= ?")
+            params.append(now.isoformat())
+        params.insert(0, (now - timedelta(days=days)).isoformat())
+        columns = "a.*, NULL AS ticker, NULL AS relevance, NULL AS ticker_sentiment_score, NULL AS ticker_sentiment_label"
+        if ticker:
+            columns = "a.*, t.ticker, t.relevance, t.sentiment_score AS ticker_sentiment_score, t.sentiment_label AS ticker_sentiment_label"
+            joins.append("JOIN article_tickers t ON t.article_id = a.id")
+            where.append("t.ticker = ? AND (t.relevance IS NULL OR t.relevance >= ?)")
+            params += [ticker.upper(), MIN_TICKER_RELEVANCE]
+        if topic:
+            joins.append("JOIN article_topics p ON p.article_id = a.id")
+            where.append("p.topic = ?")
+            params.append(_topic(topic))
+        order = "a.published_at DESC"
+        if query:
+            joins.append("JOIN articles_fts ON articles_fts.rowid = a.id")
+            where.append("articles_fts MATCH ?")
+            # quoted words cannot form FTS5 syntax, OR lets BM25 rank partial matches too
+            params.append(" OR ".join(f'"{word}"' for word in _WORD.findall(query.lower())) or '""')
+            order = "bm25(articles_fts), a.published_at DESC"
+        sql = f"SELECT {columns} FROM articles a {' '.join(joins)} WHERE {' AND '.join(where)} ORDER BY {order} LIMIT ?"
+        with self._lock:
+            rows = self._connect().execute(sql, (*params, int(limit))).fetchall()
+            topics = self._topics([row["id"] for row in rows])
+            # without a ticker filter every ticker an article mentions is returned
+            tickers = {} if ticker else self._tickers([row["id"] for row in rows])
+        return [
+            {
+                "time_published": row["published_at"], "title": row["title"], "url": row["url"], "source": row["source"],
+                "summary": row["summary"], "overall_sentiment_label": row["overall_sentiment_label"],
+                "overall_sentiment_score": row["overall_sentiment_score"], "syndicated": row["syndicated"],
+                "ticker_sentiment": [{"ticker": row["ticker"], "relevance_score": row["relevance"],
+                                      "ticker_sentiment_score": row["ticker_sentiment_score"],
+                                      "ticker_sentiment_label": row["ticker_sentiment_label"]}] if row["ticker"] else tickers.get(row["id"]),
+                "topics": topics.get(row["id"]) or None,
+            }
+            for row in rows
+        ]
+
+    def _topics(self, ids: list[int]) -> dict[int, list[str]]:
+        if not ids:
+            return {}
+        rows = self._connection.execute(
+            f"SELECT article_id, topic FROM article_topics WHERE article_id IN ({','.join('?' * len(ids))})", ids).fetchall()
+        topics: dict[int, list[str]] = {}
+        for row in rows:
+            topics.setdefault(row["article_id"], []).append(row["topic"])
+        return topics
+
+    def _tickers(self, ids: list[int]) -> dict[int, list[dict]]:
+        if not ids:
+            return {}
+        rows = self._connection.execute(
+            "SELECT article_id, ticker, relevance, sentiment_score, sentiment_label FROM article_tickers "
+            f"WHERE article_id IN ({','.join('?' * len(ids))}) ORDER BY article_id, relevance DESC", ids).fetchall()
+        tickers: dict[int, list[dict]] = {}
+        for row in rows:
+            tickers.setdefault(row["article_id"], []).append({
+                "ticker": row["ticker"], "relevance_score": row["relevance"],
+                "ticker_sentiment_score": row["sentiment_score"], "ticker_sentiment_label": row["sentiment_label"],
+            })
+        return tickers
+
+    def prune(self, max_age_days: float = RETENTION_DAYS) -> int:
+        """
+        Delete articles published more than max_age_days ago, with their URLs, tickers, topics and full text rows.
+        Args:
+            max_age_days: How many days of articles to keep.
+        Returns:
+            The number of deleted articles.
+        """
+        cutoff = (datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=max_age_days)).isoformat()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                stale = "SELECT id FROM articles WHERE published_at < ?"
+                for table in ("article_urls", "article_tickers", "article_topics"):
+                    connection.execute(f"DELETE FROM {table} WHERE article_id IN ({stale})", (cutoff,))
+                # the delete trigger keeps articles_fts in step
+                deleted = connection.execute("DELETE FROM articles WHERE published_at < ?", (cutoff,)).rowcount
+        return deleted
+
+    def stats(self) -> dict:
+        """Count the stored articles and the syndicated copies merged into them."""
+        with self._lock:
+            row = self._connect().execute("SELECT COUNT(*) AS articles, COALESCE(SUM(syndicated - 1), 0) AS merged FROM articles").fetchone()
+        return {"articles": row["articles"], "merged_duplicates": row["merged"]}
+
+
+# Process wide index. Set STOCKS_NEWS_DB to move it.
+news_index = NewsIndex()
+
+
+async def ingest_alpha_vantage(payload: dict | None, feed: str | None = None) -> int:
+    """Index a NEWS_SENTIMENT payload and mark its feed as polled. Returns the number of new articles."""
+    articles = [article for article in map(from_alpha_vantage, (payload or {}).get("feed") or []) if article]
+    added = await asyncio.to_thread(news_index.add, articles)
+    if feed and payload and "feed" in payload:
+        await asyncio.to_thread(news_index.mark_polled, feed)
+    return added
+
+
+async def ingest_yfinance(items: list | None, symbol: str, feed: str | None = None) -> int:
+    """Index a yfinance Ticker.news list and mark its feed as polled if it held news. Returns the number of new articles."""
+    articles = [article for article in (from_yfinance(item, symbol) for item in items or [] if isinstance(item, dict)) if article]
+    added = await asyncio.to_thread(news_index.add, articles)
+    if feed and articles:
+        await asyncio.to_thread(news_index.mark_polled, feed)
+    return added
+
+
+class NewsPoller:
+    """Background worker that polls NEWS_SENTIMENT and yfinance news for watched tickers and topics into the index."""
+
+    def __init__(self, tickers: list[str] | None = None, topics: list[str] | None = None):
+        self.tickers = tickers if tickers is not None else NEWS_TICKERS
+        self.topics = topics if topics is not None else NEWS_TOPICS
+        self.added = 0
+        self.pruned = 0
+        self._task: asyncio.Task | None = None
+
+    async def poll_once(self) -> None:
+        """Fetch every watched feed that is not fresh, then prune articles older than RETENTION_DAYS."""
+        for ticker in self.tickers:
+            if await asyncio.to_thread(news_index.is_fresh, f"ticker:{ticker}"):
+                continue
+            try:
+                self.added += await ingest_yfinance(await fetch_yfinance(ticker, "news", refresh=True), ticker, f"ticker:{ticker}")
+            except Exception as e:
+                print(f"News poller yfinance error for {ticker}: {e}")
+            payload = await fetch_alpha_vantage("NEWS_SENTIMENT", priority=PRIORITY_BACKGROUND, refresh=True, tickers=ticker, limit=FEED_LIMIT)
+            self.added += await ingest_alpha_vantage(payload, f"ticker:{ticker}")
+        for topic in self.topics:
+            if await asyncio.to_thread(news_index.is_fresh, f"topic:{topic}"):
+                continue
+            payload = await fetch_alpha_vantage("NEWS_SENTIMENT", priority=PRIORITY_BACKGROUND, refresh=True, topics=topic, limit=FEED_LIMIT)
+            self.added += await ingest_alpha_vantage(payload, f"topic:{topic}")
+        self.pruned += await asyncio.to_thread(news_index.prune)
+
+    async def run(self) -> None:
+        """Poll until cancelled."""
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"News poller error: {e}")
+            await asyncio.sleep(POLL_SECONDS)
+
+    def start(self) -> asyncio.Task | None:
+        """Start the worker on the running event loop if there is anything to watch."""
+        if (self.tickers or self.topics) and self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Cancel the worker."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def report(self) -> dict:
+        """Summarize the ingestion so far."""
+        return {"tickers": self.tickers, "topics": self.topics, "added": self.added, "pruned": self.pruned, **news_index.stats()}
+
+
+# Process wide poller, started by the CLI and the API server when STOCKS_NEWS_TICKERS, STOCKS_WATCHLIST or STOCKS_NEWS_TOPICS is set
+news_poller = NewsPoller()
+
+
+async def main():
+    try:
+        await news_poller.run()
+    finally:
+        print(f"News poller: {news_poller.report()}")
+        await close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
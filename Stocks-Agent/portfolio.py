@@ -0,0 +1,253 @@
+import asyncio
+import re
+from statistics import NormalDist
+
+import numpy as np
+
+from analytics_engine import align, load_series, range_mask, OHLC_COLUMNS, PERIODS_PER_YEAR
+from correlation_engine import covariance_matrix, returns_matrix
+
+DEFAULT_TIME_FRAME = "3year"
+DEFAULT_BENCHMARK = "SPY"
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_RISK_AVERSION = 5.0
+MAX_PORTFOLIO_SYMBOLS = 30
+OBJECTIVES = {"MIN_VARIANCE", "MEAN_VARIANCE", "NONE"}
+# Projected gradient descent for the long-only optimizations
+MAX_ITERATIONS = 10_000
+TOLERANCE = 1e-10
+
+_HOLDING_PATTERN = re.compile(r"^\s*\$?([A-Za-z][A-Za-z0-9.\-]*)\s*(?:[:=\s]\s*([\d.]+)\s*(%?))?\s*$")
+
+
+def parse_holdings(holdings: str) -> tuple[list[str], np.ndarray]:
+    """
+    Parse holdings such as "AAPL:0.4, MSFT:0.3, GOOGL:0.3" or "AAPL 40%, MSFT 60%".
+    Weights are normalized to sum to 1, holdings without any weight are equally weighted.
+    Args:
+        holdings: Comma separated symbols with optional weights, percentages or position values.
+    Returns:
+        The symbols and their weights.
+    Raises:
+        ValueError: If a holding cannot be parsed or the weights do not add up to a positive total.
+    """
+    symbols, weights = [], []
+    for part in (holdings or "").split(","):
+        if not part.strip():
+            continue
+        match = _HOLDING_PATTERN.match(part)
+        if match is None:
+            raise ValueError(f"'{part.strip()}' is not a holding like 'AAPL:0.4'")
+        symbol = match.group(1).upper()
+        if symbol in symbols:
+            raise ValueError(f"{symbol} is listed twice")
+        symbols.append(symbol)
+        weight = float(match.group(2)) if match.group(2) else np.nan
+        weights.append(weight / 100 if match.group(3) else weight)
+    if not symbols:
+        raise ValueError("no holdings given")
+    if len(symbols) > MAX_PORTFOLIO_SYMBOLS:
+        raise ValueError(f"at most {MAX_PORTFOLIO_SYMBOLS} holdings are supported")
+    weights = np.array(weights)
+    if np.isnan(weights).all():
+        weights = np.ones(len(symbols))
+    elif np.isnan(weights).any():
+        raise ValueError("give a weight for every holding or for none")
+    if weights.sum() <= 0:
+        raise ValueError("the weights must add up to more than 0")
+    return symbols, weights / weights.sum()
+
+
+def value_at_risk(returns: np.ndarray, confidence: float) -> dict[str, float]:
+    """
+    One period value at risk and conditional value at risk, as positive loss fractions.
+    Args:
+        returns: The portfolio period returns.
+        confidence: e.g. 0.95.
+    Returns:
+        Historical and parametric (normal) VaR and CVaR.
+    """
+    tail = 1.0 - confidence
+    historical_var = -np.quantile(returns, tail)
+    losses = returns[returns <= -historical_var]
+    mean, std = returns.mean(), returns.std(ddof=1)
+    z = NormalDist().inv_cdf(tail)
+    return {
+        "historical_var": float(historical_var),
+        "historical_cvar": float(-losses.mean()) if len(losses) else float(historical_var),
+        "parametric_var": float(-(mean + z * std)),
+        "parametric_cvar": float(-(mean - std * NormalDist().pdf(z) / tail)),
+    }
+
+
+def risk_contributions(weights: np.ndarray, covariance: np.ndarray) -> tuple[float, np.ndarray, np.ndarray]:
+    """
+    Split portfolio volatility into each holding's contribution.
+    Args:
+        weights: The portfolio weights.
+        covariance: The (symbols, symbols) period covariance matrix.
+    Returns:
+        The period volatility, the marginal contribution of each holding and each holding's
+        share of the volatility, the shares summing to 1.
+    """
+    volatility = float(np.sqrt(weights @ covariance @ weights))
+    marginal = covariance @ weights / volatility if volatility > 0 else np.zeros(len(weights))
+    return volatility, marginal, weights * marginal / volatility if volatility > 0 else np.zeros(len(weights))
+
+
+def project_simplex(v: np.ndarray) -> np.ndarray:
+    """Euclidean projection onto the long-only, fully invested weights {w >= 0, sum(w) = 1}."""
+    u = np.sort(v)[::-1]
+    cumulative = np.cumsum(u) - 1.0
+    rho = np.flatnonzero(u - cumulative / np.arange(1, len(v) + 1) > 0)[-1]
+    return np.maximum(v - cumulative[rho] / (rho + 1), 0.0)
+
+
+def optimize(covariance: np.ndarray, mean: np.ndarray | None = None, risk_aversion: float = DEFAULT_RISK_AVERSION) -> np.ndarray:
+    """
+    Long-only, fully invested weights by projected gradient descent.
+    Without expected returns this is the minimum variance portfolio, with them it maximizes
+    mean @ w - risk_aversion / 2 * w @ covariance @ w.
+    Args:
+        covariance: The (symbols, symbols) covariance matrix.
+        mean: The expected returns, over the same period as the covariance.
+        risk_aversion: The penalty on variance for the mean-variance objective.
+    Returns:
+        The optimal weights.
+    Raises:
+        ValueError: If risk_aversion is not positive.
+    """
+    if risk_aversion <= 0:
+        raise ValueError("risk aversion must be greater than 0")
+    n = len(covariance)
+    hessian = covariance * (risk_aversion if mean is not None else 2.0)
+    # 1 / Lipschitz constant of the gradient
+    step = 1.0 / max(np.linalg.eigvalsh(hessian)[-1], 1e-18)
+    weights = np.full(n, 1.0 / n)
+    for _ in range(MAX_ITERATIONS):
+        gradient = hessian @ weights - (mean if mean is not None else 0.0)
+        updated = project_simplex(weights - step * gradient)
+        if np.abs(updated - weights).max() < TOLERANCE:
+            return updated
+        weights = updated
+    return weights
+
+
+def _summary(returns: np.ndarray, covariance: np.ndarray, weights: np.ndarray, periods: int, risk_free: float) -> dict:
+    mean = returns.mean(axis=0) @ weights * periods
+    volatility = float(np.sqrt(weights @ covariance @ weights * periods))
+    return {
+        "annual_return": round(float(mean), 4),
+        "annual_volatility": round(volatility, 4),
+        "sharpe": round(float((mean - risk_free) / volatility), 4) if volatility > 0 else None,
+    }
+
+
+def analyze_returns(symbols: list[str], weights: np.ndarray, returns: np.ndarray, benchmark_returns: np.ndarray | None,
+                    periods: int, confidence: float, objective: str, risk_aversion: float, risk_free: float) -> dict:
+    """
+    Portfolio risk and optimization over an aligned return matrix.
+    Args:
+        symbols: The symbol of each column.
+        weights: The portfolio weights.
+        returns: A (dates, symbols) period return matrix.
+        benchmark_returns: The benchmark's period returns on the same dates, None to skip beta.
+        periods: Periods per year.
+        confidence: The VaR confidence level.
+        objective: MIN_VARIANCE, MEAN_VARIANCE or NONE.
+        risk_aversion: The variance penalty of MEAN_VARIANCE.
+        risk_free: The annual risk free rate used for the Sharpe ratio.
+    Returns:
+        Portfolio metrics, per holding risk figures and the optimized weights.
+    """
+    covariance = covariance_matrix(returns)
+    portfolio_returns = returns @ weights
+    _, marginal, share = risk_contributions(weights, covariance)
+    holdings = {
+        symbol: {"weight": round(float(weights[i]), 4), "annual_volatility": round(float(np.sqrt(covariance[i, i] * periods)), 4),
+                 "marginal_volatility": round(float(marginal[i] * np.sqrt(periods)), 4), "risk_share": round(float(share[i]), 4)}
+        for i, symbol in enumerate(symbols)
+    }
+    result = {"portfolio": _summary(returns, covariance, weights, periods, risk_free), "holdings": holdings}
+    if benchmark_returns is not None:
+        # Betas of the portfolio and every holding from one covariance pass
+        stacked = np.column_stack([returns, portfolio_returns, benchmark_returns])
+        betas = covariance_matrix(stacked)[:, -1] / benchmark_returns.var(ddof=1)
+        result["portfolio"]["beta"] = round(float(betas[-2]), 4)
+        for i, symbol in enumerate(symbols):
+            holdings[symbol]["beta"] = round(float(betas[i]), 4)
+    result["portfolio"]["value_at_risk"] = {
+        "confidence": confidence,
+        "horizon": "1 period",
+        **{name: round(value, 4) for name, value in value_at_risk(portfolio_returns, confidence).items()},
+    }
+    if objective != "NONE" and len(symbols) > 1:
+        expected = returns.mean(axis=0) if objective == "MEAN_VARIANCE" else None
+        optimal = optimize(covariance, expected, risk_aversion)
+        result["optimized"] = {
+            "objective": objective,
+            "weights": {symbol: round(float(w), 4) for symbol, w in zip(symbols, optimal)},
+            **_summary(returns, covariance, optimal, periods, risk_free),
+        }
+    return result
+
+
+async def analyze_portfolio(holdings: str, time_frame: str | None = None, interval: str = "DAILY", benchmark: str | None = DEFAULT_BENCHMARK,
+                            confidence: float = DEFAULT_CONFIDENCE, objective: str = "MIN_VARIANCE",
+                            risk_aversion: float = DEFAULT_RISK_AVERSION, risk_free: float = 0.0) -> dict | None:
+    """
+    Compute risk figures of a portfolio and an optimized alternative from the cached price series.
+    Args:
+        holdings: e.g. "AAPL:0.4, MSFT:0.3, GOOGL:0.3".
+        time_frame: The RANGE, e.g. "3year" or "2022-01-01,2024-12-31".
+        interval: DAILY, WEEKLY or MONTHLY.
+        benchmark: The symbol betas are measured against, empty or NONE to skip beta.
+        confidence: The VaR confidence level, e.g. 0.95 or 0.99.
+        objective: MIN_VARIANCE, MEAN_VARIANCE or NONE.
+        risk_aversion: The variance penalty of MEAN_VARIANCE.
+        risk_free: The annual risk free rate, e.g. 0.04.
+    Returns:
+        The portfolio analysis with the shared calendar's metadata, or None if a series could not be retrieved.
+    Raises:
+        ValueError: If the holdings or options are not valid.
+    """
+    symbols, weights = parse_holdings(holdings)
+    objective = (objective or "NONE").strip().upper().replace(" ", "_").replace("-", "_")
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {', '.join(sorted(OBJECTIVES))}")
+    if not 0.5 <= confidence < 1.0:
+        raise ValueError("confidence must be between 0.5 and 1, e.g. 0.95")
+    if risk_aversion <= 0:
+        raise ValueError("risk aversion must be greater than 0")
+    interval = (interval or "DAILY").strip().upper()
+    benchmark = (benchmark or "").strip().upper()
+    benchmark = None if benchmark in ("", "NONE") else benchmark
+    wanted = symbols + ([benchmark] if benchmark and benchmark not in symbols else [])
+    series_list = await asyncio.gather(*(load_series(symbol, interval) for symbol in wanted))
+    if any(series is None for series in series_list[:len(symbols)]):
+        return None
+    if benchmark and series_list[-1] is None:
+        # the portfolio is still analyzed, without betas
+        wanted, series_list, benchmark = wanted[:len(symbols)], series_list[:len(symbols)], None
+    dates, prices = align(series_list, OHLC_COLUMNS["CLOSE"])
+    mask = range_mask(dates, time_frame or DEFAULT_TIME_FRAME)
+    dates, prices = dates[mask], prices[mask]
+    if len(dates) < len(symbols) + 2:
+        raise ValueError(f"the time frame holds {len(dates)} shared bars, too few for {len(symbols)} holdings")
+    returns = returns_matrix(prices)
+    benchmark_returns = returns[:, wanted.index(benchmark)] if benchmark else None
+    result = await asyncio.to_thread(
+        analyze_returns, symbols, weights, returns[:, :len(symbols)], benchmark_returns,
+        PERIODS_PER_YEAR.get(interval, 252), confidence, objective, risk_aversion, risk_free,
+    )
+    return {
+        "meta_data": {
+            "symbols": ",".join(symbols),
+            "benchmark": benchmark,
+            "min_dt": str(dates[0].astype("datetime64[D]")),
+            "max_dt": str(dates[-1].astype("datetime64[D]")),
+            "interval": interval,
+            "observations": int(len(returns)),
+        },
+        **result,
+    }
@@ -0,0 +1,166 @@
+import re
+
+# Words that look like tickers but are not
+NON_TICKERS = {
+    "A", "I", "AI", "AM", "AN", "AND", "ARE", "AS", "AT", "BE", "BY", "CEO", "CFO", "DO", "EPS", "ETF", "FOR",
+    "HOW", "IN", "IPO", "IS", "IT", "ME", "MY", "OF", "ON", "OR", "PE", "SEC", "THE", "TO", "TTM", "US", "USA",
+    "USD", "VS", "WHAT", "YOY", "QOQ", "EBIT", "EBITDA", "GDP", "CPI", "FED", "OK", "NEWS",
+    "SMA", "EMA", "RSI", "MACD", "ATR", "VWAP", "ROE", "ROA", "PEG", "FCF", "CAGR", "VAR", "CVAR",
+}
+
+# Common company names -> ticker, checked before the ticker pattern
+COMPANY_ALIASES = {
+    "apple": "AAPL", "microsoft": "MSFT", "amazon": "AMZN", "google": "GOOGL", "alphabet": "GOOGL",
+    "meta": "META", "facebook": "META", "tesla": "TSLA", "nvidia": "NVDA", "netflix": "NFLX",
+    "ibm": "IBM", "intel": "INTC", "amd": "AMD", "oracle": "ORCL", "salesforce": "CRM",
+    "berkshire": "BRK.B", "jpmorgan": "JPM", "walmart": "WMT", "coca cola": "KO", "coca-cola": "KO",
+    "disney": "DIS", "boeing": "BA", "exxon": "XOM", "pfizer": "PFE", "visa": "V", "mastercard": "MA",
+}
+
+_TICKER_PATTERN = re.compile(r"\$?\b([A-Z]{1,5}(?:\.[A-Z])?)\b")
+
+# Agent key -> (keyword pattern, whether the agent needs a ticker)
+# Order matters only for reporting, a question matching several intents is not routed unless one is exclusive.
+INTENT_RULES = {
+    "corporate_action": (r"\bdividends?\b|\bpayouts?\b|\bex-dividend\b", True),
+    "insider_trades": (r"\binsiders?\b|\binsider (?:trades?|trading|transactions?)\b", True),
+    "etf": (r"\betfs?\b|\bfund profile\b", True),
+    "income_statement": (r"\bincome statements?\b|\bgross profit\b|\bnet income\b|\bmargins?\b|\brevenue\b", True),
+    "earning_analysis": (r"\bearnings?\b|\beps\b", True),
+    "cashflow_analysis": (r"\bcash ?flows?\b|\bcapex\b|\bfree cash\b", True),
+    "company_overview": (r"\boverview\b|\bcompany profile\b|\bfinancial ratios\b|\bwhat does .+ do\b", True),
+    "top_gainers_loosers": (r"\bgainers?\b|\blosers?\b|\bloosers?\b|\bmost active\b", False),
+    "advanced_analytics": (r"\bcorrelations?\b|\bcovariance\b|\bvariance\b|\bvolatility\b|\bdrawdown\b|\bautocorrelation\b|\bstandard deviation\b|\bbacktests?\b|\bwhat if i had\b|\bportfolios?\b|\bvalue at risk\b|\bvar\b|\bcvar\b", False),
+    "screener": (r"\bscreen(?:er|ing)?\b|\b(?:find|list|show) (?:me )?(?:all )?stocks\b|\bstocks (?:with|where|that have)\b", False),
+    "stock_news": (r"\bnews\b|\bheadlines?\b", True),
+    "stock_analysis": (r"\bstock price\b|\bshare price\b|\bquote\b|\bhow is .+ (?:doing|trading)\b|\bbuy or sell\b|\brsi\b|\bmacd\b|\bmoving averages?\b|\b\d+[- ]day average\b|\bbollinger\b|\bvwap\b|\batr\b|\btechnical indicators?\b", True),
+}
+# Agents with batch compare tools, which can take a question about several tickers at once
+COMPARISON_AGENTS = {"income_statement", "earning_analysis", "cashflow_analysis", "company_overview", "stock_analysis"}
+# Intents that win when they match along with others, since their filters name other intents' metrics
+EXCLUSIVE_INTENTS = {"screener"}
+_COMPILED_RULES = {key: (re.compile(pattern, re.IGNORECASE), needs_ticker) for key, (pattern, needs_ticker) in INTENT_RULES.items()}
+
+
+class RouteDecision:
+    """A confident pre-routing decision: which specialist agent and the resolved ticker, if any."""
+
+    def __init__(self, agent_key: str, stock_symbol: str | None, reason: str):
+        self.agent_key = agent_key
+        self.stock_symbol = stock_symbol
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        return f"RouteDecision({self.agent_key!r}, {self.stock_symbol!r}, {self.reason!r})"
+
+
+def extract_tickers(message: str) -> list[str]:
+    """
+    Find the stock symbols mentioned in a message.
+    Company names are resolved through COMPANY_ALIASES, then upper case words that look
+    like tickers are taken unless they are common non-ticker words.
+    Args:
+        message: The user message.
+    Returns:
+        The distinct symbols in order of appearance.
+    """
+    found = []
+    lowered = message.lower()
+    for name, symbol in COMPANY_ALIASES.items():
+        match = re.search(rf"\b{re.escape(name)}\b", lowered)
+        if match:
+            found.append((match.start(), symbol))
+    for match in _TICKER_PATTERN.finditer(message):
+        if match.group(1) not in NON_TICKERS or match.group(0).startswith("$"):
+            found.append((match.start(), match.group(1)))
+    symbols = []
+    for _, symbol in sorted(found):
+        if symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+
+class PreRouter:
+    """
+    Rule based router in front of the LLM triage agent.
+    Routes a message straight to a specialist only when exactly one intent matches and,
+    for ticker specific agents, exactly one ticker is found (or several, for agents that can
+    compare). Everything else goes to the LLM.
+    """
+
+    def __init__(self):
+        self.routed = 0
+        self.fallbacks = 0
+        # Routes out of a conversation already with a specialist, which would not reach the triage agent
+        self.rerouted = 0
+        self._routed_seconds = 0.0
+        self._fallback_seconds = 0.0
+        self._routed_runs = 0
+        self._fallback_runs = 0
+
+    def route(self, message: str, triage: bool = True) -> RouteDecision | None:
+        """
+        Decide whether a message can skip the LLM triage.
+        Args:
+            message: The user message.
+            triage: Whether the LLM triage agent answers the message if it is not routed. Follow-ups
+                to a specialist may still be routed elsewhere but count neither as a hit nor a fallback.
+        Returns:
+            The decision, or None to fall back to the LLM triage agent.
+        """
+        intents = [key for key, (pattern, _) in _COMPILED_RULES.items() if pattern.search(message)]
+        intents = [key for key in intents if key in EXCLUSIVE_INTENTS] or intents
+        tickers = extract_tickers(message)
+        decision = None
+        if len(intents) == 1:
+            agent_key = intents[0]
+            needs_ticker = _COMPILED_RULES[agent_key][1]
+            if not needs_ticker:
+                decision = RouteDecision(agent_key, tickers[0] if len(tickers) == 1 else None, f"intent '{agent_key}'")
+            elif len(tickers) == 1:
+                decision = RouteDecision(agent_key, tickers[0], f"intent '{agent_key}' with ticker {tickers[0]}")
+            elif len(tickers) > 1 and agent_key in COMPARISON_AGENTS:
+                decision = RouteDecision(agent_key, ",".join(tickers), f"intent '{agent_key}' comparing {', '.join(tickers)}")
+        if not triage:
+            self.rerouted += decision is not None
+        elif decision is None:
+            self.fallbacks += 1
+        else:
+            self.routed += 1
+        return decision
+
+    def record_run(self, routed: bool, seconds: float) -> None:
+        """Record how long a turn took, to estimate the latency the router saves."""
+        if routed:
+            self._routed_runs += 1
+            self._routed_seconds += seconds
+        else:
+            self._fallback_runs += 1
+            self._fallback_seconds += seconds
+
+    def report(self) -> dict:
+        """
+        Summarize the router's effect.
+        Returns:
+            The hit rate, average turn latency with and without pre-routing, and the
+            estimated total seconds saved by the routed turns.
+        """
+        total = self.routed + self.fallbacks
+        avg_routed = self._routed_seconds / self._routed_runs if self._routed_runs else None
+        avg_fallback = self._fallback_seconds / self._fallback_runs if self._fallback_runs else None
+        saved = None
+        if avg_routed is not None and avg_fallback is not None:
+            saved = max(0.0, avg_fallback - avg_routed) * self._routed_runs
+        return {
+            "routed": self.routed,
+            "fallbacks": self.fallbacks,
+            "rerouted": self.rerouted,
+            "hit_rate": self.routed / total if total else 0.0,
+            "avg_routed_turn_seconds": avg_routed,
+            "avg_llm_triage_turn_seconds": avg_fallback,
+            "estimated_seconds_saved": saved,
+        }
+
+
+# Process wide router used by the Stocks CLI loop
+pre_router = PreRouter()
@@ -0,0 +1,174 @@
+import json
+
+# Fields of yfinance Ticker.info the stock analysis agent actually talks about
+STOCK_INFO_FIELDS = [
+    "symbol", "shortName", "longName", "sector", "industry", "currency", "exchange",
+    "currentPrice", "previousClose", "open", "dayLow", "dayHigh", "regularMarketChangePercent",
+    "fiftyTwoWeekLow", "fiftyTwoWeekHigh", "fiftyDayAverage", "twoHundredDayAverage",
+    "volume", "averageVolume", "marketCap", "beta", "trailingPE", "forwardPE",
+    "trailingEps", "forwardEps", "dividendYield", "payoutRatio", "profitMargins",
+    "revenueGrowth", "earningsGrowth", "recommendationKey", "targetMeanPrice", "numberOfAnalystOpinions",
+]
+
+# Per statement: fields and how many annual and quarterly periods the agent tabulates
+INCOME_STATEMENT_FIELDS = [
+    "fiscalDateEnding", "reportedCurrency", "totalRevenue", "grossProfit", "costOfRevenue",
+    "costofGoodsAndServicesSold", "operatingExpenses", "operatingIncome", "ebit", "ebitda",
+    "incomeBeforeTax", "incomeTaxExpense", "netIncome", "researchAndDevelopment",
+    "sellingGeneralAndAdministrative", "interestExpense", "depreciationAndAmortization",
+]
+CASHFLOW_FIELDS = [
+    "fiscalDateEnding", "reportedCurrency", "operatingCashflow", "capitalExpenditures",
+    "dividendPayout", "netIncome", "cashflowFromFinancing", "cashflowFromInvestment",
+]
+ANNUAL_EARNINGS_FIELDS = ["fiscalDateEnding", "reportedEPS"]
+QUARTERLY_EARNINGS_FIELDS = [
+    "fiscalDateEnding", "reportedDate", "reportedEPS", "estimatedEPS", "surprise", "surprisePercentage",
+]
+INSIDER_TRADE_FIELDS = [
+    "transaction_date", "ticker", "executive", "executive_title", "security_type",
+    "acquisition_or_disposal", "shares", "share_price",
+]
+NEWS_FIELDS = [
+    "time_published", "title", "url", "source", "summary", "overall_sentiment_label",
+    "overall_sentiment_score", "ticker_sentiment", "topics", "syndicated",
+]
+
+# Latest token estimates per tool: (raw, projected)
+output_token_estimates: dict[str, tuple[int, int]] = {}
+
+
+def estimate_tokens(payload: object) -> int:
+    """
+    Estimate how many prompt tokens a tool output costs.
+    Uses the usual ~4 characters per token rule over the serialized output.
+    Args:
+        payload: The tool output.
+    Returns:
+        The estimated token count.
+    """
+    text = payload if isinstance(payload, str) else json.dumps(payload, default=str, separators=(",", ":"))
+    return (len(text) + 3) // 4
+
+
+def _pick(record: dict, fields: list[str]) -> dict:
+    return {field: record[field] for field in fields if field in record and record[field] not in (None, "None", "")}
+
+
+def _latest(records: list, count: int, fields: list[str], date_field: str = "fiscalDateEnding") -> list[dict]:
+    records = sorted((r for r in records or [] if isinstance(r, dict)), key=lambda r: r.get(date_field, ""), reverse=True)
+    return [_pick(r, fields) for r in records[:count]]
+
+
+def project_stock_info(info: dict, days: int = 10) -> dict:
+    """
+    Keep the quote, valuation and analyst fields of a yfinance Ticker.info dict.
+    The TIME_SERIES_DAILY fallback keeps its metadata and the most recent days.
+    """
+    series = info.get("Time Series (Daily)")
+    if isinstance(series, dict):
+        recent = sorted(series, reverse=True)[:days]
+        return {"Meta Data": info.get("Meta Data"), "Time Series (Daily)": {day: series[day] for day in recent}}
+    return _pick(info, STOCK_INFO_FIELDS)
+
+
+def project_income_statement(payload: dict, years: int = 5, quarters: int = 5) -> dict:
+    """Keep the last years and quarters of an INCOME_STATEMENT payload, with the tabulated fields only."""
+    return {
+        "symbol": payload.get("symbol"),
+        "annualReports": _latest(payload.get("annualReports"), years, INCOME_STATEMENT_FIELDS),
+        "quarterlyReports": _latest(payload.get("quarterlyReports"), quarters, INCOME_STATEMENT_FIELDS),
+    }
+
+
+def project_cashflow(payload: dict, years: int = 5, quarters: int = 6) -> dict:
+    """Keep the last years and quarters of a CASH_FLOW payload, with the tabulated fields only."""
+    return {
+        "symbol": payload.get("symbol"),
+        "annualReports": _latest(payload.get("annualReports"), years, CASHFLOW_FIELDS),
+        "quarterlyReports": _latest(payload.get("quarterlyReports"), quarters, CASHFLOW_FIELDS),
+    }
+
+
+def project_earnings(payload: dict, years: int = 5, quarters: int = 6) -> dict:
+    """Keep the last years and quarters of an EARNINGS payload."""
+    return {
+        "symbol": payload.get("symbol"),
+        "annualEarnings": _latest(payload.get("annualEarnings"), years, ANNUAL_EARNINGS_FIELDS),
+        "quarterlyEarnings": _latest(payload.get("quarterlyEarnings"), quarters, QUARTERLY_EARNINGS_FIELDS),
+    }
+
+
+def project_insider_trades(payload: dict, count: int = 10) -> dict:
+    """Keep the most recent insider transactions."""
+    return {"data": _latest(payload.get("data"), count, INSIDER_TRADE_FIELDS, date_field="transaction_date")}
+
+
+def project_dividends(payload: dict, count: int = 12) -> dict:
+    """Keep the most recent dividend distributions."""
+    fields = ["ex_dividend_date", "declaration_date", "record_date", "payment_date", "amount"]
+    return {"symbol": payload.get("symbol"), "data": _latest(payload.get("data"), count, fields, date_field="ex_dividend_date")}
+
+
+def project_overview(payload: dict, description_chars: int = 500) -> dict:
+    """Keep the company overview, with a shortened description."""
+    overview = _pick(payload, list(payload))
+    description = overview.get("Description")
+    if isinstance(description, str) and len(description) > description_chars:
+        overview["Description"] = description[:description_chars].rsplit(" ", 1)[0] + "..."
+    return overview
+
+
+def project_etf(payload: dict, holdings: int = 10) -> dict:
+    """Keep the ETF profile with its largest holdings only."""
+    etf = {k: v for k, v in payload.items() if k != "holdings"}
+    etf["holdings"] = (payload.get("holdings") or [])[:holdings]
+    return etf
+
+
+def project_news(payload: dict, count: int = 10) -> dict:
+    """Keep the headline, link, source, summary and sentiment fields of a NEWS_SENTIMENT feed."""
+    return {"feed": _latest(payload.get("feed"), count, NEWS_FIELDS, date_field="time_published")}
+
+
+def project_top_movers(payload: dict, count: int = 10) -> dict:
+    """Keep the first entries of the top gainers, losers and most actively traded lists."""
+    movers = {k: v for k, v in payload.items() if k not in ("top_gainers", "top_losers", "most_actively_traded")}
+    for key in ("top_gainers", "top_losers", "most_actively_traded"):
+        movers[key] = (payload.get(key) or [])[:count]
+    return movers
+
+
+# Tool name -> projection for its output
+PROJECTIONS = {
+    "get_stock_data": project_stock_info,
+    "get_income_statement": project_income_statement,
+    "get_cashflow_data": project_cashflow,
+    "get_earning_data": project_earnings,
+    "get_insider_trades": project_insider_trades,
+    "get_corporate_action_dividend_data": project_dividends,
+    "get_company_overview_data": project_overview,
+    "get_etf_data": project_etf,
+    "get_top_gainers_loosers_active_tickers": project_top_movers,
+    "get_stock_news": project_news,
+    "get_topic_news": project_news,
+    "search_news": project_news,
+}
+
+
+def project(tool_name: str, payload: object) -> object:
+    """
+    Cut a tool output down to what the receiving agent uses and record its token size.
+    Payloads are never modified in place, since they may be shared with the cache.
+    Args:
+        tool_name: The function tool name.
+        payload: The raw tool output.
+    Returns:
+        The projected output, or the raw output if the tool has no projection or the payload has an unexpected shape.
+    """
+    projection = PROJECTIONS.get(tool_name)
+    projected = payload
+    if projection is not None and isinstance(payload, dict) and not payload.keys() & {"Error Message", "Note", "Information"}:
+        projected = projection(payload)
+    output_token_estimates[tool_name] = (estimate_tokens(payload), estimate_tokens(projected))
+    return projected
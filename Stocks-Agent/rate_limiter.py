@@ -0,0 +1,187 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from datetime import datetime, timezone
+
+# Lower value is served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITY_BACKGROUND = 3
+
+# Interactive quote lookups go first, market-wide lists and news yield to them
+FUNCTION_PRIORITIES = {
+    "TIME_SERIES_DAILY": PRIORITY_HIGH,
+    "GLOBAL_QUOTE": PRIORITY_HIGH,
+    "TOP_GAINERS_LOSERS": PRIORITY_LOW,
+    "NEWS_SENTIMENT": PRIORITY_LOW,
+}
+
+# Longest a call may sit in the queue before it is shed, per priority (seconds)
+MAX_WAIT_SECONDS = {
+    PRIORITY_HIGH: 90.0,
+    PRIORITY_NORMAL: 60.0,
+    PRIORITY_LOW: 20.0,
+    PRIORITY_BACKGROUND: 120.0,
+}
+
+# Share of the daily budget held back from each priority so low priority work
+# cannot starve interactive calls late in the day
+DAILY_RESERVE = {
+    PRIORITY_HIGH: 0.0,
+    PRIORITY_NORMAL: 0.05,
+    PRIORITY_LOW: 0.15,
+    PRIORITY_BACKGROUND: 0.3,
+}
+
+
+def priority_for(function: str) -> int:
+    """
+    Get the default scheduling priority of an Alpha Vantage function.
+    Args:
+        function: The Alpha Vantage function name.
+    Returns:
+        The priority, lower is served first.
+    """
+    return FUNCTION_PRIORITIES.get(function.upper(), PRIORITY_NORMAL)
+
+
+class QuotaScheduler:
+    """
+    Process wide scheduler for a per-minute and per-day API call budget.
+    The per-minute budget is a token bucket, calls that find it empty wait in a
+    priority queue and are shed once they exceed their priority's maximum wait
+    or the daily budget left for their priority runs out.
+    """
+
+    def __init__(self, per_minute: int, per_day: int):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self._rate = per_minute / 60.0
+        self._tokens = float(per_minute)
+        self._updated_at = time.monotonic()
+        self._day = datetime.now(timezone.utc).date()
+        self._used_today = 0
+        self._waiters: list[tuple[int, int, asyncio.Future, float]] = []
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._granted = {p: 0 for p in MAX_WAIT_SECONDS}
+        self._shed = {p: 0 for p in MAX_WAIT_SECONDS}
+        self._wait_total = {p: 0.0 for p in MAX_WAIT_SECONDS}
+        self._wait_max = {p: 0.0 for p in MAX_WAIT_SECONDS}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(float(self.per_minute), self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+        today = datetime.now(timezone.utc).date()
+        if today != self._day:
+            self._day = today
+            self._used_today = 0
+
+    def _daily_allowance(self, priority: int) -> bool:
+        reserve = int(self.per_day * DAILY_RESERVE.get(priority, 0.0))
+        return self._used_today < self.per_day - reserve
+
+    def _grant(self, priority: int, enqueued_at: float) -> None:
+        waited = time.monotonic() - enqueued_at
+        self._tokens -= 1
+        self._used_today += 1
+        self._granted[priority] = self._granted.get(priority, 0) + 1
+        self._wait_total[priority] = self._wait_total.get(priority, 0.0) + waited
+        self._wait_max[priority] = max(self._wait_max.get(priority, 0.0), waited)
+
+    def _record_shed(self, priority: int) -> None:
+        self._shed[priority] = self._shed.get(priority, 0) + 1
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL, max_wait: float | None = None) -> bool:
+        """
+        Wait for permission to make one upstream call.
+        Args:
+            priority: The call priority, lower is served first.
+            max_wait: Longest time to wait in seconds, defaults to the priority's MAX_WAIT_SECONDS.
+        Returns:
+            True if the call may proceed, False if it was shed.
+        """
+        self._refill()
+        if not self._daily_allowance(priority):
+            self._record_shed(priority)
+            return False
+        enqueued_at = time.monotonic()
+        if not self._waiters and self._tokens >= 1:
+            self._grant(priority, enqueued_at)
+            return True
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future, enqueued_at))
+        self._schedule_dispatch()
+        if max_wait is None:
+            max_wait = MAX_WAIT_SECONDS.get(priority, 60.0)
+        try:
+            granted = await asyncio.wait_for(future, timeout=max_wait)
+        except asyncio.TimeoutError:
+            self._record_shed(priority)
+            return False
+        return granted
+
+    def _schedule_dispatch(self) -> None:
+        if self._timer is not None:
+            return
+        delay = max(0.0, (1 - self._tokens) / self._rate) if self._rate else 60.0
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        self._refill()
+        while self._waiters:
+            priority, _, future, enqueued_at = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._daily_allowance(priority):
+                heapq.heappop(self._waiters)
+                self._record_shed(priority)
+                future.set_result(False)
+                continue
+            if self._tokens < 1:
+                break
+            heapq.heappop(self._waiters)
+            self._grant(priority, enqueued_at)
+            future.set_result(True)
+        if self._waiters:
+            self._schedule_dispatch()
+
+    def throttled(self) -> None:
+        """Empty the bucket after the upstream reported a rate limit, so queued calls back off."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0)
+
+    def metrics(self) -> dict:
+        """
+        Get a snapshot of the scheduler state.
+        Returns:
+            Queue depth, granted and shed counts, and average and maximum wait per priority.
+        """
+        self._refill()
+        pending = [entry for entry in self._waiters if not entry[2].done()]
+        return {
+            "queue_depth": len(pending),
+            "queue_depth_by_priority": {p: sum(1 for entry in pending if entry[0] == p) for p in MAX_WAIT_SECONDS},
+            "tokens_available": round(self._tokens, 2),
+            "calls_today": self._used_today,
+            "daily_remaining": max(0, self.per_day - self._used_today),
+            "granted": dict(self._granted),
+            "shed": dict(self._shed),
+            "avg_wait_seconds": {p: (self._wait_total[p] / self._granted[p]) if self._granted.get(p) else 0.0 for p in self._granted},
+            "max_wait_seconds": dict(self._wait_max),
+        }
+
+
+# Process wide scheduler shared by every Alpha Vantage tool.
+# Defaults match the free tier; raise them for a premium key.
+quota_scheduler = QuotaScheduler(
+    per_minute=int(os.getenv("ALPHA_VANTAGE_CALLS_PER_MINUTE", "5")),
+    per_day=int(os.getenv("ALPHA_VANTAGE_CALLS_PER_DAY", "25")),
+)
@@ -0,0 +1,204 @@
+import hashlib
+import inspect
+import json
+import os
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+from agents import Model, ModelProvider, ModelResponse, OpenAIProvider, Usage
+from openai.types.responses import ResponseOutputItem, ResponseStreamEvent
+from pydantic import TypeAdapter
+
+# off: live calls, record: live calls saved as fixtures, replay: fixtures only, no network
+REPLAY_MODE = os.getenv("STOCKS_REPLAY_MODE", "off").lower()
+FIXTURE_DIR = os.getenv("STOCKS_FIXTURE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fixtures"))
+
+# Request parameters that must not end up in fixture keys or files
+_SECRET_PARAMS = {"apikey"}
+
+_output_items = TypeAdapter(ResponseOutputItem)
+_stream_events = TypeAdapter(ResponseStreamEvent)
+
+
+class ReplayMiss(LookupError):
+    """Raised in replay mode when a request has no recorded fixture."""
+
+
+def fixture_key(*parts: object) -> str:
+    """Build a stable fixture key from the request parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def http_key(url: str, params: dict | None) -> str:
+    """Fixture key of an HTTP GET, without secret query parameters."""
+    return fixture_key(url, {k: v for k, v in (params or {}).items() if k.lower() not in _SECRET_PARAMS})
+
+
+class FixtureStore:
+    """Recorded responses, one JSON file per request under <root>/<kind>/<key>.json."""
+
+    def __init__(self, root: str = FIXTURE_DIR):
+        self.root = root
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.root, kind, f"{key}.json")
+
+    def get(self, kind: str, key: str) -> object:
+        """
+        Read a recorded response.
+        Raises:
+            ReplayMiss: If nothing was recorded for the key.
+        """
+        try:
+            with open(self._path(kind, key), encoding="utf-8") as f:
+                return json.load(f)["response"]
+        except (OSError, ValueError, KeyError):
+            raise ReplayMiss(f"No recorded {kind} fixture {key} in {self.root}")
+
+    def put(self, kind: str, key: str, response: object, request: object = None) -> None:
+        """Write a recorded response, with the request it answers for reference."""
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"request": request, "response": response}, f, default=str)
+        os.replace(tmp_path, path)
+
+
+fixtures = FixtureStore()
+
+
+async def replayable(kind: str, key: str, fetch: Callable[[], Awaitable[object]], request: object = None) -> object:
+    """
+    Serve a response according to REPLAY_MODE.
+    Args:
+        kind: The fixture kind, e.g. http or yfinance.
+        key: The fixture key of the request.
+        fetch: Makes the live request.
+        request: A description of the request stored next to a recorded response.
+    Returns:
+        The recorded response in replay mode, otherwise the live one.
+    """
+    if REPLAY_MODE == "replay":
+        return fixtures.get(kind, key)
+    response = await fetch()
+    if REPLAY_MODE == "record":
+        # failures are recorded too, so a replay takes the same fallback path
+        fixtures.put(kind, key, response, request)
+    return response
+
+
+_clock: datetime | None = None
+
+
+async def replay_now() -> datetime:
+    """
+    Get the current UTC time, naive. Record mode saves the time of the recording and replay mode
+    returns it, so time windows over replayed data select the same rows as the recording aged.
+    Returns:
+        The wall clock when live, otherwise the time the fixtures were recorded.
+    """
+    global _clock
+    if REPLAY_MODE not in ("record", "replay"):
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+    if _clock is None:
+        async def now():
+            return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+        try:
+            _clock = datetime.fromisoformat(await replayable("clock", fixture_key("now"), now))
+        except ReplayMiss:
+            # fixtures recorded before the clock was kept
+            _clock = datetime.now(timezone.utc).replace(tzinfo=None)
+    return _clock
+
+
+def _bound_arguments(method: str, args: tuple, kwargs: dict) -> dict:
+    """
+    Map the arguments of a Model call after the input onto their names.
+    The runner passes model_settings, tools, output_schema and handoffs positionally.
+    """
+    try:
+        return inspect.signature(getattr(Model, method)).bind(None, None, None, *args, **kwargs).arguments
+    except (AttributeError, TypeError):
+        # SDK versions whose signature does not bind fall back to the documented positions
+        names = ("model_settings", "tools", "output_schema", "handoffs")
+        return {**dict(zip(names, args)), **kwargs}
+
+
+def _model_key(model_name: str | None, system_instructions: str | None, input, method: str, args: tuple, kwargs: dict) -> str:
+    arguments = _bound_arguments(method, args, kwargs)
+    tools = sorted(getattr(tool, "name", str(tool)) for tool in arguments.get("tools") or [])
+    handoffs = sorted(getattr(handoff, "tool_name", str(handoff)) for handoff in arguments.get("handoffs") or [])
+    return fixture_key(model_name, system_instructions, input, tools, handoffs)
+
+
+class ReplayModel(Model):
+    """
+    Model wrapper that records the wrapped model's responses and stream events, or replays
+    them without a network call. Token usage of every response is added to `usage`.
+    """
+
+    def __init__(self, model: Model | None, model_name: str | None, usage: dict):
+        self.model = model
+        self.model_name = model_name
+        self.usage = usage
+
+    def _add_usage(self, input_tokens: int, output_tokens: int) -> None:
+        self.usage["requests"] += 1
+        self.usage["input_tokens"] += input_tokens or 0
+        self.usage["output_tokens"] += output_tokens or 0
+
+    async def get_response(self, system_instructions, input, *args, **kwargs) -> ModelResponse:
+        key = _model_key(self.model_name, system_instructions, input, "get_response", args, kwargs)
+
+        async def fetch():
+            response = await self.model.get_response(system_instructions, input, *args, **kwargs)
+            return {
+                "output": [item.model_dump() for item in response.output],
+                "usage": {"requests": response.usage.requests, "input_tokens": response.usage.input_tokens,
+                          "output_tokens": response.usage.output_tokens, "total_tokens": response.usage.total_tokens},
+                "response_id": response.response_id,
+            }
+
+        recorded = await replayable("model", key, fetch, {"model": self.model_name, "input": input})
+        usage = Usage(**recorded["usage"])
+        self._add_usage(usage.input_tokens, usage.output_tokens)
+        output = [_output_items.validate_python(item) for item in recorded["output"]]
+        return ModelResponse(output=output, usage=usage, response_id=recorded["response_id"])
+
+    async def stream_response(self, system_instructions, input, *args, **kwargs):
+        key = _model_key(self.model_name, system_instructions, input, "stream_response", args, kwargs)
+        if REPLAY_MODE == "replay":
+            stream = self._replay(fixtures.get("model_stream", key))
+        else:
+            stream = self.model.stream_response(system_instructions, input, *args, **kwargs)
+        recorded = []
+        async for event in stream:
+            if REPLAY_MODE == "record":
+                recorded.append(event.model_dump())
+            if event.type == "response.completed" and event.response.usage is not None:
+                self._add_usage(event.response.usage.input_tokens, event.response.usage.output_tokens)
+            yield event
+        if recorded:
+            fixtures.put("model_stream", key, recorded, {"model": self.model_name, "input": input})
+
+    async def _replay(self, events: list[dict]):
+        for event in events:
+            yield _stream_events.validate_python(event)
+
+
+class ReplayModelProvider(ModelProvider):
+    """Model provider for RunConfig that wraps the OpenAI models with ReplayModel."""
+
+    def __init__(self, provider: ModelProvider | None = None):
+        self.provider = provider
+        self.usage = {"requests": 0, "input_tokens": 0, "output_tokens": 0}
+
+    def get_model(self, model_name: str | None) -> Model:
+        model = None
+        if REPLAY_MODE != "replay":
+            # only live modes need an API key and client
+            self.provider = self.provider or OpenAIProvider()
+            model = self.provider.get_model(model_name)
+        return ReplayModel(model, model_name, self.usage)
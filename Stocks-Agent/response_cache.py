@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from market_calendar import session_ttl
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# How long an Alpha Vantage response stays fresh, per query function.
+# Fundamentals only change when a company reports, market data changes all day.
+# Quote-like functions follow the market sessions instead, see market_calendar.SESSION_TTLS.
+FUNCTION_TTLS = {
+    "INCOME_STATEMENT": 7 * DAY,
+    "CASH_FLOW": 7 * DAY,
+    "EARNINGS": DAY,
+    "OVERVIEW": DAY,
+    "DIVIDENDS": DAY,
+    "ETF_PROFILE": DAY,
+    "INSIDER_TRANSACTIONS": 6 * HOUR,
+    "YFINANCE_NEWS": 10 * MINUTE,
+    "ANALYTICS_FIXED_WINDOW": HOUR,
+    "NEWS_SENTIMENT": 10 * MINUTE,
+}
+DEFAULT_TTL = MINUTE
+
+# Query parameters that never change the response and must stay out of cache keys
+_IGNORED_PARAMS = {"apikey"}
+
+
+def ttl_for(function: str) -> float:
+    """
+    Get the freshness window for an Alpha Vantage function.
+    Quote-like functions follow the market calendar, so data fetched while the market is
+    closed stays fresh until the next session that can change it.
+    Args:
+        function: The Alpha Vantage function name.
+    Returns:
+        The time to live in seconds.
+    """
+    session_aware = session_ttl(function)
+    if session_aware is not None:
+        return session_aware
+    return FUNCTION_TTLS.get(function.upper(), DEFAULT_TTL)
+
+
+def make_key(function: str, params: dict | None = None) -> str:
+    """
+    Build a stable cache key from the function name and its query parameters.
+    Args:
+        function: The Alpha Vantage function name.
+        params: The query parameters, e.g. {"symbol": "IBM"}.
+    Returns:
+        The cache key.
+    """
+    params = {k: str(v).upper() if k.lower() in ("symbol", "tickers", "symbols") else v
+              for k, v in (params or {}).items() if k not in _IGNORED_PARAMS}
+    return f"{function.upper()}:{json.dumps(params, sort_keys=True, default=str)}"
+
+
+class ResponseCache:
+    """
+    Two tier TTL cache for decoded API payloads.
+    The first tier is an in-memory LRU, the optional second tier is a directory of JSON files
+    so warm entries survive a restart.
+    """
+
+    def __init__(self, max_entries: int = 512, disk_dir: str | None = None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def _read_disk(self, key: str) -> tuple[float, object] | None:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get("key") != key:
+            return None
+        return record["expires_at"], record["payload"]
+
+    def _write_disk(self, key: str, expires_at: float, payload: object) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "expires_at": expires_at, "payload": payload}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError):
+            pass
+
+    def get(self, key: str, allow_stale: bool = False) -> object | None:
+        """
+        Look up a cached payload.
+        Args:
+            key: The cache key from make_key().
+            allow_stale: Return an expired entry instead of None, e.g. when the upstream is unavailable.
+        Returns:
+            The cached payload, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.disk_dir:
+            entry = self._read_disk(key)
+            if entry is not None:
+                self._store(key, *entry)
+        if entry is None or (entry[0] <= now and not allow_stale):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def expires_at(self, key: str) -> float | None:
+        """Get the expiry timestamp of an entry without counting it as a hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.disk_dir:
+            entry = self._read_disk(key)
+        return None if entry is None else entry[0]
+
+    def set(self, key: str, payload: object, ttl: float) -> None:
+        """
+        Store a payload in both tiers.
+        Args:
+            key: The cache key from make_key().
+            payload: The JSON serializable payload.
+            ttl: The time to live in seconds.
+        """
+        expires_at = time.time() + ttl
+        self._store(key, expires_at, payload)
+        if self.disk_dir:
+            self._write_disk(key, expires_at, payload)
+
+    def _store(self, key: str, expires_at: float, payload: object) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        """Drop an entry from both tiers."""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        """Drop every in-memory entry. Disk entries are left to expire."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Process wide cache used by the Alpha Vantage tools.
+# Set STOCKS_CACHE_DIR to keep responses on disk between restarts.
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("STOCKS_CACHE_MAX_ENTRIES", "512")),
+    disk_dir=os.getenv("STOCKS_CACHE_DIR") or None,
+)
@@ -0,0 +1,176 @@
+import math
+import os
+from collections import OrderedDict, deque
+
+from analytics_engine import PERIODS_PER_YEAR, OHLC_COLUMNS, load_series
+
+DEFAULT_WINDOW = 20
+# Windows kept in memory, least recently queried evicted first
+MAX_WINDOWS = int(os.getenv("STOCKS_ROLLING_WINDOWS", "256"))
+
+
+class RollingWindow:
+    """
+    Statistics over the last `size` bars of one price stream, updated in O(1) per bar.
+    Mean and variance of returns use a sliding Welford update, the rolling min and max
+    price use monotonic deques, and the running peak feeds drawdown since the stream began.
+    """
+
+    def __init__(self, size: int = DEFAULT_WINDOW):
+        """
+        Args:
+            size: The number of returns in the window.
+        Raises:
+            ValueError: If size is not a whole number of at least 1.
+        """
+        if isinstance(size, bool) or not isinstance(size, int) or size < 1:
+            raise ValueError(f"window must be a whole number of bars of at least 1, got {size!r}")
+        self.size = size
+        self.prices: deque[float] = deque(maxlen=size + 1)
+        self.returns: deque[float] = deque(maxlen=size)
+        self.last_timestamp = None
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        # (bar index, price) pairs, prices increasing for the min deque and decreasing for the max deque
+        self._min: deque[tuple[int, float]] = deque()
+        self._max: deque[tuple[int, float]] = deque()
+        self._first_price = None
+        self._peak = -math.inf
+        self._max_drawdown = 0.0
+
+    def update(self, timestamp, price: float) -> None:
+        """
+        Add one bar.
+        Args:
+            timestamp: The bar timestamp, bars at or before the last seen timestamp are ignored.
+            price: The bar price.
+        """
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return
+        price = float(price)
+        if self.prices:
+            if len(self.returns) == self.size:
+                self._remove_return(self.returns[0])
+            self._add_return(price / self.prices[-1] - 1.0)
+        else:
+            self._first_price = price
+        self.prices.append(price)
+        self.last_timestamp = timestamp
+
+        index = self.count
+        self.count += 1
+        while self._min and self._min[-1][1] >= price:
+            self._min.pop()
+        self._min.append((index, price))
+        while self._max and self._max[-1][1] <= price:
+            self._max.pop()
+        self._max.append((index, price))
+        # Windows hold size + 1 prices so they span size returns
+        oldest = index - self.size
+        while self._min[0][0] < oldest:
+            self._min.popleft()
+        while self._max[0][0] < oldest:
+            self._max.popleft()
+
+        self._peak = max(self._peak, price)
+        self._max_drawdown = min(self._max_drawdown, price / self._peak - 1.0)
+
+    def _add_return(self, value: float) -> None:
+        self.returns.append(value)
+        delta = value - self._mean
+        self._mean += delta / len(self.returns)
+        self._m2 += delta * (value - self._mean)
+
+    def _remove_return(self, value: float) -> None:
+        # The deque drops the value itself when the next one is appended
+        n = len(self.returns) - 1
+        if n == 0:
+            self._mean = self._m2 = 0.0
+            return
+        delta = value - self._mean
+        self._mean -= delta / n
+        self._m2 -= delta * (value - self._mean)
+
+    def snapshot(self, periods_per_year: int = 252) -> dict:
+        """
+        Get the current statistics.
+        Args:
+            periods_per_year: Bars per year, used for the annualized standard deviation.
+        Returns:
+            The rolling statistics of the window and the drawdown and return since the stream began.
+        """
+        n = len(self.returns)
+        variance = max(self._m2, 0.0) / (n - 1) if n > 1 else 0.0
+        last = self.prices[-1] if self.prices else None
+        return {
+            "window": self.size,
+            "bars": n,
+            "last_timestamp": str(self.last_timestamp) if self.last_timestamp is not None else None,
+            "last_price": last,
+            "mean_return": self._mean,
+            "variance": variance,
+            "stddev": math.sqrt(variance),
+            "annualized_stddev": math.sqrt(variance * periods_per_year),
+            "min_price": self._min[0][1] if self._min else None,
+            "max_price": self._max[0][1] if self._max else None,
+            "window_return": (last / self.prices[0] - 1.0) if self.prices else None,
+            "drawdown": (last / self._peak - 1.0) if self.prices else None,
+            "max_drawdown": self._max_drawdown,
+            "cumulative_return": (last / self._first_price - 1.0) if self.prices else None,
+        }
+
+
+class RollingStatsEngine:
+    """
+    Rolling windows per (symbol, interval, price field, window size), seeded from cached history.
+    At most MAX_WINDOWS are kept, the least recently queried are evicted first.
+    Each query extends its window with the bars of the current series newer than the last one seen.
+    """
+
+    def __init__(self):
+        self._windows: OrderedDict[tuple[str, str, str, int], RollingWindow] = OrderedDict()
+
+    async def query(self, symbol: str, window: int = DEFAULT_WINDOW, interval: str = "DAILY", ohlc: str = "close") -> dict | None:
+        """
+        Get rolling statistics for a symbol.
+        The window is seeded from the cached price series the first time, later calls only
+        append bars newer than the last one seen.
+        Args:
+            symbol: The stock symbol.
+            window: The number of returns in the window.
+            interval: The bar interval.
+            ohlc: The price field to use.
+        Returns:
+            The statistics snapshot, or None if the series could not be retrieved.
+        Raises:
+            ValueError: If the window is not at least 1 bar.
+        """
+        symbol, interval = symbol.strip().upper(), interval.strip().upper()
+        ohlc = (ohlc or "close").strip().upper()
+        if ohlc not in OHLC_COLUMNS:
+            ohlc = "CLOSE"
+        key = (symbol, interval, ohlc, window)
+        rolling = self._windows.get(key)
+        if rolling is None:
+            # validated before any data is fetched
+            rolling = RollingWindow(window)
+        series = await load_series(symbol, interval)
+        if series is None and rolling.last_timestamp is None:
+            return None
+        self._windows[key] = rolling
+        self._windows.move_to_end(key)
+        while len(self._windows) > MAX_WINDOWS:
+            # an evicted window is seeded again from the cached series on its next query
+            self._windows.popitem(last=False)
+        if series is not None:
+            column = OHLC_COLUMNS[ohlc]
+            # Only bars after the last seen timestamp are new work
+            start = 0 if rolling.last_timestamp is None else int(series.dates.searchsorted(rolling.last_timestamp, side="right"))
+            for timestamp, price in zip(series.dates[start:], series.ohlcv[start:, column]):
+                rolling.update(timestamp, price)
+        return {"symbol": symbol, "interval": interval, "ohlc": ohlc.lower(), **rolling.snapshot(PERIODS_PER_YEAR.get(interval, 252))}
+
+
+# Process wide engine used by the analytics tools
+rolling_engine = RollingStatsEngine()
@@ -0,0 +1,312 @@
+import argparse
+import asyncio
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from columnar_store import store, ColumnarStore
+
+DEFAULT_SORT = "MarketCapitalization"
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# How often the store directory is scanned for symbols written by other processes, e.g. the cache warmer
+REFRESH_SECONDS = float(os.getenv("STOCKS_SCREENER_REFRESH_SECONDS", "60"))
+
+# Metrics derived from the stored statements, next to the OVERVIEW metrics
+DERIVED_METRICS = ["revenue_cagr_3y", "revenue_growth_1y", "net_margin", "free_cash_flow", "fcf_margin"]
+# Text fields that can be filtered with = and !=
+LABEL_FILTERS = {"name": "Name", "sector": "Sector", "industry": "Industry", "exchange": "Exchange", "country": "Country",
+                 "currency": "Currency", "assettype": "AssetType"}
+# Common spellings -> stored metric, keys are lower case without spaces or punctuation
+METRIC_ALIASES = {
+    "pe": "PERatio", "peratio": "PERatio", "priceearnings": "PERatio", "trailingpe": "TrailingPE", "forwardpe": "ForwardPE",
+    "peg": "PEGRatio", "pegratio": "PEGRatio", "pb": "PriceToBookRatio", "pricetobook": "PriceToBookRatio",
+    "ps": "PriceToSalesRatioTTM", "pricetosales": "PriceToSalesRatioTTM", "dividendyield": "DividendYield",
+    "yield": "DividendYield", "marketcap": "MarketCapitalization", "marketcapitalization": "MarketCapitalization",
+    "eps": "EPS", "beta": "Beta", "profitmargin": "ProfitMargin", "operatingmargin": "OperatingMarginTTM",
+    "roe": "ReturnOnEquityTTM", "returnonequity": "ReturnOnEquityTTM", "roa": "ReturnOnAssetsTTM",
+    "returnonassets": "ReturnOnAssetsTTM", "revenue": "RevenueTTM", "revenuettm": "RevenueTTM", "ebitda": "EBITDA",
+    "revenuegrowth": "QuarterlyRevenueGrowthYOY", "earningsgrowth": "QuarterlyEarningsGrowthYOY",
+    "revenuecagr": "revenue_cagr_3y", "revenuecagr3y": "revenue_cagr_3y", "revenuegrowth1y": "revenue_growth_1y",
+    "netmargin": "net_margin", "fcf": "free_cash_flow", "freecashflow": "free_cash_flow", "fcfmargin": "fcf_margin",
+}
+_OPERATORS = {
+    "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+    "=": np.equal, "==": np.equal, "!=": np.not_equal,
+}
+# "and" separates clauses only when a comparison follows, so "name = Procter and Gamble" stays one clause
+_CLAUSE_SEPARATOR = re.compile(r",|\band\b(?=(?:(?!\band\b)[^,<>=!])+(?:<|>|=|!=))", re.IGNORECASE)
+_CLAUSE_PATTERN = re.compile(r"^\s*(.+?)\s*(<=|>=|!=|==|=|<|>)\s*(.+?)\s*$")
+_VALUE_PATTERN = re.compile(r"^\$?(-?[\d.]+)\s*([kmbt%]?)$", re.IGNORECASE)
+_SCALES = {"": 1.0, "k": 1e3, "m": 1e6, "b": 1e9, "t": 1e12, "%": 0.01}
+
+
+def _alias_key(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def derived_metrics(source: ColumnarStore, symbol: str) -> dict[str, float]:
+    """
+    Compute growth and margin metrics from a symbol's stored annual statements.
+    Args:
+        source: The columnar store.
+        symbol: The stock symbol.
+    Returns:
+        Metric -> value, NaN where the statements do not cover it.
+    """
+    derived = dict.fromkeys(DERIVED_METRICS, np.nan)
+    income = source.read_statement(symbol, "INCOME_STATEMENT", "annual")
+    revenue, revenue_by_date = np.nan, {}
+    if income is not None and len(income.dates):
+        all_revenues = income.column("totalRevenue")
+        reported = np.flatnonzero(~np.isnan(all_revenues))
+        revenues = all_revenues[reported]
+        revenue_by_date = dict(zip(income.dates[reported].tolist(), revenues.tolist()))
+        if len(revenues) >= 4 and revenues[-4] > 0 and revenues[-1] > 0:
+            derived["revenue_cagr_3y"] = (revenues[-1] / revenues[-4]) ** (1 / 3) - 1
+        if len(revenues) >= 2 and revenues[-2] > 0:
+            derived["revenue_growth_1y"] = revenues[-1] / revenues[-2] - 1
+        if len(reported):
+            # the margin's numerator comes from the same fiscal year as the revenue
+            latest = reported[-1]
+            revenue = all_revenues[latest]
+            if revenue > 0:
+                derived["net_margin"] = income.column("netIncome")[latest] / revenue
+    cashflow = source.read_statement(symbol, "CASH_FLOW", "annual")
+    if cashflow is not None and len(cashflow.dates):
+        # Alpha Vantage reports capital expenditures as a positive number
+        derived["free_cash_flow"] = cashflow.column("operatingCashflow")[-1] - cashflow.column("capitalExpenditures")[-1]
+        revenue = revenue_by_date.get(cashflow.dates[-1].item(), np.nan)
+        if revenue > 0:
+            derived["fcf_margin"] = derived["free_cash_flow"] / revenue
+    return derived
+
+
+class Universe:
+    """Every stored symbol's fundamentals as one (symbols, metrics) float matrix plus text label columns."""
+
+    def __init__(self, symbols: np.ndarray, metrics: list[str], values: np.ndarray, labels: dict[str, np.ndarray]):
+        self.symbols = symbols
+        self.metrics = metrics
+        self.values = values
+        self.labels = labels
+        self._index = {metric: i for i, metric in enumerate(metrics)}
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def resolve(self, name: str) -> str | None:
+        """Map a user spelling such as "P/E" or "dividend yield" to a metric or label field, None if unknown."""
+        key = _alias_key(name)
+        if key in LABEL_FILTERS:
+            return LABEL_FILTERS[key]
+        if key in METRIC_ALIASES:
+            return METRIC_ALIASES[key]
+        return next((metric for metric in self.metrics if _alias_key(metric) == key), None)
+
+    def column(self, field: str) -> np.ndarray:
+        """Get a metric or label column, NaN for a metric no symbol has."""
+        if field in self.labels:
+            return self.labels[field]
+        index = self._index.get(field)
+        return self.values[:, index] if index is not None else np.full(len(self.symbols), np.nan)
+
+
+def _parse_value(text: str) -> float:
+    match = _VALUE_PATTERN.match(text.replace(",", "").strip())
+    if match is None:
+        raise ValueError(f"'{text}' is not a number")
+    return float(match.group(1)) * _SCALES[match.group(2).lower()]
+
+
+def parse_filters(universe: Universe, expression: str) -> list[tuple[str, str, object]]:
+    """
+    Parse a screen such as "P/E < 20, revenue CAGR > 10%, dividend yield > 3%, sector = Technology".
+    Clauses are separated by commas or by "and" before another comparison. Values take %, K, M, B and T suffixes.
+    Args:
+        universe: The universe the metric names are resolved against.
+        expression: The screen.
+    Returns:
+        (field, operator, value) triples.
+    Raises:
+        ValueError: If a clause cannot be parsed or names an unknown metric.
+    """
+    filters = []
+    for clause in _CLAUSE_SEPARATOR.split(expression or ""):
+        if not clause.strip():
+            continue
+        match = _CLAUSE_PATTERN.match(clause)
+        if match is None:
+            raise ValueError(f"'{clause.strip()}' is not a comparison like 'P/E < 20'")
+        name, operator, value = match.groups()
+        field = universe.resolve(name)
+        if field is None:
+            raise ValueError(f"unknown metric '{name}'")
+        if field in universe.labels:
+            if operator not in ("=", "==", "!="):
+                raise ValueError(f"'{name}' can only be compared with = or !=")
+            filters.append((field, operator, value.strip().strip("'\"").lower()))
+        else:
+            filters.append((field, operator, _parse_value(value)))
+    if not filters:
+        raise ValueError("no filters given")
+    return filters
+
+
+def screen(universe: Universe, filters: list[tuple[str, str, object]], sort_by: str = DEFAULT_SORT,
+           descending: bool = True, limit: int = DEFAULT_LIMIT) -> dict:
+    """
+    Evaluate the filters over the whole universe with boolean masks and rank the matches.
+    Symbols missing a filtered metric never match.
+    Args:
+        universe: The universe to screen.
+        filters: Parsed filters from parse_filters().
+        sort_by: The metric to rank the matches by.
+        descending: Rank the largest values first.
+        limit: How many matches to return.
+    Returns:
+        The match count, the columns and one row per ranked match.
+    """
+    mask = np.ones(len(universe), dtype=bool)
+    for field, operator, value in filters:
+        column = universe.column(field)
+        if field in universe.labels:
+            column = np.char.lower(column)
+        with np.errstate(invalid="ignore"):
+            mask &= _OPERATORS[operator](column, value)
+    matched = np.flatnonzero(mask)
+    keys = universe.column(sort_by)[matched]
+    # NaN rank last in either direction
+    order = np.argsort(np.where(np.isnan(keys), np.inf, -keys if descending else keys), kind="stable")[:limit]
+    picked = matched[order]
+    fields = list(dict.fromkeys(["Name", "Sector"] + [field for field, _, _ in filters] + [sort_by]))
+    rows = []
+    for i in picked:
+        row = [str(universe.symbols[i])]
+        for field in fields:
+            value = universe.column(field)[i]
+            row.append(str(value) if field in universe.labels else (None if np.isnan(value) else round(float(value), 4)))
+        rows.append(row)
+    return {"universe": len(universe), "matched": int(len(matched)), "sort_by": sort_by, "columns": ["symbol", *fields], "rows": rows}
+
+
+class Screener:
+    """
+    Keeps the universe matrix built from the columnar store. Symbols are re-read only when this
+    process wrote to the store or their directory changed since they were last read.
+    """
+
+    def __init__(self, source: ColumnarStore = store):
+        self.source = source
+        self._lock = threading.Lock()
+        self._rows: dict[str, tuple[float, dict[str, float], dict[str, str]]] = {}
+        self._universe: Universe | None = None
+        self._version = -1
+        self._checked_at = 0.0
+
+    def _symbol_mtimes(self) -> dict[str, float]:
+        root = os.path.join(self.source.root, "fundamentals")
+        if not os.path.isdir(root):
+            return {}
+        with os.scandir(root) as entries:
+            return {entry.name: entry.stat().st_mtime for entry in entries if entry.is_dir()}
+
+    def _read_symbol(self, symbol: str) -> tuple[dict[str, float], dict[str, str]]:
+        overview = self.source.read_overview(symbol)
+        metrics, labels = derived_metrics(self.source, symbol), {}
+        if overview is not None:
+            metrics.update(zip(overview["metrics"].tolist(), overview["values"].tolist()))
+            labels = overview["labels"]
+        return metrics, labels
+
+    def universe(self) -> Universe:
+        """Get the current universe, refreshing the symbols that changed. Blocking, call it off the event loop."""
+        with self._lock:
+            now = time.time()
+            if self._universe is not None and self.source.version == self._version and now - self._checked_at < REFRESH_SECONDS:
+                return self._universe
+            self._version, self._checked_at = self.source.version, now
+            mtimes = self._symbol_mtimes()
+            changed = [symbol for symbol, mtime in mtimes.items() if symbol not in self._rows or self._rows[symbol][0] < mtime]
+            removed = self._rows.keys() - mtimes.keys()
+            if self._universe is not None and not changed and not removed:
+                return self._universe
+            for symbol in removed:
+                del self._rows[symbol]
+            for symbol in changed:
+                self._rows[symbol] = (mtimes[symbol], *self._read_symbol(symbol))
+            symbols = sorted(self._rows)
+            metrics = sorted({metric for symbol in symbols for metric in self._rows[symbol][1]})
+            index = {metric: j for j, metric in enumerate(metrics)}
+            values = np.full((len(symbols), len(metrics)), np.nan)
+            for i, symbol in enumerate(symbols):
+                for metric, value in self._rows[symbol][1].items():
+                    values[i, index[metric]] = value
+            labels = {field: np.array([self._rows[symbol][2].get(field, "") for symbol in symbols], dtype=str)
+                      for field in LABEL_FILTERS.values()}
+            self._universe = Universe(np.array(symbols, dtype=str), metrics, values, labels)
+            return self._universe
+
+    async def run(self, expression: str, sort_by: str | None = None, descending: bool = True, limit: int = DEFAULT_LIMIT) -> dict:
+        """
+        Screen the stored universe.
+        Args:
+            expression: The screen, e.g. "P/E < 20, dividend yield > 3%".
+            sort_by: The metric to rank by, defaults to market capitalization.
+            descending: Rank the largest values first.
+            limit: How many matches to return, at most MAX_LIMIT.
+        Returns:
+            The screen result with the parsed filters and the time the screen took.
+        Raises:
+            ValueError: If the screen or the sort metric is not valid.
+        """
+        universe = await asyncio.to_thread(self.universe)
+        started = time.perf_counter()
+        filters = parse_filters(universe, expression)
+        sort_field = universe.resolve(sort_by) if sort_by else DEFAULT_SORT
+        if sort_field is None or sort_field in universe.labels:
+            raise ValueError(f"cannot rank by '{sort_by}'")
+        result = screen(universe, filters, sort_field, descending, max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT)))
+        result["filters"] = [f"{field} {operator} {value}" for field, operator, value in filters]
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+
+# Process wide screener over the shared columnar store
+screener = Screener()
+
+
+async def ingest(symbols: list[str]) -> None:
+    """Fetch the overview and annual statements of symbols into the store, within the API quota."""
+    from batch_fundamentals import fetch_many
+    from http_client import close_client
+
+    try:
+        for function in ("OVERVIEW", "INCOME_STATEMENT", "CASH_FLOW"):
+            for symbol, payload in (await fetch_many(function, symbols)).items():
+                if not payload:
+                    print(f"{function} {symbol}: unavailable")
+                elif function == "OVERVIEW":
+                    store.ingest_overview(symbol, payload)
+                else:
+                    store.ingest_statement(symbol, function, payload)
+    finally:
+        await close_client()
+
+
+if __name__ == "__main__":
+    # e.g. python screener.py --ingest AAPL,MSFT,KO --screen "P/E < 30, dividend yield > 2%"
+    parser = argparse.ArgumentParser(description="Fill the fundamentals store and screen it.")
+    parser.add_argument("--ingest", help="comma separated symbols to fetch into the store")
+    parser.add_argument("--screen", help="the screen to run")
+    parser.add_argument("--sort-by", default=None)
+    args = parser.parse_args()
+    if args.ingest:
+        asyncio.run(ingest([s.strip().upper() for s in args.ingest.split(",") if s.strip()]))
+    if args.screen:
+        print(asyncio.run(screener.run(args.screen, args.sort_by)))
+    else:
+        print(f"{len(screener.universe())} symbols in the screening universe")
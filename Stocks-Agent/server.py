@@ -0,0 +1,146 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import aclosing, asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from app import StockSession, stream_turn
+from cache_warmer import cache_warmer
+from http_client import close_client
+from news_index import news_poller
+from instrumentation import metrics
+
+# Tool outputs are sent as a short preview, the full payload stays in the conversation history
+TOOL_OUTPUT_PREVIEW_CHARS = 300
+# Sessions that never call DELETE are dropped after an idle period, the least recently used beyond the cap
+MAX_SESSIONS = int(os.getenv("STOCKS_MAX_SESSIONS", "1000"))
+SESSION_IDLE_SECONDS = float(os.getenv("STOCKS_SESSION_IDLE_SECONDS", "3600"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    cache_warmer.start()
+    news_poller.start()
+    yield
+    await cache_warmer.stop()
+    await news_poller.stop()
+    await close_client()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Configure CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # In production, replace with specific origins
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+class SessionStore:
+    """Active chat sessions, bounded by an idle timeout and an LRU cap."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_seconds: float = SESSION_IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions: OrderedDict[str, tuple[StockSession, float]] = OrderedDict()
+
+    def get(self, session_id: str) -> StockSession:
+        """Get a session, starting it if it is new or expired, and mark it as recently used."""
+        now = time.monotonic()
+        while self._sessions:
+            oldest_id, (_, last_used) = next(iter(self._sessions.items()))
+            if now - last_used <= self.idle_seconds:
+                break
+            del self._sessions[oldest_id]
+        session = self._sessions.pop(session_id, (None, 0.0))[0] or StockSession(session_id)
+        self._sessions[session_id] = (session, now)
+        while len(self._sessions) > self.max_sessions:
+            # a turn in progress keeps its own reference to an evicted session
+            self._sessions.popitem(last=False)
+        return session
+
+    def pop(self, session_id: str) -> None:
+        """End a session."""
+        self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+# Store active chat sessions
+active_sessions = SessionStore()
+
+
+class ChatRequest(BaseModel):
+    message: str
+
+
+def to_sse(event: dict) -> str:
+    """Format a turn event as one Server-Sent Events message."""
+    if event["type"] == "tool_output":
+        output = event["output"] if isinstance(event["output"], str) else json.dumps(event["output"], default=str)
+        event = {**event, "output": output[:TOOL_OUTPUT_PREVIEW_CHARS], "chars": len(output)}
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def event_stream(request: Request, session_id: str, message: str):
+    session = active_sessions.get(session_id)
+    try:
+        # closing the turn's generator cancels its run, so an abandoned stream stops calling the model and tools
+        async with aclosing(stream_turn(session, message)) as events:
+            async for event in events:
+                if await request.is_disconnected():
+                    break
+                yield to_sse(event)
+    except Exception as e:
+        yield to_sse({"type": "error", "message": str(e)})
+
+
+def sse_response(request: Request, session_id: str, message: str) -> StreamingResponse:
+    return StreamingResponse(
+        event_stream(request, session_id, message),
+        media_type="text/event-stream",
+        # Disable proxy buffering so deltas reach the browser as they are produced
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/chat/{session_id}")
+async def chat(session_id: str, chat_request: ChatRequest, request: Request):
+    return sse_response(request, session_id, chat_request.message)
+
+
+@app.get("/chat/{session_id}/stream")
+async def chat_stream(session_id: str, message: str, request: Request):
+    # GET variant for the browser EventSource API, which cannot send a body
+    return sse_response(request, session_id, message)
+
+
+@app.delete("/chat/{session_id}")
+async def end_chat(session_id: str):
+    active_sessions.pop(session_id)
+    return {"message": f"Session {session_id} ended"}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Per tool latency, upstream time, cache hits, payload size and tokens, tagged by agent
+    return PlainTextResponse(metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/")
+async def root():
+    return {"message": "Stocks Agent API is running"}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.environ.get("PORT", 8000))
+    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
@@ -0,0 +1,44 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution.
+    The first caller starts the work as its own task, later callers with the same key
+    await that task instead of starting another one. Results are shared as-is, so
+    callers must not mutate them.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable], *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless a call with the same key is already in flight.
+        Args:
+            key: The deduplication key, e.g. the tool name and its arguments.
+            fn: The coroutine function doing the upstream fetch.
+        Returns:
+            The result of the shared call. Exceptions are raised to every caller.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        # Shield so one caller giving up does not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        """Get the number of distinct calls currently running."""
+        return len(self._inflight)
+
+
+# Process wide group shared by the stock tools
+flights = SingleFlight()
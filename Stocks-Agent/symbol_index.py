@@ -0,0 +1,292 @@
+import asyncio
+import csv
+import difflib
+import json
+import os
+import re
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from http_client import ALPHA_VANTAGE_URL, close_client, get_client, is_throttle_notice
+from instrumentation import upstream_call
+from pre_router import COMPANY_ALIASES
+from rate_limiter import PRIORITY_BACKGROUND, quota_scheduler
+from replay import http_key, replayable
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+INDEX_DIR = os.getenv("STOCKS_SYMBOL_INDEX_DIR", os.path.join(DATA_DIR, "symbol_index"))
+# Alpha Vantage LISTING_STATUS csv: symbol,name,exchange,assetType,ipoDate,delistingDate,status
+LISTING_FILE = os.getenv("STOCKS_LISTING_FILE", os.path.join(DATA_DIR, "listing_status.csv"))
+
+# Retry the listing download this often while the index only holds the alias table
+LISTING_RETRY_SECONDS = 3600
+
+MAX_KEY_BYTES = 64
+# Bumped when the key layout changes, so an index built by an older version is rebuilt
+INDEX_VERSION = 2
+FUZZY_CUTOFF = 0.75
+
+_SUFFIXES = re.compile(
+    r"\b(inc|incorporated|corp|corporation|co|company|ltd|limited|plc|llc|lp|sa|ag|nv|holdings?|group|"
+    r"the|class [a-z]|common stock|ordinary shares|american depositary shares|ads)\b"
+)
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+_SPACES = re.compile(r"\s+")
+
+# Match kinds, best first
+EXACT_SYMBOL, EXACT_NAME, PREFIX, FUZZY = "exact_symbol", "exact_name", "prefix", "fuzzy"
+_RANK = {EXACT_SYMBOL: 0, EXACT_NAME: 1, PREFIX: 2, FUZZY: 3}
+
+
+def normalize(text: str) -> str:
+    """Lower case a company name or ticker and drop punctuation and legal suffixes."""
+    text = text.lower().replace("&", " and ")
+    text = _NON_WORD.sub(" ", text)
+    stripped = _SPACES.sub(" ", _SUFFIXES.sub(" ", text)).strip()
+    return stripped or _SPACES.sub(" ", text).strip()
+
+
+def _key(text: str) -> bytes:
+    return normalize(text).encode("ascii", "ignore")[:MAX_KEY_BYTES]
+
+
+def read_listing(path: str) -> list[dict]:
+    """Read active rows of an Alpha Vantage LISTING_STATUS csv."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row for row in csv.DictReader(f) if row.get("symbol") and row.get("status", "Active") == "Active"]
+
+
+async def _get_listing(params: dict) -> str | None:
+    try:
+        response = await get_client().get(ALPHA_VANTAGE_URL, params=params, timeout=60)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Listing download error: {e}")
+        return None
+    return response.text
+
+
+async def download_listing(path: str = LISTING_FILE) -> bool:
+    """
+    Download the Alpha Vantage LISTING_STATUS csv at background priority through the shared quota scheduler.
+    Args:
+        path: Where to store the csv.
+    Returns:
+        Whether a listing was stored. Shed calls, throttle notices and errors store nothing.
+    """
+    apikey = os.getenv("ALPHA_VANTAGE_API_KEY")
+    if not apikey or not await quota_scheduler.acquire(PRIORITY_BACKGROUND):
+        return False
+    params = {"function": "LISTING_STATUS", "apikey": apikey}
+    with upstream_call():
+        text = await replayable("http", http_key(ALPHA_VANTAGE_URL, params), lambda: _get_listing(params),
+                                {"url": ALPHA_VANTAGE_URL, "params": {"function": "LISTING_STATUS"}})
+    if text is None:
+        return False
+    # Alpha Vantage answers errors and throttling with JSON instead of the csv
+    if not text.startswith("symbol,"):
+        try:
+            if is_throttle_notice(json.loads(text)):
+                quota_scheduler.throttled()
+        except ValueError:
+            pass
+        print(f"Listing download error: {text[:200]}")
+        return False
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return True
+
+
+def build_index(rows: list[dict], out_dir: str = INDEX_DIR, aliases: dict[str, str] | None = None) -> None:
+    """
+    Build the on-disk index: sorted search keys plus record columns, one .npy file each.
+    Every record is reachable by its ticker, as typed and normalized like a query, its normalized name and any alias.
+    Args:
+        rows: Listing rows with symbol, name, exchange and assetType.
+        out_dir: The index directory.
+        aliases: Extra alias -> symbol entries, defaults to the pre-router's COMPANY_ALIASES.
+    """
+    aliases = COMPANY_ALIASES if aliases is None else aliases
+    rows = list(rows)
+    known = {row["symbol"].upper() for row in rows}
+    # Aliases for symbols missing from the listing still resolve
+    rows += [{"symbol": symbol, "name": alias.title(), "exchange": "", "assetType": ""}
+             for alias, symbol in aliases.items() if symbol not in known]
+    position = {}
+    for i, row in enumerate(rows):
+        position.setdefault(row["symbol"].upper(), i)
+
+    entries = set()
+    for i, row in enumerate(rows):
+        entries.add((row["symbol"].lower().encode("ascii", "ignore"), i))
+        # queries are normalized, so "BRK.B" is looked up as "brk b"
+        entries.add((_key(row["symbol"]), i))
+        entries.add((_key(row.get("name") or row["symbol"]), i))
+    for alias, symbol in aliases.items():
+        if symbol in position:
+            entries.add((_key(alias), position[symbol]))
+    entries = sorted(entry for entry in entries if entry[0])
+
+    os.makedirs(out_dir, exist_ok=True)
+    columns = {
+        "keys": np.array([key for key, _ in entries], dtype=f"S{MAX_KEY_BYTES}"),
+        "targets": np.array([target for _, target in entries], dtype=np.int32),
+        "symbols": np.array([row["symbol"].upper().encode() for row in rows], dtype="S16"),
+        "names": np.array([(row.get("name") or "").encode("utf-8")[:120] for row in rows], dtype="S120"),
+        "exchanges": np.array([(row.get("exchange") or "").encode() for row in rows], dtype="S16"),
+        "asset_types": np.array([(row.get("assetType") or "").encode() for row in rows], dtype="S16"),
+        "version": np.array([INDEX_VERSION], dtype=np.int32),
+    }
+    for name, values in columns.items():
+        # Replaced rather than overwritten, so an index that still maps the old files keeps working
+        path = os.path.join(out_dir, f"{name}.npy")
+        with open(f"{path}.tmp", "wb") as f:
+            np.save(f, values)
+        os.replace(f"{path}.tmp", path)
+
+
+class SymbolIndex:
+    """
+    Read only symbol index over memory mapped arrays.
+    Exact and prefix lookups are binary searches over the sorted keys, so only a few
+    pages are touched per query and startup does not read the whole file.
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        def load(name):
+            return np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+
+        self.keys = load("keys")
+        self.targets = load("targets")
+        self.symbols = load("symbols")
+        self.names = load("names")
+        self.exchanges = load("exchanges")
+        self.asset_types = load("asset_types")
+
+    def _range(self, low: bytes, high: bytes) -> tuple[int, int]:
+        return int(np.searchsorted(self.keys, low, "left")), int(np.searchsorted(self.keys, high, "left"))
+
+    def _record(self, target: int, match: str, score: float = 1.0) -> dict:
+        return {
+            "symbol": self.symbols[target].decode(),
+            "name": self.names[target].decode("utf-8", "ignore"),
+            "exchange": self.exchanges[target].decode(),
+            "asset_type": self.asset_types[target].decode(),
+            "match": match,
+            "score": round(score, 3),
+        }
+
+    def has_symbol(self, symbol: str) -> bool:
+        """Check whether a ticker is listed."""
+        key = symbol.lower().encode("ascii", "ignore")
+        start, end = int(np.searchsorted(self.keys, key, "left")), int(np.searchsorted(self.keys, key, "right"))
+        return any(self.symbols[self.targets[i]].decode().lower() == symbol.lower() for i in range(start, end))
+
+    def search(self, query: str, limit: int = 5) -> list[dict]:
+        """
+        Resolve a ticker, company name, ETF name or alias.
+        Exact matches rank first, then prefix matches (shorter names first), then fuzzy matches.
+        Args:
+            query: The text to resolve, e.g. "Amazon", "amzn" or "spdr s&p".
+            limit: Maximum number of results.
+        Returns:
+            The matching records with symbol, name, exchange, asset type and match kind.
+        """
+        key = _key(query)
+        if not key:
+            return []
+        results: dict[int, dict] = {}
+
+        def add(target: int, match: str, score: float = 1.0):
+            current = results.get(target)
+            if current is None or (_RANK[match], -score) < (_RANK[current["match"]], -current["score"]):
+                results[target] = self._record(target, match, score)
+
+        start, end = int(np.searchsorted(self.keys, key, "left")), int(np.searchsorted(self.keys, key, "right"))
+        for i in range(start, end):
+            target = int(self.targets[i])
+            add(target, EXACT_SYMBOL if _key(self.symbols[target].decode()) == key else EXACT_NAME)
+
+        start, end = self._range(key, key + b"\xff")
+        for i in range(start, min(end, start + limit * 20)):
+            add(int(self.targets[i]), PREFIX, len(key) / max(len(self.keys[i]), 1))
+
+        if len(results) < limit:
+            # Fuzzy candidates share the first character, which keeps the scan to one bucket
+            start, end = self._range(key[:1], key[:1] + b"\xff")
+            query_text = key.decode()
+            matcher = difflib.SequenceMatcher(b=query_text, autojunk=False)
+            for i in range(start, end):
+                matcher.set_seq1(self.keys[i].decode())
+                if matcher.real_quick_ratio() >= FUZZY_CUTOFF and matcher.quick_ratio() >= FUZZY_CUTOFF:
+                    score = matcher.ratio()
+                    if score >= FUZZY_CUTOFF:
+                        add(int(self.targets[i]), FUZZY, score)
+
+        ranked = sorted(results.values(), key=lambda r: (_RANK[r["match"]], -r["score"], r["asset_type"] != "Stock", len(r["name"])))
+        return ranked[:limit]
+
+
+_index: SymbolIndex | None = None
+# When the current index was built from the alias table only, None once it holds the listing
+_alias_only_since: float | None = None
+
+
+def _is_stale() -> bool:
+    keys, version = os.path.join(INDEX_DIR, "keys.npy"), os.path.join(INDEX_DIR, "version.npy")
+    if not os.path.exists(keys) or not os.path.exists(version) or int(np.load(version)[0]) != INDEX_VERSION:
+        return True
+    return os.path.exists(LISTING_FILE) and os.path.getmtime(LISTING_FILE) > os.path.getmtime(keys)
+
+
+def _retry_due() -> bool:
+    return _alias_only_since is None or time.time() - _alias_only_since >= LISTING_RETRY_SECONDS
+
+
+def get_index() -> SymbolIndex:
+    """
+    Get the process wide index, building it on first use if needed.
+    The index is rebuilt whenever LISTING_FILE is newer than it. Without LISTING_FILE the index
+    holds the alias table only and is checked again every LISTING_RETRY_SECONDS.
+    """
+    global _index, _alias_only_since
+    if _index is not None and not _retry_due():
+        return _index
+    if _is_stale():
+        build_index(read_listing(LISTING_FILE) if os.path.exists(LISTING_FILE) else [])
+        _index = None
+    if _index is None:
+        _index = SymbolIndex()
+    _alias_only_since = None if os.path.exists(LISTING_FILE) else time.time()
+    return _index
+
+
+async def load_index() -> SymbolIndex:
+    """
+    Get the process wide index from the event loop. A missing LISTING_FILE is downloaded
+    from Alpha Vantage first, at most every LISTING_RETRY_SECONDS, and the index is built off the loop.
+    """
+    if not os.path.exists(LISTING_FILE) and _retry_due():
+        await download_listing()
+    return await asyncio.to_thread(get_index)
+
+
+async def _download_and_close(path: str) -> bool:
+    try:
+        return await download_listing(path)
+    finally:
+        await close_client()
+
+
+if __name__ == "__main__":
+    # Usage: python symbol_index.py [listing_status.csv]
+    # Without a file the listing is downloaded from Alpha Vantage first.
+    listing = sys.argv[1] if len(sys.argv) > 1 else LISTING_FILE
+    if not os.path.exists(listing) and not asyncio.run(_download_and_close(listing)):
+        sys.exit("Unable to download the listing, check ALPHA_VANTAGE_API_KEY")
+    build_index(read_listing(listing))
+    print(f"Built symbol index in {INDEX_DIR}")